@@ -0,0 +1,273 @@
+"""
+Click picking: cast a ray from the camera through the cursor and find the first component mesh it hits.
+
+The world space bounding boxes of the pickable components are put in a bounding volume hierarchy. The ray walks it
+nearest box first, and every component whose box it enters is tested triangle by triangle, all triangles of a mesh
+at once with the Moller-Trumbore test. The walk stops as soon as the nearest hit so far is closer than every box left
+to visit, so in a dense scene only the few meshes right around the cursor are ever tested.
+
+Triangles are tested in each component's model space, by moving the ray there with the inverse of its
+transformationMat, so the meshes never have to be transformed. Ray parameters are the same in both spaces, since the
+direction is transformed along with the origin and not normalized.
+"""
+
+import heapq
+
+import numpy as np
+
+from DisplayableMesh import DisplayableMesh
+
+# (8, 3): which corners of a box take the upper bound along each axis
+CORNERS = np.array([[(k >> axis) & 1 for axis in range(3)] for k in range(8)], dtype=bool)
+
+
+def rayTriangles(origin, direction, triangles, epsilon=1e-12):
+    """
+    Moller-Trumbore intersection of one ray with T triangles at once
+
+    :param origin: np.ndarray(3)
+    :param direction: np.ndarray(3), need not be normalized
+    :param triangles: np.ndarray(T, 3, 3): the three corners of every triangle
+    :return: np.ndarray(T): ray parameter of the hit with every triangle, infinite where the ray misses it
+    """
+    v0 = triangles[:, 0]
+    edge1 = triangles[:, 1] - v0
+    edge2 = triangles[:, 2] - v0
+    p = np.cross(direction, edge2)
+    det = np.einsum("ij,ij->i", edge1, p)
+    # rays parallel to a triangle never hit it
+    valid = np.abs(det) > epsilon
+    invDet = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+    s = origin - v0
+    u = np.einsum("ij,ij->i", s, p) * invDet
+    q = np.cross(s, edge1)
+    v = (q @ direction) * invDet
+    t = np.einsum("ij,ij->i", edge2, q) * invDet
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+def rayBoxes(origin, direction, lower, upper):
+    """
+    Slab test of one ray against N axis aligned boxes at once
+
+    :param lower: np.ndarray(N, 3): lower corner of every box
+    :param upper: np.ndarray(N, 3): upper corner of every box
+    :return: np.ndarray(N): ray parameter where the ray enters every box, 0 if it starts inside, infinite if it misses
+    """
+    # a ray parallel to an axis gets huge instead of infinite slab parameters, which avoids 0 * inf
+    inverse = 1.0 / np.where(direction == 0, 1e-300, direction)
+    t0 = (lower - origin) * inverse
+    t1 = (upper - origin) * inverse
+    near = np.minimum(t0, t1)
+    far = np.maximum(t0, t1)
+    entry = np.maximum(near.max(axis=1), 0.0)
+    exit = far.min(axis=1)
+    return np.where(entry <= exit, entry, np.inf)
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over a fixed set of axis aligned boxes. When the boxes move, refit() keeps the tree and
+    only recomputes its node boxes, which is far cheaper than building a new one but gets looser the more the boxes
+    have moved since.
+    """
+    lower = None  # np.ndarray(N, 3): lower corner of every item
+    upper = None  # np.ndarray(N, 3): upper corner of every item
+    leaf_size = 2
+    index = None  # np.ndarray(N): items reordered so that every node covers index[start:end]
+
+    # per node
+    start = None
+    end = None
+    left = None  # child node ids, -1 for leaves
+    right = None
+    depth = None
+    box_min = None  # np.ndarray(M, 3)
+    box_max = None
+
+    def __init__(self, lower, upper, leaf_size=2):
+        """
+        :param lower: (N, 3) lower corners of the items' boxes
+        :param upper: (N, 3) upper corners of the items' boxes
+        :param leaf_size: maximum number of items in a leaf
+        """
+        self.lower = np.array(lower, dtype=float).reshape(-1, 3)
+        self.upper = np.array(upper, dtype=float).reshape(-1, 3)
+        self.leaf_size = max(1, leaf_size)
+        self.index = np.arange(len(self.lower))
+        centers = (self.lower + self.upper) / 2
+        start, end, left, right, depth, box_min, box_max = [], [], [], [], [], [], []
+
+        if len(self.lower):
+            stack = [(0, len(self.lower), None, None, 0)]
+            while stack:
+                lo, hi, parent, side, level = stack.pop()
+                node = len(start)
+                if parent is not None:
+                    (left if side == 0 else right)[parent] = node
+                members = self.index[lo:hi]
+                start.append(lo)
+                end.append(hi)
+                left.append(-1)
+                right.append(-1)
+                depth.append(level)
+                box_min.append(self.lower[members].min(axis=0))
+                box_max.append(self.upper[members].max(axis=0))
+                if hi - lo <= self.leaf_size:
+                    continue
+                # split the widest spread of box centers at the median
+                spread = centers[members]
+                axis = int(np.argmax(spread.max(axis=0) - spread.min(axis=0)))
+                mid = (lo + hi) // 2
+                order = np.argpartition(spread[:, axis], mid - lo)
+                self.index[lo:hi] = members[order]
+                stack.append((mid, hi, node, 1, level + 1))
+                stack.append((lo, mid, node, 0, level + 1))
+
+        self.start = np.array(start, dtype=int)
+        self.end = np.array(end, dtype=int)
+        self.left = np.array(left, dtype=int)
+        self.right = np.array(right, dtype=int)
+        self.depth = np.array(depth, dtype=int)
+        self.box_min = np.array(box_min, dtype=float).reshape(-1, 3)
+        self.box_max = np.array(box_max, dtype=float).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.lower)
+
+    def refit(self, lower, upper):
+        """
+        Move the items' boxes, keeping the tree: leaf boxes are recomputed from their items, then every level of
+        inner nodes from its children, deepest first
+
+        :param lower: (N, 3) new lower corners, for the same items in the same order
+        :param upper: (N, 3) new upper corners
+        """
+        self.lower = np.array(lower, dtype=float).reshape(-1, 3)
+        self.upper = np.array(upper, dtype=float).reshape(-1, 3)
+        if not len(self.start):
+            return
+        leaves = np.flatnonzero(self.left < 0)
+        leaves = leaves[np.argsort(self.start[leaves])]
+        # the leaves split index into consecutive ranges
+        self.box_min[leaves] = np.minimum.reduceat(self.lower[self.index], self.start[leaves])
+        self.box_max[leaves] = np.maximum.reduceat(self.upper[self.index], self.start[leaves])
+        for level in range(int(self.depth.max()) - 1, -1, -1):
+            inner = np.flatnonzero((self.depth == level) & (self.left >= 0))
+            self.box_min[inner] = np.minimum(self.box_min[self.left[inner]], self.box_min[self.right[inner]])
+            self.box_max[inner] = np.maximum(self.box_max[self.left[inner]], self.box_max[self.right[inner]])
+
+    def intersect(self, origin, direction, hitItem):
+        """
+        Nearest hit along a ray. Boxes are visited nearest first, and only items whose box the ray enters before the
+        nearest hit found so far are tested.
+
+        :param origin: np.ndarray(3)
+        :param direction: np.ndarray(3)
+        :param hitItem: function(item) -> ray parameter of the hit with that item, infinite if there is none
+        :return: (t, item) of the nearest hit, (inf, -1) if nothing is hit
+        """
+        best, bestItem = np.inf, -1
+        if not len(self.start):
+            return best, bestItem
+        rootEntry = rayBoxes(origin, direction, self.box_min[:1], self.box_max[:1])[0]
+        heap = [(rootEntry, 0)]
+        while heap:
+            entry, node = heapq.heappop(heap)
+            if entry >= best:
+                break
+            if self.left[node] < 0:
+                members = self.index[self.start[node]:self.end[node]]
+                entries = rayBoxes(origin, direction, self.lower[members], self.upper[members])
+                for item, itemEntry in sorted(zip(members, entries), key=lambda pair: pair[1]):
+                    if itemEntry >= best:
+                        break
+                    t = hitItem(item)
+                    if t < best:
+                        best, bestItem = t, int(item)
+                continue
+            children = np.array([self.left[node], self.right[node]])
+            for child, childEntry in zip(children, rayBoxes(origin, direction, self.box_min[children],
+                                                             self.box_max[children])):
+                if childEntry < best:
+                    heapq.heappush(heap, (childEntry, int(child)))
+        return best, bestItem
+
+
+class Picker:
+    """
+    Ray picking over the components that have a DisplayableMesh
+    """
+    components = None  # list<Component>: pickable components
+    triangles = None  # list<np.ndarray(T, 3, 3)>: model space triangles of every component
+    model_lower = None  # np.ndarray(N, 3): model space bounding box of every component
+    model_upper = None
+    bvh = None  # BVH over the world space bounding boxes, as of the last refresh()
+    stale = True  # whether the components moved since the last refresh()
+
+    def __init__(self, components):
+        """
+        :param components: components to pick from. Those without a DisplayableMesh are left out
+        :type components: list<Component>
+        """
+        self.components = [c for c in components if isinstance(c.displayObj, DisplayableMesh)]
+        self.triangles = []
+        lower, upper = [], []
+        for c in self.components:
+            positions = np.asarray(c.displayObj.vertices, dtype=float).reshape(-1, 11)[:, :3]
+            indices = np.asarray(c.displayObj.indices).astype(int).reshape(-1, 3)
+            self.triangles.append(positions[indices])
+            lower.append(positions.min(axis=0))
+            upper.append(positions.max(axis=0))
+        self.model_lower = np.array(lower, dtype=float).reshape(-1, 3)
+        self.model_upper = np.array(upper, dtype=float).reshape(-1, 3)
+
+    def refresh(self):
+        """
+        Bring the hierarchy up to date with the current transformationMat of the components, which must have been
+        updated. The hierarchy is built once and refit afterwards, since the components only move relative to each
+        other as far as their joints allow
+        """
+        if self.components:
+            # the 8 corners of every model space box, moved to world space
+            corners = np.where(CORNERS, self.model_upper[:, np.newaxis], self.model_lower[:, np.newaxis])
+            worldMats = np.array([c.transformationMat for c in self.components])
+            world = np.einsum("nij,nkj->nki", worldMats[:, :3, :3], corners) + worldMats[:, np.newaxis, :3, 3]
+            if self.bvh is None:
+                self.bvh = BVH(world.min(axis=1), world.max(axis=1))
+            else:
+                self.bvh.refit(world.min(axis=1), world.max(axis=1))
+        else:
+            self.bvh = BVH(np.zeros((0, 3)), np.zeros((0, 3)))
+        self.stale = False
+
+    def hitComponent(self, item, origin, direction):
+        """
+        Ray parameter of the nearest hit with one component's triangles, infinite if there is none
+        """
+        try:
+            inverse = np.linalg.inv(self.components[item].transformationMat)
+        except np.linalg.LinAlgError:
+            # scaled down to nothing
+            return np.inf
+        localOrigin = inverse[:3, :3] @ origin + inverse[:3, 3]
+        localDirection = inverse[:3, :3] @ direction
+        return float(rayTriangles(localOrigin, localDirection, self.triangles[item]).min(initial=np.inf))
+
+    def pick(self, origin, direction):
+        """
+        First component hit by a ray
+
+        :param origin: world space start of the ray, e.g. the cursor unprojected onto the near plane
+        :param direction: world space direction of the ray, e.g. towards the cursor unprojected onto the far plane
+        :return: (component, t) of the nearest hit, with the hit at origin + t * direction, or (None, inf)
+        """
+        if self.stale or self.bvh is None:
+            self.refresh()
+        origin = np.asarray(origin, dtype=float)
+        direction = np.asarray(direction, dtype=float)
+        t, item = self.bvh.intersect(origin, direction, lambda i: self.hitComponent(i, origin, direction))
+        if item < 0:
+            return None, np.inf
+        return self.components[item], t
@@ -20,6 +20,7 @@ from Point import Point
 from CanvasBase import CanvasBase
 from GLProgram import GLProgram
 from Quaternion import Quaternion
+from Picking import Picker
 import GLUtility
 
 try:
@@ -109,6 +110,13 @@ class Sketch(CanvasBase):
     select_obj_index = -1 # index of selected component in self.components
     select_axis_index = -1  # index of selected axis
     select_color = [ColorType.ColorType(1, 0, 0), ColorType.ColorType(0, 1, 0), ColorType.ColorType(0, 0, 1)]
+    picker = None  # Picker over self.components, for selecting them by clicking
+
+    # mouse moves are only acted on once per frame, for the last position the mouse was seen at
+    pending_mouse = None  # (x, y) of the last mouse move not handled yet
+    # cached by _unproject until the camera is set up for the next frame
+    inv_view_proj = None  # transposed inverse of viewMat @ perspMat
+    viewport = None  # GL viewport (x, y, width, height)
 
     # If you are having trouble rotating the camera, try increasing this parameter
     # (Windows users with trackpads may need this)
@@ -166,6 +174,7 @@ class Sketch(CanvasBase):
 
         self.components = model.componentList
         self.cDict = model.componentDict
+        self.picker = Picker(self.components)
 
         gl.glClearColor(*self.backgroundColor, 1.0)
         gl.glClearDepth(1.0)
@@ -221,8 +230,13 @@ class Sketch(CanvasBase):
         # These are per-frame updates to the shader. Update the viewing matrix
         self.viewMat = self.glutility.view(self.getCameraPos(), self.lookAtPt, self.upVector)
         self.shaderProg.setMat4("viewMat", self.viewMat)
+        self.inv_view_proj = None
 
-        self.topLevelComponent.update(np.identity(4))
+        if self.pending_mouse is not None:
+            self.trackCursor(*self.pending_mouse)
+            self.pending_mouse = None
+
+        # every change to the components updates them on the spot (see update), so there is nothing to update here
         self.topLevelComponent.draw(self.shaderProg)
 
         self.SwapBuffers()
@@ -239,6 +253,13 @@ class Sketch(CanvasBase):
         super(Sketch, self).OnDestroy(event)
 
     def Interrupt_MouseMoving(self, x, y):
+        """
+        Mouse moves come in much faster than frames are drawn: only remember the last position, OnDraw hands it to
+        trackCursor once per frame
+        """
+        self.pending_mouse = (x, y)
+
+    def trackCursor(self, x, y):
         ##### TODO 6 (CS680 Required, CS480 Extra Credit): Eye movement
         # Make your creature's eyes follow the cursor.
         # The eye rotation only needs to work correctly when the creature is looking toward the viewer.
@@ -272,7 +293,7 @@ class Sketch(CanvasBase):
         
         if np.linalg.norm(axis.getCoords()) < 1e-6:
             pupil.clearQuaternion()
-            self.update()
+            self.updatePupil(sclera, pupil)
             return
         
         cos_ang = max(-1.0, min(1.0, forward.dot(local_direction)))
@@ -290,7 +311,15 @@ class Sketch(CanvasBase):
         
         pupil.setQuaternion(q)
 
-        self.update()
+        self.updatePupil(sclera, pupil)
+
+    def updatePupil(self, sclera, pupil):
+        """
+        Only the pupil turns when the eye follows the cursor: update its subtree alone, from the sclera
+        """
+        pupil.update(sclera.transformationMat)
+        if self.picker is not None:
+            self.picker.stale = True
 
     def Interrupt_Scroll(self, wheelRotation):
         """
@@ -326,18 +355,19 @@ class Sketch(CanvasBase):
         return result
 
     def _unproject(self, x, y, z):
-        model_matrix = np.identity(4)
-        proj_matrix = self.viewMat @ self.perspMat
-        viewport = gl.glGetIntegerv(gl.GL_VIEWPORT)
-        model_view_proj_matrix = proj_matrix @ model_matrix
-        inv_model_view_proj_matrix = np.linalg.inv(model_view_proj_matrix)
+        if self.inv_view_proj is None:
+            # once per frame rather than for every point: the camera only changes in OnDraw
+            self.viewport = gl.glGetIntegerv(gl.GL_VIEWPORT)
+            model_view_proj_matrix = self.viewMat @ self.perspMat
+            self.inv_view_proj = np.linalg.inv(model_view_proj_matrix).T  # transpose because they are row-major
+        viewport = self.viewport
 
         x_ndc = (x - viewport[0]) / viewport[2] * 2.0 - 1.0
         y_ndc = (y - viewport[1]) / viewport[3] * 2.0 - 1.0
         z_ndc = 2.0 * z - 1.0
         
         ndc_coords = np.array([x_ndc, y_ndc, z_ndc, 1.0])
-        world_coords = inv_model_view_proj_matrix.T @ ndc_coords # transpose because they are row-major
+        world_coords = self.inv_view_proj @ ndc_coords
         if world_coords[3] != 0:
             world_coords /= world_coords[3]
         return world_coords[:3]
@@ -354,6 +384,40 @@ class Sketch(CanvasBase):
         """
         self.last_mouse_leftPosition[0] = x
         self.last_mouse_leftPosition[1] = y
+        # this is called on release: a release that ends a camera drag is not a click
+        if self.dragging_event:
+            self.dragging_event = False
+            return
+        self.pickComponent(x, y)
+
+    def pickComponent(self, x, y):
+        """
+        Select the component under the cursor, as if it had been reached with the Enter key. Clicking where there is
+        no component keeps the current selection
+
+        :param x: canvas x coordinate
+        :param y: canvas y coordinate, from the bottom
+        :return: the component picked, None if there is none under the cursor
+        """
+        if self.picker is None or self.viewMat is None:
+            return None
+        near = self._unproject(x, y, 0.0)
+        far = self._unproject(x, y, 1.0)
+        component, _ = self.picker.pick(near, far - near)
+        if component is None:
+            return None
+
+        for c in self.multi_select_list:
+            c.reset("color")
+        self.multi_select_list.clear()
+        if self.select_obj_index != -1:
+            self.components[self.select_obj_index].reset("color")
+        if self.select_axis_index == -1:
+            self.select_axis_index = 0
+        self.select_obj_index = self.components.index(component)
+        component.setCurrentColor(self.select_color[self.select_axis_index])
+        self.update()
+        return component
 
     def Interrupt_MouseMiddleDragging(self, x, y):
         """
@@ -421,6 +485,9 @@ class Sketch(CanvasBase):
         :return: None
         """
         self.topLevelComponent.update(np.identity(4))
+        if self.picker is not None:
+            # components may have moved
+            self.picker.stale = True
 
     # For TODO 6
     def toggle_group_selection(self, group_names):
@@ -0,0 +1,132 @@
+"""
+Baked rotation tables for the periodic joint animations of creatures.
+
+The tail wiggle, pincer snap and leg paddle of a creature are oscillators (see JointAnimation): from a given pose and
+speed they step through the same angles over and over. The AnimationBaker plays every oscillator of a creature class
+from its initial state until the state repeats, which covers the start-up transient and one full cycle, and stores
+the local rotation matrix of every angle each joint goes through in a RotationTable. Components given tables look
+their u/v/w rotation up in Component.update instead of rebuilding it with GLUtility.rotate.
+
+Lookups are exact: a table entry is the very matrix GLUtility.rotate returns for that angle. Angles off the baked
+cycle (e.g. a joint posed by hand) fall back to GLUtility.rotate, or, with lerp enabled, to a linear interpolation of
+the two neighbouring entries.
+"""
+
+import numpy as np
+
+from GLUtility import GLUtility
+
+AXES = ("u", "v", "w")
+
+
+class RotationTable:
+    """
+    Rotation matrices about one axis for a fixed set of angles
+    """
+    axis = None  # list<float>(3)
+    angles = None  # np.ndarray(K): sorted baked angles
+    matrices = None  # np.ndarray(K, 4, 4): rotation of every angle, row-major as used by Component.update
+    lerp = False
+
+    def __init__(self, axis, angles, lerp=False):
+        """
+        :param axis: rotation axis, the component's uAxis, vAxis or wAxis
+        :param angles: angles to bake, in degrees
+        :param lerp: interpolate between the baked angles when asked for another angle inside their range
+        """
+        self.axis = [float(x) for x in axis]
+        self.lerp = lerp
+        self.angles = np.unique(np.asarray(list(angles), dtype=float))
+        self.matrices = np.array([GLUtility.rotate(a, self.axis, False) for a in self.angles]).reshape(-1, 4, 4)
+        self.lookup = {float(a): m for a, m in zip(self.angles, self.matrices)}
+
+    def __len__(self):
+        return len(self.angles)
+
+    def matrix(self, angle):
+        """
+        Rotation matrix of angle, None if angle was not baked (and cannot be interpolated)
+
+        :rtype: numpy.ndarray
+        """
+        baked = self.lookup.get(angle)
+        if baked is not None or not self.lerp:
+            return baked
+        i = int(np.searchsorted(self.angles, angle))
+        if i == 0 or i == len(self.angles):
+            return None
+        low, high = self.angles[i - 1], self.angles[i]
+        t = (angle - low) / (high - low)
+        return self.matrices[i - 1] + t * (self.matrices[i] - self.matrices[i - 1])
+
+
+class AnimationBaker:
+    """
+    Bakes the joint oscillators of every creature class once, and hands the tables to the creatures' components
+    """
+    max_steps = 100000  # give up on oscillators that do not repeat within this many steps
+    tables = None  # dict<type, dict<str, list<RotationTable or None>(3)>>: class -> component name -> u/v/w tables
+
+    def __init__(self, lerp=False):
+        """
+        :param lerp: interpolate rotations for angles off the baked cycles instead of computing them
+        """
+        self.lerp = lerp
+        self.tables = {}
+
+    def attach(self, creature):
+        """
+        Give the animated components of creature their baked tables, baking its class on first use
+        """
+        joints = getattr(creature, "animation_joints", None)
+        if not joints:
+            return
+        tables = self.tables.get(type(creature))
+        if tables is None:
+            tables = self.tables[type(creature)] = self.bake(creature)
+        for name, componentTables in tables.items():
+            creature.componentDict[name].rotationTables = componentTables
+
+    def bake(self, creature):
+        """
+        Play every oscillator of creature from its current pose and speeds until its state repeats, collecting the
+        angles of the joints it drives
+
+        :return: component name -> u/v/w RotationTables (None for axes that are not animated)
+        """
+        visited = {}  # component name -> axis index -> set of angles
+        for speedName, joints in creature.animation_joints.items():
+            speed = getattr(creature, speedName)
+            comps = [creature.componentDict[name] for name, _, _, _ in joints]
+            angles = [getattr(comp, axis + "Angle") for comp, (_, axis, _, _) in zip(comps, joints)]
+            ranges = [getattr(comp, axis + "Range") for comp, (_, axis, _, _) in zip(comps, joints)]
+            for (name, axis, _, mirror), angle in zip(joints, angles):
+                axes = visited.setdefault(name, {})
+                axes.setdefault(AXES.index(axis), set()).add(angle)
+                if mirror is not None:
+                    axes.setdefault(AXES.index(mirror), set()).add(getattr(creature.componentDict[name],
+                                                                           mirror + "Angle"))
+
+            seen = set()
+            for _ in range(self.max_steps):
+                state = (speed, *angles)
+                if state in seen:
+                    break
+                seen.add(state)
+                # same arithmetic as Component.rotate and JointAnimation.advance
+                angles = [max(min(angle + sign * speed, high), low)
+                          for angle, (_, _, sign, _), (low, high) in zip(angles, joints, ranges)]
+                flipped = any(angle <= low or angle >= high for angle, (low, high) in zip(angles, ranges))
+                for (name, axis, _, mirror), angle in zip(joints, angles):
+                    visited[name][AXES.index(axis)].add(angle)
+                    if flipped and mirror is not None:
+                        visited[name][AXES.index(mirror)].add(angle)
+                if flipped:
+                    speed = -speed
+
+        tables = {}
+        for name, axes in visited.items():
+            comp = creature.componentDict[name]
+            tables[name] = [RotationTable(comp.axisBucket[i], axes[i], self.lerp) if i in axes else None
+                            for i in range(3)]
+        return tables
@@ -0,0 +1,167 @@
+"""
+A cached potential field over the vivarium tank, used by creatures to steer toward food without looping over every
+food particle.
+
+The field stores, on a regular 3D grid spanning the tank, the sum of one radial potential per source:
+
+    U(d) = sigma * sqrt(pi) / 2 * erf(min(d, cutoff) / sigma)
+
+Its negative gradient is exp(-(d / sigma)^2) along the unit vector toward the source, which is exactly the force
+EnvironmentObject.potential_force returns in "attract" mode (with unit strength). That is the only profile the field
+supports: a source with a negative weight pushes away with the same gaussian, it does not follow the "repel" mode of
+potential_force, whose 1 / (d^2 + 1e-3) factor peaks far too sharply at the source to be sampled on a coarse grid.
+Sources are added, moved and removed incrementally, and creatures sample the gradient with trilinear interpolation,
+so the cost of a lookup does not depend on how much food is in the tank.
+"""
+
+import math
+import numpy as np
+
+
+def erf(x):
+    """
+    Vectorized error function (Abramowitz & Stegun 7.1.26, absolute error below 1.5e-7)
+    """
+    x = np.asarray(x, dtype=float)
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+
+class AttractionField:
+    """
+    Summed gaussian attraction potential sampled on a grid over the tank
+    """
+    half_extent = None  # np.ndarray(3): half of the tank dimensions
+    spacing = None  # np.ndarray(3): distance between grid nodes along each axis
+    resolution = 0  # number of grid nodes along each axis
+    range_scale = 1.0  # sigma of the gaussian
+    cutoff = None  # sources further away than this exert no force
+    tolerance = 0.0  # how far a source may drift before it is re-deposited
+
+    nodes = None  # np.ndarray(R, R, R, 3): world position of every grid node
+    potential = None  # np.ndarray(R, R, R)
+    gradient = None  # np.ndarray(R, R, R, 3), rebuilt lazily from potential
+    sources = None  # dict<int, (np.ndarray(3), float)>: id(source) -> (deposited position, weight)
+
+    def __init__(self, tank_dimensions, range_scale, cutoff=None, resolution=17):
+        """
+        :param tank_dimensions: size of the tank along x, y and z. The tank is centered at the origin
+        :type tank_dimensions: list
+        :param range_scale: sigma of the gaussian, same meaning as in EnvironmentObject.potential_force
+        :type range_scale: float
+        :param cutoff: distance beyond which a source has no effect. None for no cutoff
+        :type cutoff: float
+        :param resolution: number of grid nodes along each axis, must be at least 2
+        :type resolution: int
+        """
+        if resolution < 2:
+            raise ValueError("AttractionField needs at least 2 grid nodes per axis")
+        self.half_extent = np.array(tank_dimensions, dtype=float) / 2
+        self.resolution = resolution
+        self.spacing = 2 * self.half_extent / (resolution - 1)
+        self.range_scale = range_scale
+        self.cutoff = cutoff
+        self.tolerance = 0.25 * float(self.spacing.min())
+
+        axes = [np.linspace(-h, h, resolution) for h in self.half_extent]
+        self.nodes = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1)
+        self.potential = np.zeros((resolution, resolution, resolution))
+        self.gradient = None
+        self.sources = {}
+
+    def __len__(self):
+        return len(self.sources)
+
+    def _deposit(self, position, weight):
+        dist = np.linalg.norm(self.nodes - position, axis=-1)
+        if self.cutoff is not None:
+            np.minimum(dist, self.cutoff, out=dist)
+        sigma = self.range_scale
+        self.potential += weight * (sigma * math.sqrt(math.pi) / 2) * erf(dist / sigma)
+        self.gradient = None
+
+    def add(self, source, weight=1.0):
+        """
+        Add an object's contribution at its current position
+
+        :param source: an object with a currentPos
+        :param weight: scales the attraction. A negative weight flips it into a push with the same gaussian profile,
+            not the "repel" mode of EnvironmentObject.potential_force
+        """
+        key = id(source)
+        if key in self.sources:
+            return
+        position = np.array(source.currentPos.coords, dtype=float)
+        self.sources[key] = (position, weight)
+        self._deposit(position, weight)
+
+    def remove(self, source):
+        """
+        Remove an object's contribution, e.g. once it has been eaten
+        """
+        entry = self.sources.pop(id(source), None)
+        if entry is None:
+            return
+        position, weight = entry
+        self._deposit(position, -weight)
+
+    def move(self, source):
+        """
+        Follow a source that has moved. Small moves (a quarter of a grid cell) are ignored so that slowly
+        sinking food does not rebuild the field every frame.
+        """
+        entry = self.sources.get(id(source))
+        if entry is None:
+            return
+        position, weight = entry
+        newPosition = np.array(source.currentPos.coords, dtype=float)
+        if np.max(np.abs(newPosition - position)) < self.tolerance:
+            return
+        self._deposit(position, -weight)
+        self.sources[id(source)] = (newPosition, weight)
+        self._deposit(newPosition, weight)
+
+    def clear(self):
+        self.sources.clear()
+        self.potential.fill(0)
+        self.gradient = None
+
+    def sampleGradient(self, positions):
+        """
+        Trilinearly interpolated gradient of the potential. Positions outside the tank are clamped to its walls.
+
+        :param positions: a single position (3,) or an array of positions (N, 3)
+        :return: gradient(s) with the same shape as positions
+        :rtype: numpy.ndarray
+        """
+        if self.gradient is None:
+            self.gradient = np.stack(np.gradient(self.potential, *self.spacing), axis=-1)
+
+        positions = np.asarray(positions, dtype=float)
+        single = positions.ndim == 1
+        positions = np.atleast_2d(positions)
+
+        cell = (positions + self.half_extent) / self.spacing
+        np.clip(cell, 0, self.resolution - 1, out=cell)
+        i0 = np.minimum(cell.astype(int), self.resolution - 2)
+        t = cell - i0
+
+        result = np.zeros((len(positions), 3))
+        for dx in (0, 1):
+            wx = t[:, 0] if dx else 1 - t[:, 0]
+            for dy in (0, 1):
+                wy = t[:, 1] if dy else 1 - t[:, 1]
+                for dz in (0, 1):
+                    wz = t[:, 2] if dz else 1 - t[:, 2]
+                    corner = self.gradient[i0[:, 0] + dx, i0[:, 1] + dy, i0[:, 2] + dz]
+                    result += (wx * wy * wz)[:, None] * corner
+        return result[0] if single else result
+
+    def force(self, positions, strength=1.0):
+        """
+        Force exerted on object(s) at the given position(s): -strength * gradient
+        """
+        return -strength * self.sampleGradient(positions)
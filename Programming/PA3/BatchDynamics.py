@@ -0,0 +1,225 @@
+"""
+Vectorized versions of the per-creature steering rules in ModelLinkage and EnvironmentObject.
+
+Each function takes the state of many creatures as (N, 3) arrays and applies the same math as the corresponding
+per-object method, so whole populations can be advanced with a handful of numpy calls.
+"""
+
+import itertools
+
+import numpy as np
+
+from Quaternion import QuaternionArray
+
+WORLD_UP = np.array([0.0, 1.0, 0.0])
+LOCAL_FORWARD = np.array([0.0, 0.0, 1.0])
+# neighborPairs indexes cells through a dense table up to this many cells, and binary searches beyond
+MAX_DENSE_CELLS = 1 << 22
+
+
+class BatchDynamics:
+
+    @staticmethod
+    def neighborPairs(positions, targets, cutoff):
+        """
+        All (object, target) pairs closer than cutoff, found by binning the targets into cells of size cutoff and
+        only comparing neighbouring cells.
+
+        :param positions: (N, 3)
+        :param targets: (M, 3)
+        :return: object indices, target indices, offsets target - object (K, 3) and distances (K,) of the pairs
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        targets = np.asarray(targets, dtype=float).reshape(-1, 3)
+        if len(positions) == 0 or len(targets) == 0:
+            return np.zeros(0, int), np.zeros(0, int), np.zeros((0, 3)), np.zeros(0)
+
+        objectCells = np.floor(positions / cutoff).astype(np.int64)
+        targetCells = np.floor(targets / cutoff).astype(np.int64)
+        origin = np.minimum(objectCells.min(axis=0), targetCells.min(axis=0)) - 1
+        objectCells -= origin
+        targetCells -= origin
+        dims = np.maximum(objectCells.max(axis=0), targetCells.max(axis=0)) + 2
+
+        def cellKey(cells):
+            return (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+        targetKeys = cellKey(targetCells)
+        order = np.argsort(targetKeys, kind="stable")
+        numCells = int(np.prod(dims))
+        denseTable = numCells <= MAX_DENSE_CELLS
+        if denseTable:
+            # first sorted target and target count of every cell
+            cellCounts = np.bincount(targetKeys, minlength=numCells)
+            cellStarts = np.cumsum(cellCounts) - cellCounts
+        else:
+            sortedKeys = targetKeys[order]
+        objectIndex = []
+        targetIndex = []
+        for offset in itertools.product((-1, 0, 1), repeat=3):
+            keys = cellKey(objectCells + offset)
+            if denseTable:
+                start = cellStarts[keys]
+                counts = cellCounts[keys]
+            else:
+                start = np.searchsorted(sortedKeys, keys, "left")
+                counts = np.searchsorted(sortedKeys, keys, "right") - start
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # expand every object's [start, end) range of sorted targets
+            groupStart = np.repeat(start - (np.cumsum(counts) - counts), counts)
+            objectIndex.append(np.repeat(np.arange(len(positions)), counts))
+            targetIndex.append(order[groupStart + np.arange(total)])
+        if not objectIndex:
+            return np.zeros(0, int), np.zeros(0, int), np.zeros((0, 3)), np.zeros(0)
+
+        i = np.concatenate(objectIndex)
+        j = np.concatenate(targetIndex)
+        delta = targets[j] - positions[i]
+        dist = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+        close = dist < cutoff
+        return i[close], j[close], delta[close], dist[close]
+
+    @staticmethod
+    def potentialMagnitude(dist, strength, range_scale, mode):
+        """
+        Signed magnitude of EnvironmentObject.potential_force along the direction to the target
+        """
+        gauss = np.exp(-(dist / range_scale) ** 2)
+        if mode == "attract":
+            return strength * gauss
+        if mode == "repel":
+            return -strength * (1.0 / (dist ** 2 + 1e-3)) * gauss * 5.0
+        return np.zeros_like(dist)
+
+    @staticmethod
+    def potentialForces(positions, targets, strength=0.02, range_scale=1.5, mode="attract", cutoff=None,
+                        chunk=512):
+        """
+        Sum of EnvironmentObject.potential_force exerted by every target on every object
+
+        :param positions: positions of the objects being pushed, (N, 3)
+        :param targets: positions of the objects exerting the force, (M, 3)
+        :param cutoff: targets further away than this are ignored, and only nearby cells are searched.
+            None to sum over every target
+        :param chunk: without a cutoff, number of objects processed at once, bounds the (chunk, M, 3) temporaries
+        :return: summed force on each object, (N, 3)
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        targets = np.asarray(targets, dtype=float).reshape(-1, 3)
+        result = np.zeros_like(positions)
+        if len(targets) == 0 or len(positions) == 0:
+            return result
+
+        if cutoff is not None:
+            i, j, delta, dist = BatchDynamics.neighborPairs(positions, targets, cutoff)
+            valid = dist >= 1e-6
+            i, delta, dist = i[valid], delta[valid], dist[valid]
+            scale = BatchDynamics.potentialMagnitude(dist, strength, range_scale, mode) / dist
+            for k in range(3):
+                result[:, k] = np.bincount(i, weights=scale * delta[:, k], minlength=len(positions))
+            return result
+
+        for start in range(0, len(positions), chunk):
+            delta = targets[None, :, :] - positions[start:start + chunk, None, :]
+            dist = np.sqrt(np.einsum("ijk,ijk->ij", delta, delta))
+            valid = dist >= 1e-6
+            safe = np.where(valid, dist, 1.0)
+            scale = np.where(valid, BatchDynamics.potentialMagnitude(safe, strength, range_scale, mode) / safe, 0.0)
+            result[start:start + chunk] = np.einsum("ij,ijk->ik", scale, delta)
+        return result
+
+    @staticmethod
+    def norms(vectors):
+        """
+        Length of every row of an (N, 3) array. Computed with matmul, which rounds exactly like the
+        np.linalg.norm of a single vector used by the per-creature code.
+        """
+        return np.sqrt(np.matmul(vectors[:, None, :], vectors[:, :, None])[:, 0, 0])
+
+    @staticmethod
+    def normalize(vectors):
+        """
+        Normalize every row of an (N, 3) array in place. Zero rows are left unchanged.
+        """
+        norm = BatchDynamics.norms(vectors)
+        nonzero = norm > 0
+        vectors[nonzero] /= norm[nonzero, None]
+        return vectors
+
+    @staticmethod
+    def uprightCorrection(directions, blend, keep=None):
+        """
+        Prey/Predator.applyUprightCorrection for every row: pull the directions toward the horizontal plane
+
+        :param directions: directions, (N, 3), updated in place
+        :param blend: weight of the horizontal direction, scalar or (N,). 0.1 for prey, 0.05 for predators
+        :param keep: weight of the current direction, scalar or (N,). 1 - blend if not given
+        """
+        blend = np.broadcast_to(np.asarray(blend, dtype=float), (len(directions),))
+        keep = 1 - blend if keep is None else np.broadcast_to(np.asarray(keep, dtype=float), (len(directions),))
+        facing = directions / BatchDynamics.norms(directions)[:, None]
+        right = np.cross(facing, WORLD_UP)
+        active = BatchDynamics.norms(right) >= 1e-6
+        if not np.any(active):
+            return directions
+        corrected = np.cross(WORLD_UP, right[active])
+        corrected /= BatchDynamics.norms(corrected)[:, None]
+        blended = keep[active, None] * directions[active] + blend[active, None] * corrected
+        directions[active] = blended / BatchDynamics.norms(blended)[:, None]
+        return directions
+
+    @staticmethod
+    def wallReflect(nextPositions, directions, radius, tank_dimensions):
+        """
+        Wall collision stage of Prey/Predator.bounceOffWalls for every row: clamp the probed positions into the tank
+        and mirror the direction components of every wall that was hit.
+
+        :param nextPositions: probed positions, (N, 3), clamped in place
+        :param directions: unit directions, (N, 3), reflected in place
+        :param radius: bounding radius of every creature, (N,)
+        :return: mask of the creatures that bounced, (N,)
+        """
+        half = np.asarray(tank_dimensions, dtype=float) / 2
+        radius = np.asarray(radius, dtype=float).reshape(-1, 1)
+        high = (nextPositions + radius) > half
+        low = ~high & ((nextPositions - radius) < -half)
+        hit = high | low
+        np.copyto(nextPositions, half - radius, where=high)
+        np.copyto(nextPositions, -half + radius, where=low)
+        # reflecting across an axis aligned wall just flips that component
+        np.negative(directions, out=directions, where=hit)
+        bounced = np.any(hit, axis=1)
+        if np.any(bounced):
+            directions[bounced] = BatchDynamics.normalize(directions[bounced])
+        return bounced
+
+    @staticmethod
+    def boundaryStage(nextPositions, directions, radius, tank_dimensions, keep, blend):
+        """
+        Prey/Predator.bounceOffWalls for every row: wall reflection and clamping, then upright correction of the
+        creatures that bounced. Bit for bit identical to the per-creature code.
+
+        :param nextPositions: probed positions, (N, 3), clamped in place
+        :param directions: unit directions, (N, 3), updated in place to the final directions
+        :param keep: upright correction weights of every creature, (N,)
+        :param blend: (N,)
+        :return: mask of the creatures that bounced, and their directions before the upright correction, which
+            is what they face
+        """
+        bounced = BatchDynamics.wallReflect(nextPositions, directions, radius, tank_dimensions)
+        facing = directions[bounced]
+        if len(facing):
+            directions[bounced] = BatchDynamics.uprightCorrection(facing.copy(), blend[bounced], keep[bounced])
+        return bounced, facing
+
+    @staticmethod
+    def facingQuaternions(directions, forward=LOCAL_FORWARD, up=WORLD_UP):
+        """
+        EnvironmentObject.rotateDirection for every row: quaternions (s, x, y, z) turning the creature's local
+        forward axis to face each direction. Rows that already face forward get the identity.
+
+        :return: (N, 4) array of unit quaternions
+        """
+        return QuaternionArray.fromTwoVectors(directions, forward, up)[0].data
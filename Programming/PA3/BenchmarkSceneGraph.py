@@ -0,0 +1,190 @@
+"""
+Scene graph update and draw benchmark.
+
+Builds synthetic Component trees without a GL context (see Headless.py) and measures the Component.update transform
+pass and the Component.draw traversal, in nodes per second:
+
+    * chain  - one deep chain of cubes, like ModelArm with `size` links
+    * fan    - `size` cubes directly under one root
+    * forest - `size` Prey and Predator creatures (one predator in ten) under one root, like the vivarium
+
+Every frame first changes the tree according to the motion mode:
+
+    * static - nothing changes
+    * root   - the root moves, so every world matrix changes but no local one does
+    * joints - every component turns about its u axis, so every local matrix changes
+
+Memory is traced with tracemalloc around a separate set of update() calls: "peak KB" is the most memory the transform
+pass holds at once beyond what it started with (temporaries and matrices not yet released), and "kept KB" what it
+still holds after the frame. "allocs" is the number of memory blocks the frame leaves allocated, the summed count_diff
+of tracemalloc snapshots taken around update() (numpy buffers included). It is a net count: temporaries freed within
+the frame, and new objects that replace ones freed in the same frame, cancel out. A pass that reuses its buffers shows
+close to none, one that holds on to more every frame (a growing cache, matrices kept alongside the ones they replace)
+shows how many blocks it adds.
+
+Usage:
+    python BenchmarkSceneGraph.py --shapes chain fan forest --sizes 10 100 1000 --modes static root joints \
+        --frames 50 --compiled --csv scenegraph.csv
+"""
+
+import argparse
+import csv
+import time
+import tracemalloc
+
+import numpy as np
+
+from Headless import installGLStubs, HeadlessShaderProgram
+from Point import Point
+
+SHAPES = ("chain", "fan", "forest")
+MODES = ("static", "root", "joints")
+
+
+def buildTree(shape, size, shaderProg):
+    """
+    :return: root Component of the tree and the list of all its components
+    """
+    import ColorType as Ct
+    from Component import Component
+    from ModelLinkage import Prey, Predator
+    from Shapes import Cube
+
+    root = Component(Point((0, 0, 0)))
+    if shape == "chain":
+        parent = root
+        for i in range(size):
+            link = Cube(Point((0, 0, 0.5 if i else 0)), shaderProg, [0.125, 0.125, 0.5], Ct.DARKORANGE1)
+            parent.addChild(link)
+            parent = link
+    elif shape == "fan":
+        for i in range(size):
+            root.addChild(Cube(Point((i % 10, i // 10 % 10, i // 100)), shaderProg, [0.1, 0.1, 0.1], Ct.DARKORANGE1))
+    elif shape == "forest":
+        rng = np.random.default_rng(0)
+        for i in range(size):
+            species = Predator if i % 10 == 0 else Prey
+            root.addChild(species(None, Point(rng.uniform(-2, 2, 3)), shaderProg, rng))
+    else:
+        raise ValueError(f"Unknown tree shape {shape}")
+
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.children)
+    root.initialize()
+    return root, nodes
+
+
+def moveTree(root, nodes, mode, frame):
+    """
+    Change the tree for the next frame according to the motion mode
+    """
+    if mode == "root":
+        root.currentPos = Point(((frame % 10) * 0.1, 0, 0))
+    elif mode == "joints":
+        angle = float(frame % 90)
+        for node in nodes:
+            node.uAngle = angle
+    elif mode != "static":
+        raise ValueError(f"Unknown motion mode {mode}")
+
+
+def benchmarkTree(shape, size, mode, frames=50, compiled=False):
+    """
+    Time update and draw over a number of frames, then trace the memory of a few more
+
+    :param compiled: update and draw through a CompiledHierarchy instead of the recursive Component methods
+    :return: dict with the tree, the mean seconds per frame of update and draw, their throughput in nodes per
+        second, the traced memory and the allocated blocks per frame
+    """
+    from CompiledHierarchy import CompiledHierarchy
+
+    shaderProg = HeadlessShaderProgram()
+    root, nodes = buildTree(shape, size, shaderProg)
+    hierarchy = CompiledHierarchy(root) if compiled else None
+    update = root.update if hierarchy is None else hierarchy.update
+    draw = root.draw if hierarchy is None else hierarchy.draw
+    update()
+
+    updateTime = drawTime = 0.0
+    for frame in range(frames):
+        moveTree(root, nodes, mode, frame)
+        t0 = time.perf_counter()
+        update()
+        t1 = time.perf_counter()
+        draw(shaderProg)
+        t2 = time.perf_counter()
+        updateTime += t1 - t0
+        drawTime += t2 - t1
+
+    traced = max(1, min(frames, 5))
+    tracemalloc.start()
+    peak = kept = blocks = 0
+    # leave out the snapshots' own bookkeeping
+    untraced = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    # the first traced frame only replaces untraced memory, so it is not counted
+    for frame in range(-1, traced):
+        moveTree(root, nodes, mode, frame)
+        snapshot = tracemalloc.take_snapshot().filter_traces(untraced)
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        update()
+        current, framePeak = tracemalloc.get_traced_memory()
+        if frame >= 0:
+            peak += framePeak - before
+            kept += current - before
+            changes = tracemalloc.take_snapshot().filter_traces(untraced).compare_to(snapshot, "filename")
+            blocks += sum(change.count_diff for change in changes)
+    tracemalloc.stop()
+
+    result = {"shape": shape, "size": size, "nodes": len(nodes), "mode": mode, "frames": frames,
+              "update": updateTime / frames, "draw": drawTime / frames}
+    result["update_nodes_per_second"] = len(nodes) / result["update"] if result["update"] > 0 else float("inf")
+    result["draw_nodes_per_second"] = len(nodes) / result["draw"] if result["draw"] > 0 else float("inf")
+    result["peak_kb"] = peak / traced / 1024
+    result["kept_kb"] = kept / traced / 1024
+    result["allocs_per_frame"] = blocks / traced
+    return result
+
+
+def printRow(result):
+    print(f"{result['shape']:>7} {result['size']:>6d} {result['nodes']:>7d} {result['mode']:>7}"
+          f" {result['update'] * 1000:>10.3f} {result['update_nodes_per_second']:>12.0f}"
+          f" {result['draw'] * 1000:>10.3f} {result['draw_nodes_per_second']:>12.0f}"
+          f" {result['peak_kb']:>9.1f} {result['kept_kb']:>8.1f} {result['allocs_per_frame']:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scene graph update and draw benchmark")
+    parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000],
+                        help="chain links, fan children or forest creatures")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--frames", type=int, default=50, help="frames to time per tree and mode")
+    parser.add_argument("--compiled", action="store_true", help="go through a CompiledHierarchy")
+    parser.add_argument("--csv", help="also write the results to this csv file")
+    args = parser.parse_args()
+
+    installGLStubs()
+    print(f"{'shape':>7} {'size':>6} {'nodes':>7} {'mode':>7} {'update ms':>10} {'update n/s':>12}"
+          f" {'draw ms':>10} {'draw n/s':>12} {'peak KB':>9} {'kept KB':>8} {'allocs':>8}")
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            for mode in args.modes:
+                result = benchmarkTree(shape, size, mode, args.frames, args.compiled)
+                results.append(result)
+                printRow(result)
+
+    if args.csv and results:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
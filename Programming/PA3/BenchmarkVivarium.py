@@ -0,0 +1,138 @@
+"""
+Population scaling benchmark for the vivarium.
+
+Runs headless vivariums (see Headless.py) at increasing creature counts and reports the average time per step,
+split into the phases of Vivarium.animationUpdate:
+
+    * step    - creature stepForward (steering, hunting, wall collisions)
+    * animate - creature animationUpdate (joint animation)
+    * food    - food sinking and eating
+    * update  - the Component.update transform pass over the whole tank
+
+The last line fits time ~ N^k over the measured sizes to give the scaling exponent k.
+
+Usage:
+    python BenchmarkVivarium.py --sizes 10 100 1000 10000 --food-density 0.5 --steps 20 --csv scaling.csv
+"""
+
+import argparse
+import csv
+import math
+import time
+
+import numpy as np
+
+from Headless import headlessVivarium
+
+PHASES = ("step", "animate", "food", "update")
+
+
+def benchmarkPopulation(numCreatures, foodDensity=0.5, predatorFraction=0.1, steps=20, maxSeconds=60.0,
+                        seed=0, **vivariumArgs):
+    """
+    Time the simulation phases for one population size.
+
+    :param numCreatures: number of creatures in the tank
+    :param foodDensity: food particles per unit of tank volume, topped up before every step
+    :param predatorFraction: share of predators in the population
+    :param steps: number of steps to time
+    :param maxSeconds: stop early once this much time was spent stepping (at least one step is always timed)
+    :return: dict with the population, food particles, number of timed steps, build time and the mean
+        seconds per step of each phase
+    """
+    numPredators = max(1, int(round(numCreatures * predatorFraction)))
+    numPrey = max(0, numCreatures - numPredators)
+
+    start = time.perf_counter()
+    vivarium = headlessVivarium(numPredators, numPrey, seed=seed, **vivariumArgs)
+    buildTime = time.perf_counter() - start
+
+    numFood = int(round(foodDensity * np.prod(vivarium.tank_dimensions)))
+    totals = dict.fromkeys(PHASES, 0.0)
+    timed = 0
+    elapsed = 0.0
+    while timed < steps and (timed == 0 or elapsed < maxSeconds):
+        while len(vivarium.food_obj) < numFood:
+            vivarium.spawnFood()
+
+        t0 = time.perf_counter()
+        vivarium.stepCreatures()
+        t1 = time.perf_counter()
+        vivarium.animateCreatures()
+        t2 = time.perf_counter()
+        vivarium.stepFood()
+        t3 = time.perf_counter()
+        vivarium.step_count += 1
+        vivarium.update()
+        t4 = time.perf_counter()
+
+        totals["step"] += t1 - t0
+        totals["animate"] += t2 - t1
+        totals["food"] += t3 - t2
+        totals["update"] += t4 - t3
+        elapsed += t4 - t0
+        timed += 1
+
+    result = {"creatures": numCreatures, "particles": numFood, "steps": timed, "build": buildTime}
+    for phase in PHASES:
+        result[phase] = totals[phase] / timed
+    result["total"] = sum(result[phase] for phase in PHASES)
+    return result
+
+
+def scalingExponent(results):
+    """
+    Least squares slope of log(time per step) against log(creatures)
+    """
+    if len(results) < 2:
+        return float("nan")
+    x = np.log([r["creatures"] for r in results])
+    y = np.log([r["total"] for r in results])
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def printRow(result):
+    print(f"{result['creatures']:>9d} {result['particles']:>6d} {result['steps']:>6d}"
+          + "".join(f" {result[phase] * 1000:>10.3f}" for phase in PHASES + ("total",))
+          + f" {1 / result['total']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vivarium population scaling benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="creature counts to benchmark")
+    parser.add_argument("--food-density", type=float, default=0.5, help="food particles per unit of tank volume")
+    parser.add_argument("--predator-fraction", type=float, default=0.1, help="share of predators in the population")
+    parser.add_argument("--steps", type=int, default=20, help="steps to time per size")
+    parser.add_argument("--max-seconds", type=float, default=60.0,
+                        help="time budget per size; large sizes stop early but always time one step")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spatial-index", action="store_true", help="find prey and threats through KD-trees")
+    parser.add_argument("--compiled-scene", action="store_true",
+                        help="update the scene graph through a CompiledHierarchy")
+    parser.add_argument("--csv", help="also write the results to this csv file")
+    args = parser.parse_args()
+
+    print(f"{'creatures':>9} {'food':>6} {'steps':>6}" + "".join(f" {p + ' ms':>10}" for p in PHASES + ("total",))
+          + f" {'steps/s':>10}")
+    results = []
+    for size in args.sizes:
+        result = benchmarkPopulation(size, args.food_density, args.predator_fraction, args.steps,
+                                     args.max_seconds, args.seed, useSpatialIndex=args.spatial_index,
+                                     compileScene=args.compiled_scene)
+        results.append(result)
+        printRow(result)
+
+    k = scalingExponent(results)
+    if not math.isnan(k):
+        print(f"time per step ~ N^{k:.2f}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+A Component tree compiled into flat arrays, for batched world matrix computation.
+
+Components are numbered in level order (the root, then its children, then theirs...), so that every level of the
+tree is a contiguous range of indices whose parents all belong to the previous level. Local matrices live in one
+(N, 4, 4) array and world matrices are computed a whole level at a time:
+
+    world[level] = world[parent[level]] @ local[level]
+
+Only the local matrices of dirty components (see Component.markDirty) are rebuilt, one Python call each; everything
+else is a handful of np.matmul calls. Every component's transformationMat is a view into the world array, so the
+rest of the code reads it as usual. Frustum culling tests the bounding sphere of every drawn mesh in one batch
+instead of walking the tree.
+
+The tree is recompiled when its topology changes, which Component tracks with a global version counter bumped by
+addChild and removeChild.
+"""
+
+import numpy as np
+
+from Component import Component, IDENTITY
+from Displayable import Displayable
+from Frustum import cullMeshes
+
+
+class CompiledHierarchy:
+    """
+    Flat, level ordered form of the subtree of a root Component
+    """
+    root = None  # Component
+    version = -1  # Component.topology_version the arrays were compiled for
+    nodes = None  # list<Component>, level order
+    parent = None  # np.ndarray(N): index of every node's parent, -1 for the root
+    levels = None  # list<(int, int)>: index range of every level below the root
+    local = None  # np.ndarray(N, 4, 4): local transformation of every node
+    world = None  # np.ndarray(N, 4, 4): transformationMat of every node
+    views = None  # list<np.ndarray>: world[i] of every node, handed out as transformationMat
+    draw_order = None  # np.ndarray: indices of the nodes with something to draw, in Component.draw order
+    mesh_centers = None  # np.ndarray(D, 3): model space bounding sphere center of every drawn node, in draw order
+    mesh_radii = None  # np.ndarray(D): model space bounding sphere radius of every drawn node, in draw order
+    meshes = None  # list<Displayable>(D): displayObj of every drawn node, in draw order
+    parent_mat = None  # parent transformation of the root used by the last update
+
+    def __init__(self, root):
+        """
+        :type root: Component
+        """
+        self.root = root
+        self.compile()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def compile(self):
+        """
+        Number the nodes of the tree in level order and allocate their matrices
+        """
+        nodes = [self.root]
+        parent = [-1]
+        levels = []
+        start = 0
+        while start < len(nodes):
+            end = len(nodes)
+            for i in range(start, end):
+                for child in nodes[i].children:
+                    nodes.append(child)
+                    parent.append(i)
+            if len(nodes) > end:
+                levels.append((end, len(nodes)))
+            start = end
+
+        index = {id(node): i for i, node in enumerate(nodes)}
+        drawOrder = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node.displayObj, Displayable):
+                drawOrder.append(index[id(node)])
+            stack.extend(node.children[::-1])
+
+        self.nodes = nodes
+        self.parent = np.array(parent, dtype=int)
+        self.levels = levels
+        self.local = np.zeros((len(nodes), 4, 4))
+        self.world = np.zeros((len(nodes), 4, 4))
+        self.views = list(self.world)
+        self.draw_order = np.array(drawOrder, dtype=int)
+        self.meshes = [nodes[i].displayObj for i in drawOrder]
+        spheres = [mesh.boundingSphere() for mesh in self.meshes]
+        self.mesh_centers = np.array([center for center, _ in spheres]).reshape(-1, 3)
+        self.mesh_radii = np.array([radius for _, radius in spheres], dtype=float)
+        self.parent_mat = None
+        for i, node in enumerate(nodes):
+            if node.localMat is not None:
+                self.local[i] = node.localMat
+        self.version = Component.topology_version
+
+    def update(self, parentTransformationMat=None):
+        """
+        Bring the world matrix of every node up to date
+
+        :param parentTransformationMat: transformation of the root's parent, identity by default
+        """
+        if parentTransformationMat is None:
+            parentTransformationMat = IDENTITY
+        if self.version != Component.topology_version:
+            self.compile()
+
+        dirty = [i for i, node in enumerate(self.nodes) if node.localDirty or node.localMat is None]
+        parentChanged = self.parent_mat is None or not np.array_equal(parentTransformationMat, self.parent_mat)
+        if not dirty and not parentChanged:
+            self.root.treeDirty = False
+            return
+
+        nodes = self.nodes
+        local = self.local
+        for i in dirty:
+            node = nodes[i]
+            node.localMat = local[i] = node.localTransformation()
+            node.localDirty = False
+        np.matmul(parentTransformationMat, local[0], out=self.world[0])
+        for start, end in self.levels:
+            np.matmul(self.world[self.parent[start:end]], local[start:end], out=self.world[start:end])
+        self.parent_mat = np.array(parentTransformationMat)
+
+        for node, view in zip(nodes, self.views):
+            node.transformationMat = view
+            node.treeDirty = False
+            node.boundsDirty = True
+            # recursive updates of a subtree recompute it from scratch
+            node.updatedParentMat = None
+
+    def modelMatrices(self):
+        """
+        Model matrices of the drawn nodes as uploaded to the shader, in draw order
+
+        :rtype: numpy.ndarray
+        """
+        return self.world[self.draw_order].transpose(0, 2, 1)
+
+    def cull(self, frustum):
+        """
+        Whether the bounding sphere of each drawn node intersects the frustum, in draw order. Visible DisplayableLODs
+        pick their level of detail on the way
+
+        :type frustum: Frustum
+        :rtype: numpy.ndarray of bool
+        """
+        return cullMeshes(frustum, self.world[self.draw_order], self.mesh_centers, self.mesh_radii, self.meshes)
+
+    def draw(self, shaderProg, frustum=None):
+        """
+        Draw every node with something to draw, in the same order as Component.draw
+
+        :param frustum: skip the nodes whose bounding sphere is outside of it, and pick levels of detail
+        :type frustum: Frustum
+        """
+        nodes = self.nodes
+        drawOrder = self.draw_order
+        modelMats = self.modelMatrices()
+        if frustum is not None:
+            visible = self.cull(frustum)
+            drawOrder = drawOrder[visible]
+            modelMats = modelMats[visible]
+        for i, modelMat in zip(drawOrder, modelMats):
+            node = nodes[i]
+            node.drawNode(shaderProg, modelMat, node.current_color)
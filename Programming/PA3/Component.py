@@ -19,6 +19,7 @@ import GLBuffer
 from Point import Point
 from ColorType import ColorType
 from Displayable import Displayable
+from DisplayableMesh import DisplayableLOD
 from Quaternion import Quaternion
 from GLUtility import GLUtility
 from GLBuffer import Texture
@@ -49,11 +50,58 @@ except ImportError:
     raise ImportError("Required dependency PyOpenGL not present")
 
 
+# parent transformation of components updated on their own
+IDENTITY = np.identity(4)
+IDENTITY.flags.writeable = False
+
+
+class TransformAttribute:
+    """
+    Attribute of a Component that its local transformation depends on: assigning it marks the component dirty, so
+    that the next update() rebuilds its transformation. Values changed in place must be assigned again (or the
+    component marked dirty) to take effect.
+    """
+
+    def __init__(self, default=None, cache=None):
+        """
+        :param cache: name of a cached product that involves this attribute, reset to None on assignment
+        """
+        self.default = default
+        self.cache = cache
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.__dict__.get(self.name, self.default)
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+        if self.cache is not None:
+            obj.__dict__[self.cache] = None
+        obj.markDirty()
+
+
 class Component:
     children = None  # list
+    sceneParent = None  # Component this one is a child of
+    topology_version = 0  # bumped whenever a child is added to or removed from any Component, see CompiledHierarchy
 
     # the homogeneous transformation matrix for the current joint
     transformationMat = None
+    # translation @ rotations @ scaling of this component alone, cached between updates
+    localMat = None
+    # parent transformation that transformationMat was last computed from
+    updatedParentMat = None
+    localDirty = True  # localMat has to be rebuilt
+    treeDirty = True  # this component or one of its descendants has to be updated
+    # world space bounding sphere of this subtree, recomputed on first use after an update() that reached it
+    boundCenter = None  # np.ndarray(3)
+    boundRadius = -1.0  # negative when nothing in the subtree is drawn
+    boundsDirty = True
 
     # a instance of class which inherit from Displayable
     # if this class is used as skeleton, then keep this empty
@@ -62,34 +110,45 @@ class Component:
     default_color = None  # ColorType
     current_color = None  # ColorType
     defaultPos = None  # Point
-    currentPos = None  # Point
+    currentPos = TransformAttribute()  # Point
 
     uAxis = None  # list<float>(3): local basis u
     vAxis = None  # list<float>(3): local basis v
     wAxis = None  # list<float>(3): local basis w
     default_uAngle = 0.0
-    uAngle = 0.0
+    uAngle = TransformAttribute(0.0)
     uRange = None  # list<float>(2)
     default_vAngle = 0.0
-    vAngle = 0.0
+    vAngle = TransformAttribute(0.0)
     vRange = None  # list<float>(2)
     default_wAngle = 0.0
-    wAngle = 0.0
+    wAngle = TransformAttribute(0.0)
     wRange = None  # list<float>(2)
     axisBucket = None
 
     defaultScaling = None
-    currentScaling = None
-
-    preRotationMat = None
-    postRotationMat = None
+    currentScaling = TransformAttribute(cache="suffixMat")
+
+    preRotationMat = TransformAttribute(cache="suffixMat")
+    postRotationMat = TransformAttribute(cache="prefixMat")
+    inRotation = TransformAttribute(cache="suffixMat")
+    outRotation = TransformAttribute(cache="prefixMat")
+    # constant parts of the local transformation, composed when first needed after one of them is set
+    prefixMat = None  # postRotationMat @ outRotation
+    suffixMat = None  # inRotation @ preRotationMat @ scaling
+    prefixIdentity = False  # prefixMat is the identity
+    suffixScaling = False  # suffixMat is the scaling alone
+    transformBuffers = None  # np.ndarray(6, 4, 4): scratch matrices reused by localTransformation
+    rotationKey = None  # (uAngle, vAngle, wAngle) of the Euler rotation held in transformBuffers[4]
 
     texture = None
     textureOn = False
 
     glUtility = None
 
-    quat = None
+    quat = TransformAttribute()
+    quatMatrix = None  # cached rotation matrix of quat
+    rotationTables = None  # list<RotationTable or None>(3): baked u/v/w rotations, see AnimationBaker
 
     def __init__(self, position, display_obj=None):
         """
@@ -151,6 +210,35 @@ class Component:
         # prevent the duplicate child to be added to the self.children
         if child not in self.children:
             self.children.append(child)
+            Component.topology_version += 1
+        child.sceneParent = self
+        child.treeDirty = False
+        child.markTreeDirty()
+
+    def removeChild(self, child):
+        """
+        Remove a child from this Component child list, keeping the child intact
+        """
+        self.children.remove(child)
+        child.sceneParent = None
+        Component.topology_version += 1
+
+    def markDirty(self):
+        """
+        Rebuild this component's transformation on the next update(). Called by every change of its position,
+        rotation or scaling
+        """
+        self.localDirty = True
+        self.markTreeDirty()
+
+    def markTreeDirty(self):
+        """
+        Make the next update() of the ancestors reach this component
+        """
+        node = self
+        while node is not None and not node.treeDirty:
+            node.treeDirty = True
+            node = node.sceneParent
 
     def clear(self):
         """
@@ -160,6 +248,7 @@ class Component:
             c.clear()
             self.children.remove(c)
             del c
+        Component.topology_version += 1
 
     def initialize(self):
         """
@@ -177,9 +266,31 @@ class Component:
         # use init value to generate transformation matrix for all children
         self.update()
 
-    def draw(self, shaderProg):
-        shaderProg.setMat4("modelMat", self.transformationMat.transpose())
-        shaderProg.setVec3("currentColor", self.current_color)
+    def draw(self, shaderProg, frustum=None):
+        """
+        Draw this component and all its children
+
+        :param frustum: skip every subtree whose bounding sphere is outside of it, and pick levels of detail
+        :type frustum: Frustum
+        """
+        if frustum is not None:
+            if not frustum.intersectsSphere(*self.worldBounds()):
+                return
+            if isinstance(self.displayObj, DisplayableLOD):
+                self.displayObj.select(frustum.screenSize(*self.meshBounds()))
+        self.drawNode(shaderProg, self.transformationMat.transpose(), self.current_color)
+
+        for c in self.children:
+            c.draw(shaderProg, frustum)
+
+    def drawNode(self, shaderProg, modelMat, color):
+        """
+        Draw this component alone, without its children, with the given model matrix and color
+
+        :param modelMat: model matrix as uploaded to the shader, i.e. the transposed transformationMat
+        """
+        shaderProg.setMat4("modelMat", modelMat)
+        shaderProg.setVec3("currentColor", color)
         if isinstance(self.displayObj, Displayable):
             if self.textureOn:
                 shaderProg.use()
@@ -189,41 +300,164 @@ class Component:
                 self.texture.unbind(shaderProg.getUniformLocation("textureImage"))
             self.displayObj.draw()
 
-        for c in self.children:
-            c.draw(shaderProg)
-
     def update(self, parentTransformationMat=None):
         """
         Apply translation, rotation and scaling to this component and all its children
         all matrix are stored in column-major order
         Must be called after any changes made to the instance
 
+        Only the parts of the tree that changed since the last update are recomputed: components whose local
+        transformation is dirty, and everything below them or below a changed parent transformation.
+
         :return: None
         """
         if parentTransformationMat is None:
-            parentTransformationMat = np.identity(4)
+            parentTransformationMat = IDENTITY
+        parent = self.sceneParent
+        if parent is not None and parent.transformationMat is not None and \
+                not np.array_equal(parentTransformationMat, parent.transformationMat):
+            # updated apart from its parent, e.g. on its own: the parent's next update has to redo it
+            parent.markTreeDirty()
+        self.updateTree(parentTransformationMat)
+
+    def updateTree(self, parentTransformationMat):
+        """
+        update() of this subtree from the parent transformation, skipping everything that is up to date
+        """
+        parentChanged = parentTransformationMat is not self.updatedParentMat
+        if parentChanged and self.updatedParentMat is not None and \
+                np.array_equal(parentTransformationMat, self.updatedParentMat):
+            self.updatedParentMat = parentTransformationMat
+            parentChanged = False
+        if not (parentChanged or self.treeDirty):
+            return
+
+        if self.localDirty or self.localMat is None:
+            self.localMat = self.localTransformation()
+            self.localDirty = False
+            parentChanged = True
+        if parentChanged:
+            self.transformationMat = parentTransformationMat @ self.localMat
+            self.updatedParentMat = parentTransformationMat
+        self.treeDirty = False
+        self.boundsDirty = True
+
+        for c in self.children:
+            c.updateTree(self.transformationMat)
+
+    def meshBounds(self):
+        """
+        World space bounding sphere of this component's own mesh, as of the last update()
+
+        :return: (center, radius), radius negative if there is nothing to draw
+        """
+        if not isinstance(self.displayObj, Displayable):
+            return None, -1.0
+        meshCenter, meshRadius = self.displayObj.boundingSphere()
+        linear = self.transformationMat[:3, :3]
+        center = linear @ meshCenter + self.transformationMat[:3, 3]
+        # the largest scaling of the transformation, so that non-uniform scaling stays bounded
+        return center, meshRadius * float(np.sqrt(np.max(np.sum(linear * linear, axis=0))))
+
+    def worldBounds(self):
+        """
+        World space sphere enclosing the meshes of this component and all its descendants, as of the last update().
+        Recomputed only for the parts of the tree that update() went through since it was last asked for.
 
-        translationMat = self.glUtility.translate(*self.currentPos.getCoords(), False)
+        :return: (center, radius), radius negative if there is nothing to draw
+        """
+        if not self.boundsDirty:
+            return self.boundCenter, self.boundRadius
+
+        center, radius = self.meshBounds()
+        for c in self.children:
+            childCenter, childRadius = c.worldBounds()
+            if childRadius < 0:
+                continue
+            if radius < 0:
+                center, radius = childCenter, childRadius
+                continue
+            if np.isinf(radius) or np.isinf(childRadius):
+                radius = np.inf
+                continue
+            # smallest sphere around both
+            distance = float(np.linalg.norm(childCenter - center))
+            if distance + childRadius <= radius:
+                continue
+            if distance + radius <= childRadius:
+                center, radius = childCenter, childRadius
+                continue
+            merged = (distance + radius + childRadius) / 2
+            center = center + (childCenter - center) * ((merged - radius) / distance)
+            radius = merged
+
+        self.boundCenter = center
+        self.boundRadius = radius
+        self.boundsDirty = False
+        return center, radius
+
+    def localTransformation(self):
+        """
+        translation @ rotations @ scaling of this component, relative to its parent.
+        The result is written into a buffer of this component, valid until the next call.
+        """
+        buffers = self.transformBuffers
+        if buffers is None:
+            buffers = self.transformBuffers = np.empty((6, 4, 4))
 
         # if self.quat is set, use the quaternion as your rotation matrix.
         # otherwise, use Euler angles with rotation extents, etc.
         # this means that quaternions will always override the settings for Euler angles
 
         if self.quat != None:
-            rotationMatU = self.quat.toMatrix().transpose()
-            rotationMatV = np.identity(4)
-            rotationMatW = np.identity(4)
+            if self.quatMatrix is None:
+                self.quatMatrix = self.quat.toMatrix().transpose()
+            rotationMat = self.quatMatrix
         else:
-            rotationMatU = self.glUtility.rotate(self.uAngle, self.uAxis, False)
-            rotationMatV = self.glUtility.rotate(self.vAngle, self.vAxis, False)
-            rotationMatW = self.glUtility.rotate(self.wAngle, self.wAxis, False)
-        scalingMat = self.glUtility.scale(*self.currentScaling, False)
-
-        self.transformationMat = parentTransformationMat @ translationMat @ self.postRotationMat @ self.outRotation @ rotationMatU @ rotationMatV @ \
-                                 rotationMatW @ self.inRotation @ self.preRotationMat @ scalingMat
-
-        for c in self.children:
-            c.update(self.transformationMat)
+            # the Euler rotation is only rebuilt when one of the angles moved
+            rotationMat = buffers[4]
+            angles = (self.uAngle, self.vAngle, self.wAngle)
+            if angles != self.rotationKey:
+                if self.rotationTables is not None:
+                    rotationMatU, rotationMatV, rotationMatW = (
+                        self.bakedRotation(table, angle, axis, out) for table, angle, axis, out in
+                        zip(self.rotationTables, angles, self.axisBucket, buffers))
+                    np.matmul(np.matmul(rotationMatU, rotationMatV, out=buffers[3]), rotationMatW, out=rotationMat)
+                else:
+                    self.glUtility.rotateUVW(angles, self.axisBucket, False, rotationMat)
+                self.rotationKey = angles
+
+        # pre/post/in/out rotations and scaling rarely change, their products are kept until they do
+        if self.prefixMat is None:
+            self.prefixMat = self.postRotationMat @ self.outRotation
+            self.prefixIdentity = np.array_equal(self.prefixMat, IDENTITY)
+        if self.suffixMat is None:
+            scalingMat = self.glUtility.scale(*self.currentScaling, False)
+            self.suffixMat = self.inRotation @ self.preRotationMat @ scalingMat
+            self.suffixScaling = np.array_equal(self.suffixMat, scalingMat)
+
+        if self.prefixIdentity and self.suffixScaling:
+            # plain translation @ rotation @ scaling, built directly instead of with two matrix products
+            return self.glUtility.trs(self.currentPos.coords, rotationMat, self.currentScaling, False, buffers[5])
+
+        local = np.matmul(np.matmul(self.prefixMat, rotationMat, out=buffers[3]), self.suffixMat, out=buffers[5])
+        # translation @ local: the rest is affine, so this only adds the translation to the last column
+        local[:3, 3] += self.currentPos.coords
+        return local
+
+    def bakedRotation(self, table, angle, axis, out=None):
+        """
+        Rotation matrix of angle about axis, looked up in a baked RotationTable when it holds the angle
+
+        :param out: where to build the matrix when the table does not hold it
+        """
+        if table is not None:
+            matrix = table.matrix(angle)
+            if matrix is not None:
+                return matrix
+        elif angle == 0:
+            return IDENTITY
+        return self.glUtility.rotate(angle, axis, False, out)
 
     def rotate(self, degree, axis):
         """
@@ -340,7 +574,6 @@ class Component:
             self.vAngle = self.clamp(angle, self.vRange[0], self.vRange[1])
         else:
             self.wAngle = self.clamp(angle, self.wRange[0], self.wRange[1])
-        self.update()
 
     def setDefaultAngle(self, angle, axis):
         """
@@ -388,7 +621,6 @@ class Component:
             raise ValueError("Component only accept uniform scaling")"""
         self.defaultScaling = copy.deepcopy(scale)
         self.currentScaling = copy.deepcopy(self.defaultScaling)
-        self.update()
 
     def setDefaultColor(self, color):
         """
@@ -412,7 +644,6 @@ class Component:
         if not isinstance(pos, Point):
             raise TypeError("pos should have type Point")
         self.currentPos = pos.copy()
-        self.update()
 
     def setCurrentColor(self, color):
         """
@@ -443,7 +674,6 @@ class Component:
         if min(scale) != max(scale):
             raise ValueError("Component only accept uniform scaling")
         self.currentScaling = copy.deepcopy(scale)
-        self.update()
 
     def setPreRotation(self, rotation_matrix=None):
         """
@@ -480,25 +710,37 @@ class Component:
             raise TypeError("axis should have the same size as the current one")
         for i in range(len(u)):
             self.uAxis[i] = u[i]
+        self.rotationKey = None
+        self.markDirty()
 
     def setV(self, v):
         if len(v) != len(self.vAxis):
             raise TypeError("axis should have the same size as the current one")
         for i in range(len(v)):
             self.vAxis[i] = v[i]
+        self.rotationKey = None
+        self.markDirty()
 
     def setW(self, w):
         if len(w) != len(self.wAxis):
             raise TypeError("axis should have the same size as the current one")
         for i in range(len(w)):
             self.wAxis[i] = w[i]
+        self.rotationKey = None
+        self.markDirty()
     
-    def setQuaternion(self, q):
-        """ sets a quaternion for rotation """
+    def setQuaternion(self, q, rotationMat=None):
+        """
+        sets a quaternion for rotation. Its matrix is cached, call this again after changing q in place
+
+        :param rotationMat: q's rotation matrix as used by update (q.toMatrix().transpose()), if already known
+        """
         if not isinstance(q, Quaternion):
             raise TypeError("q must be of type Quaternion")
+        self.quatMatrix = rotationMat
         self.quat = q
 
     def clearQuaternion(self):
         """ clears the existing quaternion """
+        self.quatMatrix = None
         self.quat = None
@@ -5,6 +5,8 @@ Created on 20181021
 @description: Define displayable interface at here. Object inherit from Displayable can be displayed on screen use draw method. And shape of it should be defined at initialize method. 
 '''
 
+import numpy as np
+
 
 class Displayable:
     """
@@ -12,10 +14,29 @@ class Displayable:
     """
     callListHandle = 0
     parent = None  # parent class, used for SetCurrent
+    bounds = None  # (center, radius): model space bounding sphere, computed on first use
 
     def __init__(self):
         pass
 
+    def boundingSphere(self):
+        """
+        Model space sphere enclosing every vertex, used for frustum culling. Meshes keep their vertices in the
+        interleaved 11 float layout of DisplayableMesh, position first; anything without vertices gets an infinite
+        sphere and is never culled.
+
+        :return: (center, radius)
+        """
+        if self.bounds is None:
+            vertices = getattr(self, "vertices", None)
+            if vertices is None or len(vertices) < 11:
+                self.bounds = (np.zeros(3), np.inf)
+            else:
+                positions = np.asarray(vertices, dtype=float).reshape(-1, 11)[:, :3]
+                center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+                self.bounds = (center, float(np.max(np.linalg.norm(positions - center, axis=1))))
+        return self.bounds
+
     def draw(self):
         raise NotImplementedError
 
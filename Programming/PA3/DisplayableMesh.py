@@ -113,3 +113,66 @@ class DisplayableMesh(Displayable):
 
         self.vao.unbind()
 
+
+
+class DisplayableLOD(Displayable):
+    """
+    A high and a low poly DisplayableMesh of the same shape, of which only one is drawn at a time. select() picks one
+    from how large the shape appears on screen, with some hysteresis so that a shape right at the switching size does
+    not flicker between both.
+    """
+    meshes = None  # list<DisplayableMesh>(2): high poly, low poly
+    level = 0  # index of the mesh being drawn
+    shaderProg = None
+    defaultColor = None
+
+    # projected diameter, as a fraction of the viewport height, below which the low poly mesh is drawn
+    SWITCH_SIZE = 0.04
+    # relative band around SWITCH_SIZE in which the current mesh is kept
+    HYSTERESIS = 0.25
+
+    def __init__(self, shaderProg, scale, vertexData, indexData, vertexDataLP, indexDataLP, color=ColorType.BLUE):
+        """
+        :param vertexData: vertices of the high poly mesh, see DisplayableMesh
+        :param indexData: triangle indices of the high poly mesh
+        :param vertexDataLP: vertices of the low poly mesh
+        :param indexDataLP: triangle indices of the low poly mesh
+        """
+        super(DisplayableLOD, self).__init__()
+        self.meshes = [DisplayableMesh(shaderProg, scale, vertexData, indexData, color),
+                       DisplayableMesh(shaderProg, scale, vertexDataLP, indexDataLP, color)]
+        self.defaultColor = self.meshes[0].defaultColor
+        self.shaderProg = shaderProg
+
+    @property
+    def vertices(self):
+        return self.meshes[self.level].vertices
+
+    @property
+    def indices(self):
+        return self.meshes[self.level].indices
+
+    def boundingSphere(self):
+        # the high poly mesh, so that the bounds do not change with the level
+        return self.meshes[0].boundingSphere()
+
+    def select(self, screenSize):
+        """
+        Pick the mesh to draw next
+
+        :param screenSize: projected diameter of the bounding sphere, as a fraction of the viewport height
+        :type screenSize: float
+        :return: the level now drawn, 0 for high poly and 1 for low poly
+        """
+        if self.level == 0 and screenSize < self.SWITCH_SIZE * (1 - self.HYSTERESIS):
+            self.level = 1
+        elif self.level == 1 and screenSize > self.SWITCH_SIZE * (1 + self.HYSTERESIS):
+            self.level = 0
+        return self.level
+
+    def draw(self):
+        self.meshes[self.level].draw()
+
+    def initialize(self):
+        for mesh in self.meshes:
+            mesh.initialize()
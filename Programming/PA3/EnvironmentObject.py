@@ -10,10 +10,63 @@ modified by Daniel Scrivener 08/2022
 
 import math
 from Point import Point
-from Quaternion import Quaternion
+from Quaternion import Quaternion, QuaternionArray
 import numpy as np
 
 
+class OrientationBatch:
+    """
+    Collects the rotateDirection calls made while it is active and orients all the objects at once when it is
+    closed, with QuaternionArray. Only the last request of each object counts, as if it had been applied directly.
+
+    Usage:
+        with batch:
+            ... objects with orientation_batch = batch call rotateDirection ...
+
+    :ivar turn_rate: fraction of the way each object turns toward its requested direction per batch, through slerp.
+        1 snaps to the requested direction exactly like rotateDirection
+    """
+    turn_rate = 1.0
+    collecting = False
+    requests = None  # dict<int, (EnvironmentObject, target, forward, up)>
+
+    def __init__(self, turn_rate=1.0):
+        self.turn_rate = turn_rate
+        self.requests = {}
+
+    def __enter__(self):
+        self.collecting = True
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.collecting = False
+        self.apply()
+
+    def request(self, obj, v1, local_forward, world_up):
+        self.requests[id(obj)] = (obj, v1.coords, local_forward.coords, world_up.coords)
+
+    def apply(self):
+        """
+        Orient every object that requested a direction
+        """
+        if not self.requests:
+            return
+        entries = list(self.requests.values())
+        self.requests.clear()
+        targets, facing = QuaternionArray.fromTwoVectors([e[1] for e in entries], [e[2] for e in entries],
+                                                         [e[3] for e in entries])
+        if self.turn_rate < 1.0:
+            current = QuaternionArray.fromQuaternions([e[0].quat for e in entries])
+            targets = current.slerp(targets, self.turn_rate)
+            facing[:] = False
+        matrices = targets.toMatrix().transpose(0, 2, 1)
+        for i, entry in enumerate(entries):
+            if facing[i]:
+                entry[0].clearQuaternion()
+            else:
+                entry[0].setQuaternion(targets[i], matrices[i])
+
+
 class EnvironmentObject:
     """
     Define properties and interface for a object in our environment
@@ -21,6 +74,8 @@ class EnvironmentObject:
     env_obj_list = None  # list<Environment>
     item_id = 0
     species_id = 0
+    eaten = False
+    orientation_batch = None  # OrientationBatch that rotateDirection defers to while it is collecting
 
     bound_radius = None
     bound_center = Point((0,0,0))
@@ -51,6 +106,13 @@ class EnvironmentObject:
         """
         return
 
+    def recycle(self, position):
+        """
+        Put a removed object back into a fresh state at a new position so that it can be reused.
+        """
+        self.eaten = False
+        self.setCurrentPosition(position)
+
     ##### TODO 4: Eyes on the road!
         # Requirements:
         #   1. Creatures should face in the direction they are moving. For instance, a fish should be facing the
@@ -63,6 +125,10 @@ class EnvironmentObject:
         :param v1: targed facing direction
         :type v1: Point
         """
+        if self.orientation_batch is not None and self.orientation_batch.collecting:
+            self.orientation_batch.request(self, v1, local_forward, world_up)
+            return
+
         # Normalize input vectors
         target = np.array(v1.coords, dtype=float)
         target /= np.linalg.norm(target)
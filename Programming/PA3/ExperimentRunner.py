@@ -0,0 +1,200 @@
+"""
+Parameter sweeps over headless vivariums, run in parallel.
+
+Every combination of the swept parameters is run once per seed, each run in its own headless Vivarium (see
+Headless.py) on a pool of worker processes. Results are printed as soon as a run finishes, then averaged over the
+seeds of every parameter set into one table.
+
+Parameters are either creature class attributes, written as "Prey.step_size" or "Predator.hunt_strength", or
+"food_rate", the number of food particles dropped per step (fractions accumulate).
+
+Usage:
+    python ExperimentRunner.py --param Prey.step_size=0.01,0.02,0.04 --param food_rate=0.05,0.2 \
+        --seeds 0 1 2 3 --steps 2000 --csv sweep.csv
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+METRICS = ("food_eaten", "prey_survival", "steps_per_second")
+
+
+def tunableClasses():
+    from ModelLinkage import Prey, Predator
+    return {"Prey": Prey, "Predator": Predator}
+
+
+def applyParameters(params):
+    """
+    Set the creature class attributes named in params
+
+    :return: the previous values, to restore them afterwards
+    :rtype: dict
+    """
+    classes = tunableClasses()
+    previous = {}
+    for name, value in params.items():
+        if "." not in name:
+            continue
+        className, attribute = name.split(".", 1)
+        cls = classes.get(className)
+        if cls is None or not hasattr(cls, attribute):
+            raise ValueError(f"Unknown experiment parameter {name}")
+        previous[name] = getattr(cls, attribute)
+        setattr(cls, attribute, value)
+    return previous
+
+
+def runExperiment(params, seed, steps=1000, numPredators=1, numPrey=4, vivariumArgs=None):
+    """
+    Run one headless vivarium and measure it. Runs in a worker process.
+
+    :param params: parameter name -> value, see the module documentation
+    :return: dict with the parameters, the seed and the metrics
+    """
+    from Headless import headlessVivarium
+
+    previous = applyParameters(params)
+    try:
+        vivarium = headlessVivarium(numPredators, numPrey, seed=seed, **(vivariumArgs or {}))
+        foodRate = params.get("food_rate", 0.0)
+        pending = 0.0
+        spawned = 0
+
+        start = time.perf_counter()
+        for _ in range(steps):
+            pending += foodRate
+            while pending >= 1.0:
+                vivarium.spawnFood()
+                spawned += 1
+                pending -= 1.0
+            vivarium.animationUpdate()
+        elapsed = time.perf_counter() - start
+
+        preyLeft = sum(1 for c in vivarium.creatures if c.species_id == 2)
+    finally:
+        applyParameters(previous)
+
+    result = dict(params)
+    result.update({
+        "seed": seed,
+        "steps": steps,
+        "food_spawned": spawned,
+        # food only ever leaves the tank by being eaten
+        "food_eaten": spawned - len(vivarium.food_obj),
+        "prey_survival": preyLeft / numPrey if numPrey else float("nan"),
+        "steps_per_second": steps / elapsed if elapsed > 0 else float("inf"),
+    })
+    return result
+
+
+def parameterGrid(sweep):
+    """
+    Every combination of the swept values
+
+    :param sweep: parameter name -> list of values
+    :rtype: list<dict>
+    """
+    names = list(sweep)
+    return [dict(zip(names, values)) for values in itertools.product(*(sweep[n] for n in names))]
+
+
+def runSweep(sweep, seeds, steps=1000, numPredators=1, numPrey=4, workers=None, vivariumArgs=None):
+    """
+    Run every parameter set of the sweep once per seed on a process pool
+
+    :param workers: number of worker processes, all cores by default
+    :return: generator of the run results, in the order they finish
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(runExperiment, params, seed, steps, numPredators, numPrey, vivariumArgs)
+                   for params in parameterGrid(sweep) for seed in seeds]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def aggregate(results, parameterNames):
+    """
+    Mean and standard deviation of every metric over the seeds of each parameter set
+
+    :return: one row per parameter set, with <metric>_mean and <metric>_std columns
+    :rtype: list<dict>
+    """
+    groups = {}
+    for result in results:
+        key = tuple(result[name] for name in parameterNames)
+        groups.setdefault(key, []).append(result)
+
+    table = []
+    for key in sorted(groups):
+        runs = groups[key]
+        row = dict(zip(parameterNames, key))
+        row["runs"] = len(runs)
+        for metric in METRICS:
+            values = np.array([r[metric] for r in runs], dtype=float)
+            row[metric + "_mean"] = float(np.mean(values))
+            row[metric + "_std"] = float(np.std(values))
+        table.append(row)
+    return table
+
+
+def parseSweep(arguments):
+    """
+    "name=v1,v2,..." strings -> {name: [v1, v2, ...]}
+    """
+    sweep = {}
+    for argument in arguments:
+        name, _, values = argument.partition("=")
+        if not values:
+            raise ValueError(f"Expected name=value[,value...], got {argument}")
+        sweep[name.strip()] = [float(v) for v in values.split(",")]
+    return sweep
+
+
+def formatValue(value):
+    if isinstance(value, float):
+        return f"{value:.4g}" if math.isfinite(value) else str(value)
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel vivarium parameter sweeps")
+    parser.add_argument("--param", action="append", default=[],
+                        help="swept parameter, e.g. Prey.step_size=0.01,0.02. May be repeated")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2, 3])
+    parser.add_argument("--steps", type=int, default=1000, help="steps per run")
+    parser.add_argument("--predators", type=int, default=1)
+    parser.add_argument("--prey", type=int, default=4)
+    parser.add_argument("--workers", type=int, help="worker processes, all cores by default")
+    parser.add_argument("--csv", help="also write the aggregated table to this csv file")
+    args = parser.parse_args()
+
+    sweep = parseSweep(args.param)
+    names = list(sweep)
+    results = []
+    for result in runSweep(sweep, args.seeds, args.steps, args.predators, args.prey, args.workers):
+        results.append(result)
+        print(" ".join(f"{k}={formatValue(result[k])}" for k in names + ["seed"] + list(METRICS)), flush=True)
+
+    table = aggregate(results, names)
+    columns = list(table[0].keys()) if table else []
+    print()
+    print(" ".join(f"{c:>20}" for c in columns))
+    for row in table:
+        print(" ".join(f"{formatValue(row[c]):>20}" for c in columns))
+
+    if args.csv and table:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(table)
+
+
+if __name__ == "__main__":
+    main()
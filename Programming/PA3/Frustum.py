@@ -0,0 +1,122 @@
+"""
+View frustum of a camera, for culling bounding spheres before they are drawn.
+
+The six clipping planes are read off the rows of the combined projection @ view matrix (Gribb and Hartmann): a point
+p is inside the frustum when every plane (n, d) gives n . p + d >= 0. A sphere is culled only when it lies entirely
+on the outer side of one plane, so a few spheres near the corners of the frustum are kept although they are not
+visible; nothing visible is ever culled.
+
+The frustum also tells how large a sphere appears on screen, for picking a level of detail (see DisplayableLOD).
+"""
+
+import numpy as np
+
+from DisplayableMesh import DisplayableLOD
+
+
+class Frustum:
+    planes = None  # np.ndarray(6, 4): left, right, bottom, top, near and far planes (n, d), |n| = 1, n facing inwards
+    depthPlane = None  # np.ndarray(4): last row of projection @ view, the depth of a point in front of the camera
+    focal = 1.0  # vertical scaling of the projection, cot(fov / 2)
+
+    def __init__(self, viewMat, perspMat, columnMajor=True):
+        """
+        :param viewMat: view matrix, as returned by GLUtility.view
+        :param perspMat: projection matrix, as returned by GLUtility.perspective
+        :param columnMajor: whether both matrices are in the column-major order uploaded to the shader
+        """
+        if columnMajor:
+            clip = (np.asarray(viewMat) @ np.asarray(perspMat)).T
+        else:
+            clip = np.asarray(perspMat) @ np.asarray(viewMat)
+        planes = np.empty((6, 4))
+        for axis in range(3):
+            planes[2 * axis] = clip[3] + clip[axis]
+            planes[2 * axis + 1] = clip[3] - clip[axis]
+        planes /= np.linalg.norm(planes[:, :3], axis=1)[:, np.newaxis]
+        self.planes = planes
+        self.depthPlane = clip[3].copy()
+        self.focal = float(np.asarray(perspMat)[1, 1])
+
+    def intersectsSphere(self, center, radius):
+        """
+        Whether any part of the sphere may be inside the frustum
+
+        :param center: world space center
+        :type center: numpy.ndarray
+        :param radius: negative for an empty sphere, which is never inside
+        :type radius: float
+        """
+        if radius < 0:
+            return False
+        return bool(np.all(self.planes[:, :3] @ center + self.planes[:, 3] >= -radius))
+
+    def intersectsSpheres(self, centers, radii):
+        """
+        intersectsSphere of N spheres at once
+
+        :param centers: np.ndarray(N, 3)
+        :param radii: np.ndarray(N)
+        :rtype: numpy.ndarray(N) of bool
+        """
+        distances = centers @ self.planes[:, :3].T + self.planes[:, 3]
+        return np.all(distances >= -radii[:, np.newaxis], axis=1) & (radii >= 0)
+
+    def screenSize(self, center, radius):
+        """
+        Projected diameter of a sphere as a fraction of the viewport height, infinite when the sphere reaches behind
+        the camera
+        """
+        depth = float(self.depthPlane[:3] @ center + self.depthPlane[3])
+        if depth <= radius:
+            return np.inf
+        return radius * self.focal / depth
+
+    def screenSizes(self, centers, radii):
+        """
+        screenSize of N spheres at once
+
+        :param centers: np.ndarray(N, 3)
+        :param radii: np.ndarray(N)
+        :rtype: numpy.ndarray(N)
+        """
+        depths = centers @ self.depthPlane[:3] + self.depthPlane[3]
+        sizes = np.full(len(radii), np.inf)
+        ahead = depths > radii
+        sizes[ahead] = radii[ahead] * self.focal / depths[ahead]
+        return sizes
+
+
+def transformSpheres(worldMats, centers, radii):
+    """
+    Bounding spheres of N meshes in world space, from their model space spheres and transformations. The radius is
+    scaled by the largest scaling of each transformation, so the sphere stays a bound under non-uniform scaling.
+
+    :param worldMats: np.ndarray(N, 4, 4), row-major transformationMat of every mesh
+    :param centers: np.ndarray(N, 3), model space centers
+    :param radii: np.ndarray(N), model space radii
+    :return: world space centers and radii
+    """
+    linear = worldMats[:, :3, :3]
+    worldCenters = np.einsum("nij,nj->ni", linear, centers) + worldMats[:, :3, 3]
+    scaling = np.sqrt(np.max(np.einsum("nij,nij->nj", linear, linear), axis=1))
+    return worldCenters, radii * scaling
+
+
+def cullMeshes(frustum, worldMats, centers, radii, meshes):
+    """
+    Frustum culling and level of detail selection of N meshes in one batch
+
+    :param worldMats: np.ndarray(N, 4, 4), row-major transformationMat of every mesh
+    :param centers: np.ndarray(N, 3), model space bounding sphere centers
+    :param radii: np.ndarray(N), model space bounding sphere radii
+    :param meshes: the N Displayables. Those of them that are visible DisplayableLODs pick their level
+    :return: np.ndarray(N) of bool, whether each mesh is visible
+    """
+    centers, radii = transformSpheres(worldMats, centers, radii)
+    visible = frustum.intersectsSpheres(centers, radii)
+    lods = [i for i in np.flatnonzero(visible) if isinstance(meshes[i], DisplayableLOD)]
+    if lods:
+        for i, size in zip(lods, frustum.screenSizes(centers[lods], radii[lods])):
+            meshes[i].select(size)
+    return visible
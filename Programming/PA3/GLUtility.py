@@ -27,6 +27,15 @@ import math
 import numpy as np
 
 
+def identityInto(out):
+    """
+    Fill a (..., 4, 4) array with identity matrices in place
+    """
+    out[...] = 0
+    out[..., 0, 0] = out[..., 1, 1] = out[..., 2, 2] = out[..., 3, 3] = 1
+    return out
+
+
 # used to handle the case when viewing dir is the same as upVector
 # if that case is detected, to provide smooth view matrix, then use lastUpAxis as upVector
 class GLUtility:
@@ -35,7 +44,10 @@ class GLUtility:
     def __init__(self):
         self.lastUpAxis = np.array([0, 1, 0])
 
-    def view(self, cameraPos, lookAtPoint, upVector, columnMajor=True):
+    def view(self, cameraPos, lookAtPoint, upVector, columnMajor=True, out=None):
+        """
+        :param out: (4, 4) array to write the matrix into instead of allocating one
+        """
         cameraPos = np.array(cameraPos)
         lookAtPoint = np.array(lookAtPoint)
         upVector = np.array(upVector)
@@ -60,26 +72,39 @@ class GLUtility:
 
         xAxis = np.cross(upAxis, viewingDir)
         xAxis = xAxis / np.linalg.norm(xAxis)
-        basisMatrix = np.identity(4)
-        basisMatrix[0, 0:3] = xAxis
-        basisMatrix[1, 0:3] = upAxis
-        basisMatrix[2, 0:3] = viewingDir
+        if out is None:
+            basisMatrix = np.identity(4)
+            basisMatrix[0, 0:3] = xAxis
+            basisMatrix[1, 0:3] = upAxis
+            basisMatrix[2, 0:3] = viewingDir
 
-        translateMatrix = self.translate(*(-cameraPos), columnMajor=False)
+            translateMatrix = self.translate(*(-cameraPos), columnMajor=False)
 
-        viewMatrix = basisMatrix @ translateMatrix
-        return viewMatrix.transpose() if columnMajor else viewMatrix
+            viewMatrix = basisMatrix @ translateMatrix
+            return viewMatrix.transpose() if columnMajor else viewMatrix
+
+        # basis @ translation in closed form: the basis rows, and their dot products with -cameraPos
+        viewMatrix = out.T if columnMajor else out
+        identityInto(viewMatrix)
+        for row, axis in enumerate((xAxis, upAxis, viewingDir)):
+            viewMatrix[row, 0:3] = axis
+            viewMatrix[row, 3] = -float(np.dot(axis, cameraPos))
+        return out
 
     @staticmethod
-    def scale(xS, yS, zS, columnMajor=True):
-        result = np.identity(4)
+    def scale(xS, yS, zS, columnMajor=True, out=None):
+        """
+        :param out: (4, 4) array to write the matrix into instead of allocating one
+        """
+        result = np.identity(4) if out is None else identityInto(out)
         result[0, 0] = xS
         result[1, 1] = yS
         result[2, 2] = zS
-        return result.transpose() if columnMajor else result
+        # diagonal, the same in both orders
+        return result
 
     @staticmethod
-    def perspective(fov, width, height, znear, zfar, columnMajor=True):
+    def perspective(fov, width, height, znear, zfar, columnMajor=True, out=None):
         """
         get perspective matrix of camera
 
@@ -93,10 +118,16 @@ class GLUtility:
         :type znear: float
         :param zfar: frustum z-far
         :type zfar: float
+        :param out: (4, 4) array to write the matrix into instead of allocating one
         """
         znear = znear if znear != 0 else 0.001
 
-        result = np.zeros((4, 4))
+        if out is None:
+            result = np.zeros((4, 4))
+        else:
+            out[...] = 0
+            result = out.T if columnMajor else out
+            columnMajor = False
         halfRad = fov / 180 * math.pi * 0.5
         h = math.cos(halfRad) / math.sin(halfRad)
         w = h * height / width
@@ -105,13 +136,23 @@ class GLUtility:
         result[2, 2] = - (zfar + znear) / (zfar - znear)
         result[2, 3] = - (2 * zfar * znear) / (zfar - znear)
         result[3, 2] = -1
+        if out is not None:
+            return out
         return result.transpose() if columnMajor else result
 
     @staticmethod
-    def translate(x, y, z, columnMajor=True):
+    def translate(x, y, z, columnMajor=True, out=None):
         """
         4x4 homogeneous translation matrix
+
+        :param out: (4, 4) array to write the matrix into instead of allocating one
         """
+        if out is not None:
+            result = identityInto(out.T if columnMajor else out)
+            result[0, 3] = x
+            result[1, 3] = y
+            result[2, 3] = z
+            return out
         result = np.identity(4)
         result[0, 3] = x
         result[1, 3] = y
@@ -119,7 +160,12 @@ class GLUtility:
         return result.transpose() if columnMajor else result
 
     @staticmethod
-    def rotate(angle, rotationAxis, columnMajor=True):
+    def rotate(angle, rotationAxis, columnMajor=True, out=None):
+        """
+        Rotation of angle degrees about rotationAxis, built in closed form from the unit quaternion of the rotation
+
+        :param out: (4, 4) array to write the matrix into instead of allocating one
+        """
         a = angle / 180 * math.pi
 
         sinHalfAngle = math.sin(0.5 * a)
@@ -133,13 +179,18 @@ class GLUtility:
         # normalize
         norm = math.sqrt(s*s + a*a + b*b + c*c)
         if norm < 1e-6:
-            return np.identity(4)
+            return np.identity(4) if out is None else identityInto(out)
         s /= norm
         a /= norm
         b /= norm
         c /= norm
 
-        result = np.zeros((4, 4))
+        if out is None:
+            result = np.zeros((4, 4))
+        else:
+            out[...] = 0
+            result = out.T if columnMajor else out
+            columnMajor = False
         result[0, 0] = 1 - 2 * b * b - 2 * c * c
         result[1, 0] = 2 * a * b + 2 * s * c
         result[2, 0] = 2 * a * c - 2 * s * b
@@ -151,4 +202,77 @@ class GLUtility:
         result[2, 2] = 1 - 2 * a * a - 2 * b * b
         result[3, 3] = 1
 
+        if out is not None:
+            return out
+        return result.transpose() if columnMajor else result
+
+    @staticmethod
+    def rotateUVW(angles, axes, columnMajor=True, out=None):
+        """
+        rotate(angles[0], axes[0]) @ rotate(angles[1], axes[1]) @ rotate(angles[2], axes[2]) in closed form: the
+        three rotation quaternions are multiplied first and turned into a matrix once
+
+        :param angles: three angles in degrees
+        :param axes: three rotation axes
+        :param out: (4, 4) array to write the matrix into instead of allocating one
+        """
+        s, x, y, z = 1.0, 0.0, 0.0, 0.0
+        for angle, axis in zip(angles, axes):
+            if angle == 0:
+                continue
+            half = angle / 360 * math.pi
+            sinHalfAngle = math.sin(half)
+            qs = math.cos(half)
+            qa = sinHalfAngle * axis[0]
+            qb = sinHalfAngle * axis[1]
+            qc = sinHalfAngle * axis[2]
+            # normalized as in rotate, so that non-unit axes give the same rotation
+            norm = math.sqrt(qs * qs + qa * qa + qb * qb + qc * qc)
+            if norm < 1e-6:
+                continue
+            qs /= norm
+            qa /= norm
+            qb /= norm
+            qc /= norm
+            s, x, y, z = (s * qs - x * qa - y * qb - z * qc,
+                          s * qa + qs * x + y * qc - z * qb,
+                          s * qb + qs * y + z * qa - x * qc,
+                          s * qc + qs * z + x * qb - y * qa)
+
+        if out is None:
+            result = np.zeros((4, 4))
+        else:
+            out[...] = 0
+            result = out.T if columnMajor else out
+        result[0, 0] = 1 - 2 * y * y - 2 * z * z
+        result[1, 0] = 2 * x * y + 2 * s * z
+        result[2, 0] = 2 * x * z - 2 * s * y
+        result[0, 1] = 2 * x * y - 2 * s * z
+        result[1, 1] = 1 - 2 * x * x - 2 * z * z
+        result[2, 1] = 2 * y * z + 2 * s * x
+        result[0, 2] = 2 * x * z + 2 * s * y
+        result[1, 2] = 2 * y * z - 2 * s * x
+        result[2, 2] = 1 - 2 * x * x - 2 * y * y
+        result[3, 3] = 1
+        if out is not None:
+            return out
+        return result.transpose() if columnMajor else result
+
+    @staticmethod
+    def trs(translation, rotation, scaling, columnMajor=True, out=None):
+        """
+        translate @ rotation @ scale in one pass: the rotation's columns scaled, with the translation as last column
+
+        :param translation: (3,)
+        :param rotation: (3, 3) or (4, 4) rotation matrix, row-major
+        :param scaling: (3,) scale along every axis
+        :param out: (4, 4) array to write the matrix into instead of allocating one
+        """
+        result = np.empty((4, 4)) if out is None else (out.T if columnMajor else out)
+        np.multiply(rotation[:3, :3], scaling, out=result[:3, :3])
+        result[:3, 3] = translation
+        result[3, :3] = 0
+        result[3, 3] = 1
+        if out is not None:
+            return out
         return result.transpose() if columnMajor else result
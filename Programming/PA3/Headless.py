@@ -0,0 +1,78 @@
+"""
+Run the vivarium without a window or an OpenGL context, for benchmarks and batch experiments.
+
+installGLStubs() replaces the OpenGL entry points used by GLBuffer with no-ops, so meshes can be built,
+"initialized" and "drawn" without a context. HeadlessShaderProgram stands in for a compiled GLProgram.
+Call installGLStubs() before building any Component. Never use this in a process that also renders.
+"""
+
+import OpenGL.GL as gl
+
+# every GL call made while building, initializing and drawing a scene graph
+STUBBED_GL_FUNCTIONS = (
+    "glGenBuffers", "glGenVertexArrays", "glBindVertexArray", "glBindBuffer", "glBufferData",
+    "glVertexAttribPointer", "glEnableVertexAttribArray", "glDrawElements", "glDrawArrays",
+    "glGenTextures", "glBindTexture", "glActiveTexture", "glUniform1i", "glTexImage2D",
+    "glGenerateMipmap", "glTexParameteri",
+)
+
+
+def _glStub(*args, **kwargs):
+    return 1
+
+
+def installGLStubs():
+    """
+    Turn the GL calls listed in STUBBED_GL_FUNCTIONS into no-ops for the rest of this process
+    """
+    for name in STUBBED_GL_FUNCTIONS:
+        setattr(gl, name, _glStub)
+
+
+class HeadlessShaderProgram:
+    """
+    Drop-in replacement for GLProgram that accepts and ignores all uniforms.
+    Attribute locations are reported as 0 so that VBO.setAttribPointer goes through its normal path.
+    """
+    calls = 0  # number of uniform uploads, handy for checking draw traversals
+
+    def use(self):
+        pass
+
+    def getAttribLocation(self, name):
+        return 0
+
+    def getUniformLocation(self, name, lookThroughAttribs=True):
+        return 0
+
+    def setMat4(self, name, mat, lookThroughAttribs=True):
+        self.calls += 1
+
+    def setVec3(self, name, vec, lookThroughAttribs=True):
+        self.calls += 1
+
+    def setFloat(self, name, value, lookThroughAttribs=True):
+        self.calls += 1
+
+    def setInt(self, name, value, lookThroughAttribs=True):
+        self.calls += 1
+
+    def setBool(self, name, value, lookThroughAttribs=True):
+        self.calls += 1
+
+
+def headlessVivarium(numPredators, numPrey, seed=None, **kwargs):
+    """
+    Build and initialize a Vivarium with the given population, without any GL context.
+    The default scene's creatures are replaced by the requested population.
+    Extra keyword arguments go to the Vivarium constructor.
+    """
+    installGLStubs()
+    from Vivarium import Vivarium
+
+    vivarium = Vivarium(None, HeadlessShaderProgram(), seed=seed, **kwargs)
+    for creature in list(vivarium.creatures):
+        vivarium.removeCreature(creature)
+    vivarium.populate(numPredators, numPrey)
+    vivarium.initialize()
+    return vivarium
@@ -0,0 +1,140 @@
+"""
+Vectorized joint animation for the creatures of a vivarium.
+
+Creature limbs are driven by oscillators: a speed attribute of the creature (e.g. Prey.leg_paddle_speed) rotates one
+or more joints every step, each along one of its u/v/w axes with a sign, and flips once any of them reaches a limit
+of its rotation extent. Creature classes describe their oscillators in an `animation_joints` class attribute:
+
+    speed attribute -> ((component name, axis, sign, mirror axis), ...)
+
+where component names are keys of the creature's componentDict and axis is "u", "v" or "w". When the oscillator
+flips, a joint with a mirror axis copies its clipped angle to that axis (this reproduces the original per-creature
+animationUpdate exactly). JointAnimation packs the joints of all creatures into flat arrays so that a whole step is a
+single vectorized add/clamp/flip, followed by writing the angles and flipped speeds back to the components and
+creatures. Components and creatures stay the source of truth, so snapshots, replays and recycling need no extra care.
+"""
+
+import numpy as np
+
+ANGLES = {"u": "uAngle", "v": "vAngle", "w": "wAngle"}
+RANGES = {"u": "uRange", "v": "vRange", "w": "wRange"}
+
+
+class JointAnimation:
+    """
+    Joint oscillators of many creatures, all advanced with one vectorized step
+    """
+    creatures = None  # list of animated creatures
+    slots = None  # dict<int, int>: id(creature) -> index in creatures
+    packed = False
+
+    # per oscillator
+    oscillators = None  # list<(creature, speed attribute)>
+
+    # per joint
+    components = None  # list<Component>
+    attributes = None  # list<str>: angle attribute of the joint axis
+    mirrors = None  # list<(Component, str)>: joints with a mirror axis, and that axis's angle attribute
+    owner = None  # np.ndarray(J): oscillator of every joint
+    sign = None  # np.ndarray(J)
+    low = None  # np.ndarray(J): rotation extent of the joint axis
+    high = None
+    mirror_joints = None  # np.ndarray: joint index of every entry of mirrors
+
+    def __init__(self):
+        self.creatures = []
+        self.slots = {}
+        self.packed = False
+
+    def __len__(self):
+        return len(self.creatures)
+
+    def __contains__(self, creature):
+        return id(creature) in self.slots
+
+    def add(self, creature):
+        """
+        Animate creature with the others. Creatures without animation_joints are ignored.
+        """
+        if creature in self or not getattr(creature, "animation_joints", None):
+            return
+        self.slots[id(creature)] = len(self.creatures)
+        self.creatures.append(creature)
+        self.packed = False
+
+    def remove(self, creature):
+        slot = self.slots.pop(id(creature), None)
+        if slot is None:
+            return
+        last = len(self.creatures) - 1
+        if slot != last:
+            # swap-remove, as in IndexedList
+            moved = self.creatures[last]
+            self.creatures[slot] = moved
+            self.slots[id(moved)] = slot
+        self.creatures.pop()
+        self.packed = False
+
+    def invalidate(self):
+        """
+        Repack the joint tables on the next step, needed after changing the rotation extent of an animated joint
+        """
+        self.packed = False
+
+    def pack(self):
+        """
+        Flatten the oscillators and joints of every creature into arrays
+        """
+        self.oscillators = []
+        self.components = []
+        self.attributes = []
+        self.mirrors = []
+        owner, sign, low, high, mirrorJoints = [], [], [], [], []
+        for creature in self.creatures:
+            for speedName, joints in creature.animation_joints.items():
+                oscillator = len(self.oscillators)
+                self.oscillators.append((creature, speedName))
+                for componentName, axis, jointSign, mirror in joints:
+                    comp = creature.componentDict[componentName]
+                    extent = getattr(comp, RANGES[axis])
+                    if mirror is not None:
+                        mirrorJoints.append(len(self.components))
+                        self.mirrors.append((comp, ANGLES[mirror]))
+                    self.components.append(comp)
+                    self.attributes.append(ANGLES[axis])
+                    owner.append(oscillator)
+                    sign.append(jointSign)
+                    low.append(extent[0])
+                    high.append(extent[1])
+        self.owner = np.array(owner, dtype=int)
+        self.sign = np.array(sign, dtype=float)
+        self.low = np.array(low, dtype=float)
+        self.high = np.array(high, dtype=float)
+        self.mirror_joints = np.array(mirrorJoints, dtype=int)
+        self.packed = True
+
+    def advance(self):
+        """
+        Rotate every joint by its oscillator's speed, clamped to its extent, and flip the oscillators that reached a
+        limit. The creatures still need an update() afterwards.
+        """
+        if not self.packed:
+            self.pack()
+        if not self.components:
+            return
+        angles = np.array([getattr(comp, name) for comp, name in zip(self.components, self.attributes)], dtype=float)
+        speeds = np.array([getattr(creature, name) for creature, name in self.oscillators], dtype=float)
+
+        angles = np.maximum(np.minimum(angles + self.sign * speeds[self.owner], self.high), self.low)
+        atLimit = (angles <= self.low) | (angles >= self.high)
+        flipped = np.bincount(self.owner, weights=atLimit, minlength=len(self.oscillators)) > 0
+
+        for comp, name, angle in zip(self.components, self.attributes, angles.tolist()):
+            setattr(comp, name, angle)
+        for i in np.flatnonzero(flipped):
+            creature, name = self.oscillators[i]
+            setattr(creature, name, -float(speeds[i]))
+        if len(self.mirror_joints):
+            for (comp, name), joint in zip(self.mirrors, self.mirror_joints):
+                if flipped[self.owner[joint]]:
+                    setattr(comp, name, angles[joint])
@@ -0,0 +1,152 @@
+"""
+A static 3D KD-tree over a point array, for nearest neighbour and fixed radius queries.
+
+The tree is built once from an (N, 3) array and never modified; rebuild it when the points move. Nodes are stored in
+flat arrays, each covering a contiguous range of a permutation of the points, together with the bounding box of
+those points so that whole subtrees can be skipped during a query. Leaves are scanned with numpy.
+"""
+
+import heapq
+
+import numpy as np
+
+
+class KDTree:
+    """
+    KD-tree over a fixed set of 3D points
+    """
+    points = None  # np.ndarray(N, 3)
+    leaf_size = 8
+    index = None  # np.ndarray(N): points reordered so that every node covers index[start:end]
+
+    # per node
+    start = None
+    end = None
+    left = None  # child node ids, -1 for leaves
+    right = None
+    box_min = None  # np.ndarray(M, 3)
+    box_max = None
+
+    def __init__(self, points, leaf_size=8):
+        """
+        :param points: (N, 3) array of positions, copied
+        :param leaf_size: maximum number of points in a leaf
+        """
+        self.points = np.array(points, dtype=float).reshape(-1, 3)
+        self.leaf_size = max(1, leaf_size)
+        self.index = np.arange(len(self.points))
+        start, end, left, right, box_min, box_max = [], [], [], [], [], []
+
+        if len(self.points):
+            stack = [(0, len(self.points), None, None)]
+            while stack:
+                lo, hi, parent, side = stack.pop()
+                node = len(start)
+                if parent is not None:
+                    (left if side == 0 else right)[parent] = node
+                members = self.points[self.index[lo:hi]]
+                start.append(lo)
+                end.append(hi)
+                left.append(-1)
+                right.append(-1)
+                box_min.append(members.min(axis=0))
+                box_max.append(members.max(axis=0))
+                if hi - lo <= self.leaf_size:
+                    continue
+                # split the widest axis at the median
+                axis = int(np.argmax(box_max[node] - box_min[node]))
+                mid = (lo + hi) // 2
+                order = np.argpartition(members[:, axis], mid - lo)
+                self.index[lo:hi] = self.index[lo:hi][order]
+                stack.append((mid, hi, node, 1))
+                stack.append((lo, mid, node, 0))
+
+        self.start = np.array(start, dtype=int)
+        self.end = np.array(end, dtype=int)
+        self.left = np.array(left, dtype=int)
+        self.right = np.array(right, dtype=int)
+        self.box_min = np.array(box_min, dtype=float).reshape(-1, 3)
+        self.box_max = np.array(box_max, dtype=float).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _boxDistanceSquared(self, node, point):
+        gap = np.maximum(np.maximum(self.box_min[node] - point, point - self.box_max[node]), 0.0)
+        return float(gap @ gap)
+
+    def _leafDistancesSquared(self, node, point):
+        members = self.index[self.start[node]:self.end[node]]
+        delta = self.points[members] - point
+        return members, np.einsum("ij,ij->i", delta, delta)
+
+    def queryRadius(self, point, radius):
+        """
+        All points within radius of point (inclusive)
+
+        :return: indices into the points and their distances, sorted by increasing distance
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        point = np.asarray(point, dtype=float)
+        radiusSquared = radius * radius
+        foundIndex = []
+        foundDist = []
+        stack = [0] if len(self.points) else []
+        while stack:
+            node = stack.pop()
+            if self._boxDistanceSquared(node, point) > radiusSquared:
+                continue
+            if self.left[node] < 0:
+                members, distSquared = self._leafDistancesSquared(node, point)
+                inside = distSquared <= radiusSquared
+                foundIndex.append(members[inside])
+                foundDist.append(distSquared[inside])
+            else:
+                stack.append(self.left[node])
+                stack.append(self.right[node])
+
+        if not foundIndex:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        indices = np.concatenate(foundIndex)
+        distances = np.sqrt(np.concatenate(foundDist))
+        order = np.argsort(distances, kind="stable")
+        return indices[order], distances[order]
+
+    def query(self, point, k=1, maxDistance=np.inf):
+        """
+        The k nearest points to point, best first search
+
+        :param maxDistance: ignore points further away than this
+        :return: indices into the points and their distances, sorted by increasing distance.
+            Fewer than k if the tree holds fewer points within maxDistance
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        point = np.asarray(point, dtype=float)
+        # max-heap of the best candidates so far, as (-distSquared, index)
+        best = []
+        bound = maxDistance * maxDistance
+        queue = [(self._boxDistanceSquared(0, point), 0)] if len(self.points) else []
+        while queue:
+            boxDist, node = heapq.heappop(queue)
+            if boxDist > bound:
+                break
+            if self.left[node] < 0:
+                members, distSquared = self._leafDistancesSquared(node, point)
+                for i in np.flatnonzero(distSquared <= bound):
+                    entry = (-distSquared[i], int(members[i]))
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    else:
+                        heapq.heappushpop(best, entry)
+                    if len(best) == k:
+                        bound = -best[0][0]
+            else:
+                for child in (self.left[node], self.right[node]):
+                    childDist = self._boxDistanceSquared(child, point)
+                    if childDist <= bound:
+                        heapq.heappush(queue, (childDist, child))
+
+        best.sort(reverse=True)
+        indices = np.array([i for _, i in best], dtype=int)
+        distances = np.sqrt(np.array([-d for d, _ in best], dtype=float))
+        return indices, distances
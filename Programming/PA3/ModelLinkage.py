@@ -17,6 +17,10 @@ from Point import Point
 import ColorType as Ct
 from EnvironmentObject import EnvironmentObject
 
+# with a spatial index, creatures further away than this many range_scales of a potential are ignored,
+# their gaussian is below exp(-9) there
+NEIGHBOR_RANGE_SCALES = 3.0
+
 try:
     import OpenGL
 
@@ -174,10 +178,33 @@ class ModelArm(Component):
 
 
 class Prey(Component, EnvironmentObject):
-
-    def __init__(self, parent, position, shaderProg):
+    species_id = 2
+    # applyUprightCorrection: direction = keep * direction + blend * upright direction
+    upright_keep = 0.9
+    upright_blend = 0.1
+    # steering parameters, class attributes so that experiments can tune them
+    step_size = 0.02
+    flee_strength = 0.06  # repulsion from predators
+    flee_range = 2.0
+    food_strength = 0.08  # attraction to food within food_cutoff
+    food_range = 2.0
+    food_cutoff = 4.0
+    # per-creature animation state, saved in vivarium snapshots
+    animation_speeds = ("tail_wiggle_speed", "leg_paddle_speed")
+    # joints driven by each animation speed, see JointAnimation: (component, axis, sign, mirror axis)
+    animation_joints = {
+        "tail_wiggle_speed": (("tail_s2", "v", 1, None),),
+        "leg_paddle_speed": (("leg_r1", "u", -1, "v"), ("leg_l1", "u", 1, "v")),
+    }
+
+    def __init__(self, parent, position, shaderProg, rng=None):
+        """
+        :param rng: random generator used for the initial heading, np.random if not given
+        :type rng: numpy.random.Generator
+        """
         self.species_id = 2  # ID for Prey
         self.eaten = False
+        self.rng = np.random if rng is None else rng
         
         # Setting colors
         color_body = Ct.ColorType(0.8, 0.7, 0.5)
@@ -279,9 +306,8 @@ class Prey(Component, EnvironmentObject):
         # Animation & Collision
         self.tail_wiggle_speed = 0.8
         self.leg_paddle_speed = 1.0
-        self.direction = np.random.random(3)
+        self.direction = self.rng.random(3)
         self.direction = self.direction / np.linalg.norm(self.direction)
-        self.step_size = 0.02
 
         # Set Orientation
         self.forwardAxis = np.array([0, 0, 1])
@@ -307,6 +333,20 @@ class Prey(Component, EnvironmentObject):
         self.leg_r1.setDefaultAngle(0, self.leg_r1.vAxis)
         self.leg_l1.setDefaultAngle(0, self.leg_l1.vAxis)
 
+    def recycle(self, position):
+        """
+        Reuse an eaten prey at a new position, keeping all of its components and GL buffers
+        """
+        self.eaten = False
+        self.tail_wiggle_speed = 0.8
+        self.leg_paddle_speed = 1.0
+        for comp in self.components:
+            comp.reset("angle")
+        self.direction = self.rng.random(3)
+        self.direction = self.direction / np.linalg.norm(self.direction)
+        self.rotateDirection(Point(self.direction), local_forward=Point([0, 0, 1]))
+        self.setCurrentPosition(position)
+
     def animationUpdate(self):
         # Tail animation
         # Rotation on segment 2
@@ -330,32 +370,61 @@ class Prey(Component, EnvironmentObject):
         self.update()  # Apply transformations
 
     def stepForward(self, components, tank_dimensions, vivarium):
+        self.steer(vivarium)
+
+        # Probe the next position
+        nextPos = self.currentPos.coords + self.direction * self.step_size
+        self.bounceOffWalls(nextPos, tank_dimensions)
+
+    def steer(self, vivarium):
+        """
+        Turn away from predators and toward food, and face the new direction
+        """
+        self.steerDirection(vivarium)
+        self.applyUprightCorrection()
+        self.direction /= np.linalg.norm(self.direction)
+        self.rotateDirection(Point(self.direction))
+
+    def steerDirection(self, vivarium):
+        """
+        The turn of steer, up to the unit direction before the upright correction.
+        Vivarium.stepCreaturesInRuns finishes the turn of a whole run at once.
+        """
         # Avoid predators
-        for obj in vivarium.creatures:
+        if vivarium.spatial_index is not None:
+            neighbors = vivarium.creaturesWithin(1, self.currentPos.coords, NEIGHBOR_RANGE_SCALES * self.flee_range)
+        else:
+            neighbors = vivarium.creatures
+        for obj in neighbors:
             if obj is self:
                 continue
             dist = self.distance_to(obj)
 
             if obj.species_id == 1:  # predator
-                force = self.potential_force(obj, strength=0.06, range_scale=2.0, mode="repel")
+                force = self.potential_force(obj, strength=self.flee_strength, range_scale=self.flee_range,
+                                             mode="repel")
                 self.direction += force
 
         # Attraction to nearby food
-        for food in vivarium.food_obj:
-            dist = np.linalg.norm(np.array(food.currentPos.coords) - np.array(self.currentPos.coords))
-            if dist < 4.0:
-                force = self.potential_force(food, strength=0.08, range_scale=2.0, mode="attract")
-                self.direction += force
-
-        # Re-orientate + Normalize
-        self.direction /= np.linalg.norm(self.direction)
-        self.applyUprightCorrection()
+        if vivarium.food_fields is not None:
+            self.direction += vivarium.foodForce(self.currentPos.coords, strength=self.food_strength,
+                                                 range_scale=self.food_range, cutoff=self.food_cutoff)
+        else:
+            for food in vivarium.food_obj:
+                dist = np.linalg.norm(np.array(food.currentPos.coords) - np.array(self.currentPos.coords))
+                if dist < self.food_cutoff:
+                    force = self.potential_force(food, strength=self.food_strength, range_scale=self.food_range,
+                                                 mode="attract")
+                    self.direction += force
+
+        # Normalize
         self.direction /= np.linalg.norm(self.direction)
-        self.rotateDirection(Point(self.direction))
-
-        # Probe the next position
-        nextPos = self.currentPos.coords + self.direction * self.step_size
 
+    def bounceOffWalls(self, nextPos, tank_dimensions):
+        """
+        Move to nextPos, clamped inside the tank, reflecting the direction off every wall that was hit.
+        Vivarium.resolveWalls does the same for many creatures at once.
+        """
         # Wall collision reflection
         half_x, half_y, half_z = tank_dimensions[0] / 2, tank_dimensions[1] / 2, tank_dimensions[2] / 2
         bounce = False
@@ -409,7 +478,7 @@ class Prey(Component, EnvironmentObject):
         corrected_forward /= np.linalg.norm(corrected_forward)
 
         # Blend: mostly keep current direction, slightly bias upright
-        self.direction = 0.9 * self.direction + 0.1 * corrected_forward
+        self.direction = self.upright_keep * self.direction + self.upright_blend * corrected_forward
         self.direction /= np.linalg.norm(self.direction)
 
 
@@ -417,9 +486,34 @@ class Predator(Component, EnvironmentObject):
     """
     Predator: Similar to prey but green and have moving pincers
     """
-    def __init__(self, parent, position, shaderProg):
+    species_id = 1
+    # applyUprightCorrection: direction = keep * direction + blend * upright direction
+    upright_keep = 0.95
+    upright_blend = 0.05
+    # steering parameters, class attributes so that experiments can tune them
+    step_size = 0.02
+    hunt_strength = 0.08  # attraction to prey
+    hunt_range = 3.0
+    food_strength = 0.10  # attraction to food within food_cutoff
+    food_range = 2.5
+    food_cutoff = 3.0
+    # per-creature animation state, saved in vivarium snapshots
+    animation_speeds = ("tail_wiggle_speed", "pincer_snap_speed", "leg_paddle_speed")
+    # joints driven by each animation speed, see JointAnimation: (component, axis, sign, mirror axis)
+    animation_joints = {
+        "tail_wiggle_speed": (("tail_s2", "v", 1, None),),
+        "pincer_snap_speed": (("pincer_r1", "v", 1, None), ("pincer_l1", "v", -1, None)),
+        "leg_paddle_speed": (("leg_r1", "u", -1, "v"), ("leg_l1", "u", 1, "v")),
+    }
+
+    def __init__(self, parent, position, shaderProg, rng=None):
+        """
+        :param rng: random generator used for the initial heading, np.random if not given
+        :type rng: numpy.random.Generator
+        """
         self.contextParent = parent
         self.species_id = 1         # ID for Predator
+        self.rng = np.random if rng is None else rng
         
         # Creature is too big so this is to scale everything down
         sizing_scale = 0.5
@@ -543,9 +637,8 @@ class Predator(Component, EnvironmentObject):
         self.tail_wiggle_speed = 0.8
         self.pincer_snap_speed = 0.5
         self.leg_paddle_speed = 1.0
-        self.direction = np.random.random(3)
+        self.direction = self.rng.random(3)
         self.direction = self.direction / np.linalg.norm(self.direction)
-        self.step_size = 0.02
         
         # Set Orientation
         self.rotateDirection(Point(self.direction))
@@ -568,6 +661,21 @@ class Predator(Component, EnvironmentObject):
         self.pincer_r1.setDefaultAngle(15, self.pincer_r1.vAxis)  # Pincers start slightly open
         self.pincer_l1.setDefaultAngle(-15, self.pincer_l1.vAxis)
 
+    def recycle(self, position):
+        """
+        Reuse a removed predator at a new position, keeping all of its components and GL buffers
+        """
+        self.eaten = False
+        self.tail_wiggle_speed = 0.8
+        self.pincer_snap_speed = 0.5
+        self.leg_paddle_speed = 1.0
+        for comp in self.components:
+            comp.reset("angle")
+        self.direction = self.rng.random(3)
+        self.direction = self.direction / np.linalg.norm(self.direction)
+        self.rotateDirection(Point(self.direction))
+        self.setCurrentPosition(position)
+
     def animationUpdate(self):
         # Tail animation
         # Rotation on segment 2
@@ -612,43 +720,70 @@ class Predator(Component, EnvironmentObject):
         corrected_forward = np.cross(up, right)
         corrected_forward /= np.linalg.norm(corrected_forward)
 
-        self.direction = 0.95 * self.direction + 0.05 * corrected_forward
+        self.direction = self.upright_keep * self.direction + self.upright_blend * corrected_forward
         self.direction /= np.linalg.norm(self.direction)                                
 
     def stepForward(self, components, tank_dimensions, vivarium):
-        # Chases prey
-        for obj in list(vivarium.creatures):
+        self.steer(vivarium)
+
+        # Probe the next position
+        nextPos = self.currentPos.coords + self.direction * self.step_size
+        self.bounceOffWalls(nextPos, tank_dimensions)
+
+    def steer(self, vivarium):
+        """
+        Turn toward prey and food, eat a prey within reach, and face the new direction
+        """
+        self.steerDirection(vivarium)
+        self.applyUprightCorrection()
+        self.direction /= np.linalg.norm(self.direction)
+        self.rotateDirection(Point(self.direction))
+
+    def steerDirection(self, vivarium):
+        """
+        The turn of steer, up to the unit direction before the upright correction.
+        Vivarium.stepCreaturesInRuns finishes the turn of a whole run at once.
+        """
+        # Chases prey, nearest first with a spatial index
+        if vivarium.spatial_index is not None:
+            neighbors = vivarium.creaturesWithin(2, self.currentPos.coords, NEIGHBOR_RANGE_SCALES * self.hunt_range)
+        else:
+            neighbors = list(vivarium.creatures)
+        for obj in neighbors:
             if obj is self:
                 continue
             if obj.species_id == 2:
                 # Attraction to prey
-                force = self.potential_force(obj, strength=0.08, range_scale=3.0, mode="attract")
+                force = self.potential_force(obj, strength=self.hunt_strength, range_scale=self.hunt_range,
+                                             mode="attract")
                 self.direction += force
                 
                 # Check for collision
                 dist = np.linalg.norm(np.array(obj.currentPos.coords) - np.array(self.currentPos.coords))
                 if dist < (self.bound_radius + obj.bound_radius) * 0.8:
-                    obj.eaten = True
-                    vivarium.delObjInTank(obj)
-                    vivarium.creatures.remove(obj)
+                    vivarium.removeCreature(obj)
                     break
 
         # Attraction to nearby food
-        for food in vivarium.food_obj:
-            dist = np.linalg.norm(np.array(food.currentPos.coords) - np.array(self.currentPos.coords))
-            if dist < 3.0:
-                food_force = self.potential_force(food, strength=0.10, range_scale=2.5, mode="attract")
-                self.direction += food_force
-
-        # Re-orientate + Normalize
+        if vivarium.food_fields is not None:
+            self.direction += vivarium.foodForce(self.currentPos.coords, strength=self.food_strength,
+                                                 range_scale=self.food_range, cutoff=self.food_cutoff)
+        else:
+            for food in vivarium.food_obj:
+                dist = np.linalg.norm(np.array(food.currentPos.coords) - np.array(self.currentPos.coords))
+                if dist < self.food_cutoff:
+                    food_force = self.potential_force(food, strength=self.food_strength,
+                                                      range_scale=self.food_range, mode="attract")
+                    self.direction += food_force
+
+        # Normalize
         self.direction /= np.linalg.norm(self.direction)
-        self.applyUprightCorrection()
-        self.direction /= np.linalg.norm(self.direction)
-        self.rotateDirection(Point(self.direction))
-
-        # Probe the next position
-        nextPos = self.currentPos.coords + self.direction * self.step_size
 
+    def bounceOffWalls(self, nextPos, tank_dimensions):
+        """
+        Move to nextPos, clamped inside the tank, reflecting the direction off every wall that was hit.
+        Vivarium.resolveWalls does the same for many creatures at once.
+        """
         # Wall collision reflection
         half_x, half_y, half_z = tank_dimensions[0] / 2, tank_dimensions[1] / 2, tank_dimensions[2] / 2
         bounce = False
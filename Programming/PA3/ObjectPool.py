@@ -0,0 +1,114 @@
+"""
+Helpers for recycling vivarium objects instead of rebuilding them.
+
+IndexedList keeps an index map next to its item list so that membership tests, append and remove are all O(1).
+Removal swaps the last item into the freed slot, so the order of the items is not preserved.
+ObjectPool keeps released objects (and the GL buffers they own) around so that they can be handed out again.
+"""
+
+
+class IndexedList:
+    """
+    A list-like container with O(1) append, remove and membership test.
+    Items are tracked by identity and can only be stored once.
+    """
+    items = None  # list
+    index = None  # dict<int, int>: id(item) -> position in items
+
+    def __init__(self, items=None):
+        self.items = []
+        self.index = {}
+        if items is not None:
+            for item in items:
+                self.append(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, i):
+        return self.items[i]
+
+    def __contains__(self, item):
+        return id(item) in self.index
+
+    def __repr__(self):
+        return "IndexedList(" + repr(self.items) + ")"
+
+    def append(self, item):
+        """
+        Add an item at the end of the list. Items already in the list are ignored.
+        """
+        key = id(item)
+        if key in self.index:
+            return
+        self.index[key] = len(self.items)
+        self.items.append(item)
+
+    def remove(self, item):
+        """
+        Remove an item by moving the last item into its slot.
+
+        :raises ValueError: if the item is not in the list
+        """
+        i = self.index.pop(id(item), None)
+        if i is None:
+            raise ValueError("IndexedList.remove(x): x not in list")
+        last = self.items.pop()
+        if last is not item:
+            self.items[i] = last
+            self.index[id(last)] = i
+
+    def discard(self, item):
+        """
+        Remove an item if it is present
+        """
+        if id(item) in self.index:
+            self.remove(item)
+
+    def clear(self):
+        self.items.clear()
+        self.index.clear()
+
+
+class ObjectPool:
+    """
+    Keeps released objects around for reuse.
+
+    Objects handed out by the pool must implement recycle(*args), which puts them back in the state a freshly
+    constructed object would have for the same arguments.
+    """
+    factory = None  # callable(*args) -> object
+    free = None  # list
+
+    def __init__(self, factory):
+        """
+        :param factory: builds a new object when the pool is empty, called with the same arguments as acquire
+        :type factory: callable
+        """
+        self.factory = factory
+        self.free = []
+
+    def __len__(self):
+        return len(self.free)
+
+    def acquire(self, *args):
+        """
+        Hand out an object, recycling a released one if possible.
+
+        :return: the object, and True if it was recycled (False if it was newly constructed)
+        :rtype: tuple
+        """
+        if self.free:
+            obj = self.free.pop()
+            obj.recycle(*args)
+            return obj, True
+        return self.factory(*args), False
+
+    def release(self, obj):
+        """
+        Give an object back to the pool. The caller must have detached it from the scene already.
+        """
+        self.free.append(obj)
@@ -0,0 +1,168 @@
+"""
+Opt-in per-step profiler for the vivarium.
+
+Instrumented code adds (duration, count) samples to named counters such as "step.Prey" or "update". Between
+beginStep() and endStep() samples accumulate for the current step; endStep() stores the totals as one row of a ring
+buffer holding the last `capacity` steps. Summaries average over those rows.
+
+When the profiler is disabled, beginStep/endStep return immediately and instrumented code skips its timers after a
+single attribute check, so leaving the instrumentation in place costs next to nothing.
+"""
+
+import time
+
+import numpy as np
+
+
+class Profiler:
+    """
+    Named duration/count counters recorded per step into a ring buffer
+    """
+    enabled = False
+    capacity = 0
+    names = None  # list<str>: counter of every column
+    columns = None  # dict<str, int>
+    durations = None  # np.ndarray(capacity, counters): seconds spent per step
+    counts = None  # np.ndarray(capacity, counters): calls per step
+    head = 0  # next row to write
+    filled = 0  # number of valid rows
+    steps = 0  # steps recorded since the last reset, unlike head it never wraps
+    report_every = 0  # print a summary every this many steps, 0 to never print
+
+    def __init__(self, capacity=300, enabled=False, report_every=0):
+        """
+        :param capacity: number of steps kept in the ring buffer
+        :param report_every: print a rolling summary every this many recorded steps, 0 to stay silent
+        """
+        self.capacity = capacity
+        self.enabled = enabled
+        self.report_every = report_every
+        self.names = []
+        self.columns = {}
+        self.durations = np.zeros((capacity, 0))
+        self.counts = np.zeros((capacity, 0), dtype=np.int64)
+        self.pending = {}
+        self.step_start = 0.0
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self.pending.clear()
+
+    def reset(self):
+        self.durations[:] = 0
+        self.counts[:] = 0
+        self.head = 0
+        self.filled = 0
+        self.steps = 0
+        self.pending.clear()
+
+    def column(self, name):
+        """
+        Column of a counter, added on first use
+        """
+        index = self.columns.get(name)
+        if index is None:
+            index = len(self.names)
+            self.names.append(name)
+            self.columns[name] = index
+            self.durations = np.hstack([self.durations, np.zeros((self.capacity, 1))])
+            self.counts = np.hstack([self.counts, np.zeros((self.capacity, 1), dtype=np.int64)])
+        return index
+
+    def add(self, name, seconds=0.0, count=1):
+        """
+        Add a sample to a counter of the current step
+        """
+        entry = self.pending.get(name)
+        if entry is None:
+            self.pending[name] = [seconds, count]
+        else:
+            entry[0] += seconds
+            entry[1] += count
+
+    def call(self, name, function, *args):
+        """
+        function(*args), timed under name when enabled
+
+        :return: what function returns
+        """
+        if not self.enabled:
+            return function(*args)
+        start = time.perf_counter()
+        result = function(*args)
+        self.add(name, time.perf_counter() - start)
+        return result
+
+    def beginStep(self):
+        if not self.enabled:
+            return
+        self.pending.clear()
+        self.step_start = time.perf_counter()
+
+    def endStep(self, name="total"):
+        """
+        Close the current step: record its total duration under name and store all counters in the ring buffer
+        """
+        if not self.enabled:
+            return
+        self.add(name, time.perf_counter() - self.step_start)
+        row = self.head
+        self.durations[row] = 0
+        self.counts[row] = 0
+        for counter, (seconds, count) in self.pending.items():
+            column = self.column(counter)
+            self.durations[row, column] = seconds
+            self.counts[row, column] = count
+        self.pending.clear()
+        self.head = (self.head + 1) % self.capacity
+        self.filled = min(self.filled + 1, self.capacity)
+        self.steps += 1
+
+        if self.report_every and self.steps % self.report_every == 0:
+            print(self.formatSummary())
+
+    def history(self, name):
+        """
+        Seconds and counts of a counter for the recorded steps, oldest first
+
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        column = self.columns.get(name)
+        rows = self.rows()
+        if column is None:
+            return np.zeros(len(rows)), np.zeros(len(rows), dtype=np.int64)
+        return self.durations[rows, column], self.counts[rows, column]
+
+    def rows(self):
+        """
+        Ring buffer rows of the recorded steps, oldest first
+        """
+        start = (self.head - self.filled) % self.capacity
+        return (start + np.arange(self.filled)) % self.capacity
+
+    def summary(self, window=None):
+        """
+        Per-step averages of every counter over the last window steps (all recorded steps by default)
+
+        :return: counter name -> {"ms": mean milliseconds per step, "calls": mean calls per step,
+            "share": fraction of the mean total step time}
+        :rtype: dict
+        """
+        rows = self.rows()
+        if window is not None:
+            rows = rows[-window:]
+        if len(rows) == 0:
+            return {}
+        seconds = self.durations[rows].mean(axis=0)
+        calls = self.counts[rows].mean(axis=0)
+        total = seconds[self.columns["total"]] if "total" in self.columns else seconds.sum()
+        return {name: {"ms": seconds[i] * 1000, "calls": calls[i], "share": seconds[i] / total if total else 0.0}
+                for i, name in enumerate(self.names)}
+
+    def formatSummary(self, window=None):
+        summary = self.summary(window)
+        steps = self.filled if window is None else min(window, self.filled)
+        lines = [f"{'counter':<20} {'ms/step':>10} {'calls/step':>11} {'share':>7}   (last {steps} steps)"]
+        for name, row in sorted(summary.items(), key=lambda item: -item[1]["ms"]):
+            lines.append(f"{name:<20} {row['ms']:>10.3f} {row['calls']:>11.1f} {row['share'] * 100:>6.1f}%")
+        return "\n".join(lines)
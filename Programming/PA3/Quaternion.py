@@ -116,6 +116,167 @@ class Quaternion:
         return q_matrix
 
 
+class QuaternionArray:
+    """
+    N quaternions stored as the rows (s, x, y, z) of an (N, 4) array, with the operations of Quaternion applied to
+    all of them at once
+    """
+    data = None  # np.ndarray(N, 4)
+
+    def __init__(self, data=None, size=0):
+        """
+        :param data: (N, 4) array of (s, x, y, z) rows. It is used directly, not copied
+        :param size: number of identity quaternions to create when data is None
+        """
+        if data is None:
+            data = np.zeros((size, 4), dtype=np.float64)
+            data[:, 0] = 1
+        self.data = np.asarray(data, dtype=np.float64).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        """
+        :return: row i as a Quaternion
+        :rtype: Quaternion
+        """
+        s, v0, v1, v2 = (float(x) for x in self.data[i])
+        return Quaternion(s, v0, v1, v2)
+
+    @property
+    def s(self):
+        return self.data[:, 0]
+
+    @property
+    def v(self):
+        return self.data[:, 1:]
+
+    @classmethod
+    def fromQuaternions(cls, quaternions):
+        """
+        Stack Quaternions. None entries become the identity
+        """
+        data = np.zeros((len(quaternions), 4), dtype=np.float64)
+        data[:, 0] = 1
+        for i, q in enumerate(quaternions):
+            if q is not None:
+                data[i] = (q.s, q.v[0], q.v[1], q.v[2])
+        return cls(data)
+
+    @classmethod
+    def fromTwoVectors(cls, targets, forward=(0, 0, 1), up=(0, 1, 0)):
+        """
+        For every row, the rotation EnvironmentObject.rotateDirection builds to turn forward toward target:
+        the angle between them about the axis target x forward, or pi about up when they are opposite.
+        Rows where target already faces forward get the identity.
+
+        :param targets: (N, 3) target directions, need not be normalized
+        :param forward: local forward direction, (3,) or (N, 3)
+        :param up: axis of the half turn for opposite vectors, (3,) or (N, 3)
+        :return: the quaternions, and a mask of the rows that were already facing forward
+        :rtype: (QuaternionArray, numpy.ndarray)
+        """
+        target = np.array(targets, dtype=np.float64).reshape(-1, 3)
+        target /= np.sqrt(np.einsum("ij,ij->i", target, target))[:, None]
+        fwd = np.broadcast_to(np.asarray(forward, dtype=np.float64), target.shape)
+        fwd = fwd / np.sqrt(np.einsum("ij,ij->i", fwd, fwd))[:, None]
+        up = np.broadcast_to(np.asarray(up, dtype=np.float64), target.shape)
+
+        axis = np.cross(target, fwd)
+        axisNorm = np.sqrt(np.einsum("ij,ij->i", axis, axis))
+        cosAngle = np.einsum("ij,ij->i", fwd, target)
+        parallel = axisNorm < 1e-6
+        facing = parallel & (cosAngle > 0.999)
+        opposite = parallel & ~facing
+
+        angle = np.arccos(np.clip(cosAngle, -1.0, 1.0))
+        axis[~parallel] /= axisNorm[~parallel, None]
+        axis[opposite] = up[opposite]
+        angle[opposite] = math.pi
+
+        data = np.empty((len(target), 4), dtype=np.float64)
+        data[:, 0] = np.cos(angle / 2.0)
+        data[:, 1:] = axis * np.sin(angle / 2.0)[:, None]
+        data[facing] = (1, 0, 0, 0)
+        return cls(data), facing
+
+    def multiply(self, q):
+        """
+        Row-wise product self * q, with q a QuaternionArray of the same length, or of length 1 to broadcast
+
+        :rtype: QuaternionArray
+        """
+        s1, v1 = self.data[:, :1], self.data[:, 1:]
+        s2, v2 = q.data[:, :1], q.data[:, 1:]
+        data = np.empty(np.broadcast_shapes(self.data.shape, q.data.shape), dtype=np.float64)
+        # s = s1*s2 - v1.v2, v = s1 v2 + s2 v1 + v1 x v2
+        data[:, 0] = (s1 * s2)[:, 0] - np.sum(v1 * v2, axis=1)
+        data[:, 1:] = s1 * v2 + s2 * v1 + np.cross(v1, v2)
+        return QuaternionArray(data)
+
+    def norm(self):
+        """
+        :return: norm of every quaternion, (N,)
+        """
+        return np.sqrt(np.einsum("ij,ij->i", self.data, self.data))
+
+    def normalize(self):
+        """
+        Normalize every quaternion whose norm is above 1e-6, in place
+        :return: this QuaternionArray
+        """
+        mag = self.norm()
+        valid = mag > 1e-6
+        self.data[valid] /= mag[valid, None]
+        return self
+
+    def slerp(self, q, t):
+        """
+        Spherical interpolation from these (unit) quaternions toward q along the shorter arc
+
+        :param q: target QuaternionArray of the same length
+        :param t: interpolation parameter, scalar or (N,). 0 gives self, 1 gives q
+        :rtype: QuaternionArray
+        """
+        t = np.broadcast_to(np.asarray(t, dtype=np.float64), (len(self.data),))[:, None]
+        target = q.data.copy()
+        dot = np.einsum("ij,ij->i", self.data, target)
+        # q and -q are the same rotation, take the one closer to self
+        flip = dot < 0
+        target[flip] *= -1
+        dot = np.abs(dot)
+
+        theta = np.arccos(np.clip(dot, -1.0, 1.0))[:, None]
+        sinTheta = np.sin(theta)
+        # nearly identical rotations: lerp avoids dividing by a vanishing sin(theta)
+        close = (sinTheta < 1e-6)
+        safe = np.where(close, 1.0, sinTheta)
+        w0 = np.where(close, 1 - t, np.sin((1 - t) * theta) / safe)
+        w1 = np.where(close, t, np.sin(t * theta) / safe)
+        return QuaternionArray(w0 * self.data + w1 * target).normalize()
+
+    def toMatrix(self):
+        """
+        Quaternion.toMatrix for every row
+        :return: (N, 4, 4) matrices
+        :rtype: numpy.ndarray
+        """
+        s, a, b, c = self.data.T
+        q_matrix = np.zeros((len(self.data), 4, 4), dtype=np.float64)
+        q_matrix[:, 0, 0] = 1 - 2 * b * b - 2 * c * c
+        q_matrix[:, 1, 0] = 2 * a * b + 2 * s * c
+        q_matrix[:, 2, 0] = 2 * a * c - 2 * s * b
+        q_matrix[:, 0, 1] = 2 * a * b - 2 * s * c
+        q_matrix[:, 1, 1] = 1 - 2 * a * a - 2 * c * c
+        q_matrix[:, 2, 1] = 2 * b * c + 2 * s * a
+        q_matrix[:, 0, 2] = 2 * a * c + 2 * s * b
+        q_matrix[:, 1, 2] = 2 * b * c - 2 * s * a
+        q_matrix[:, 2, 2] = 1 - 2 * a * a - 2 * b * b
+        q_matrix[:, 3, 3] = 1
+        return q_matrix
+
+
 if __name__ == "__main__":
     t1 = time.time()
     for _ in range(1000000):
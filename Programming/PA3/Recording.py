@@ -0,0 +1,242 @@
+"""
+Record vivarium runs to disk and replay them without simulating.
+
+A recording is a small header followed by one fixed-size record per step, so that record i always sits at the same
+offset and the whole file can be memory mapped and scrubbed freely. Every record holds, for up to max_creatures
+creatures and max_food food particles:
+
+    step, num_creatures, num_food
+    species (snapshot id, see Vivarium.species), position, orientation quaternion and joint angles of every creature
+    position of every food particle
+
+Unused slots are zero. Values are stored as float32, and joint angles (degrees) as float16, which is plenty for
+display: with the default capacities a record takes about 11 KB, so an hour at 60 steps per second is about 2.4 GB.
+The TrajectoryRecorder appends records to a memory map that grows in chunks. The TrajectoryReplay maps the finished
+file read-only and poses a Vivarium's creatures and food from any record.
+"""
+
+import os
+
+import numpy as np
+
+from Point import Point
+from Quaternion import Quaternion
+
+MAGIC = b"VIVREC01"
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("count", "<u8"),  # number of complete records
+    ("max_creatures", "<u4"),
+    ("max_food", "<u4"),
+    ("max_joints", "<u4"),
+    ("tank_dimensions", "<f8", (3,)),
+])
+
+
+def recordDtype(maxCreatures, maxFood, maxJoints):
+    """
+    Layout of one record for the given capacities
+    """
+    return np.dtype([
+        ("step", "<i8"),
+        ("num_creatures", "<u4"),
+        ("num_food", "<u4"),
+        ("species", "i1", (maxCreatures,)),
+        ("positions", "<f4", (maxCreatures, 3)),
+        ("quats", "<f4", (maxCreatures, 4)),
+        ("joint_angles", "<f2", (maxCreatures, maxJoints, 3)),
+        ("food_positions", "<f4", (maxFood, 3)),
+    ])
+
+
+def readHeader(path):
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header[0]["magic"] != MAGIC:
+        raise ValueError(f"{path} is not a vivarium recording")
+    return header[0]
+
+
+class TrajectoryRecorder:
+    """
+    Appends one record per step to a recording file
+    """
+    path = None
+    dtype = None
+    header = None  # np.ndarray of HEADER_DTYPE, written back on flush
+    records = None  # np.memmap over the allocated records
+    count = 0
+
+    def __init__(self, path, tank_dimensions, maxCreatures=64, maxFood=256, maxJoints=16, chunk=1024):
+        """
+        :param path: file to create, overwritten if it exists
+        :param maxCreatures: capacity of every record. Appending more creatures than this raises a ValueError
+        :param maxFood: same for food particles
+        :param maxJoints: capacity for the components of a single creature
+        :param chunk: number of records the file grows by when it is full
+        """
+        self.path = path
+        self.chunk = chunk
+        self.dtype = recordDtype(maxCreatures, maxFood, maxJoints)
+        self.blank = np.zeros((), dtype=self.dtype)
+        self.header = np.zeros(1, dtype=HEADER_DTYPE)
+        self.header["magic"] = MAGIC
+        self.header["max_creatures"] = maxCreatures
+        self.header["max_food"] = maxFood
+        self.header["max_joints"] = maxJoints
+        self.header["tank_dimensions"] = tank_dimensions
+        self.count = 0
+        with open(path, "wb") as f:
+            f.write(self.header.tobytes().ljust(HEADER_SIZE, b"\0"))
+        self.records = None
+        self.grow()
+
+    @property
+    def capacity(self):
+        return 0 if self.records is None else len(self.records)
+
+    def grow(self):
+        """
+        Extend the file by one chunk of records and map it again
+        """
+        capacity = self.capacity + self.chunk
+        if self.records is not None:
+            self.records.flush()
+            self.records = None
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self.records = np.memmap(self.path, dtype=self.dtype, mode="r+", offset=HEADER_SIZE, shape=(capacity,))
+
+    def append(self, vivarium):
+        """
+        Record the current state of the vivarium
+        """
+        creatures = list(vivarium.creatures)
+        food = list(vivarium.food_obj)
+        maxCreatures, maxJoints = self.dtype["species"].shape[0], self.dtype["joint_angles"].shape[1]
+        if len(creatures) > maxCreatures or len(food) > self.dtype["food_positions"].shape[0]:
+            raise ValueError("Vivarium population exceeds the capacity of the recording")
+
+        if self.count == self.capacity:
+            self.grow()
+        self.records[self.count] = self.blank
+        record = self.records[self.count]
+        record["step"] = vivarium.step_count
+        record["num_creatures"] = len(creatures)
+        record["num_food"] = len(food)
+        for i, creature in enumerate(creatures):
+            if len(creature.components) > maxJoints:
+                raise ValueError("Creature has more components than the recording can hold")
+            record["species"][i] = vivarium.species.index(type(creature))
+            record["positions"][i] = creature.currentPos.coords
+            if creature.quat is not None:
+                record["quats"][i] = (creature.quat.s, *creature.quat.v)
+            for j, comp in enumerate(creature.components):
+                record["joint_angles"][i, j] = (comp.uAngle, comp.vAngle, comp.wAngle)
+        for i, particle in enumerate(food):
+            record["food_positions"][i] = particle.currentPos.coords
+        self.count += 1
+
+    def flush(self):
+        """
+        Write pending records and the record count to disk. Readers only see flushed records.
+        """
+        self.records.flush()
+        self.header["count"] = self.count
+        with open(self.path, "r+b") as f:
+            f.write(self.header.tobytes())
+
+    def close(self):
+        if self.records is None:
+            return
+        self.flush()
+        self.records = None
+        # drop the unused part of the last chunk
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + self.count * self.dtype.itemsize)
+
+
+class TrajectoryReplay:
+    """
+    Read-only view of a recording that can pose a Vivarium from any of its records
+    """
+    path = None
+    header = None
+    records = None  # np.memmap of records
+
+    def __init__(self, path):
+        self.path = path
+        self.header = readHeader(path)
+        dtype = recordDtype(int(self.header["max_creatures"]), int(self.header["max_food"]),
+                            int(self.header["max_joints"]))
+        count = int(self.header["count"])
+        available = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+        count = min(count, available)
+        self.records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,)) if count else \
+            np.zeros(0, dtype=dtype)
+        self.creatures = []
+        self.food = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def peakCounts(self, numSpecies):
+        """
+        Most creatures of each species and most food particles in any one record, which is how much the vivarium's
+        pools must hold for apply to never build an object
+
+        :param numSpecies: number of species snapshot ids, len(Vivarium.species)
+        :return: np.ndarray(numSpecies) of creature counts, and the food count
+        """
+        if len(self.records) == 0:
+            return np.zeros(numSpecies, dtype=int), 0
+        used = np.arange(self.records["species"].shape[1]) < self.records["num_creatures"][:, None]
+        counts = np.array([np.sum(used & (self.records["species"] == s), axis=1).max() for s in range(numSpecies)])
+        return counts, int(self.records["num_food"].max())
+
+    def apply(self, vivarium, index):
+        """
+        Pose the vivarium as in record index: creatures and food are spawned or removed to match the record, then
+        placed, oriented and their joints set. The vivarium still needs an update() afterwards.
+        Objects are only taken from the vivarium's pools, which Vivarium.startReplay fills up front, so that no GL
+        buffers are created when this runs on the simulation thread. Everything that goes is released before
+        anything is taken, so a pool never has to hold more than the peak of a single record.
+        """
+        record = self.records[index]
+        numCreatures = int(record["num_creatures"])
+        speciesOf = [vivarium.species[s] for s in record["species"][:numCreatures]]
+        for i, creature in enumerate(self.creatures):
+            if i >= numCreatures or type(creature) is not speciesOf[i]:
+                vivarium.removeCreature(creature)
+                self.creatures[i] = None
+        del self.creatures[numCreatures:]
+        for i, species in enumerate(speciesOf):
+            if i == len(self.creatures):
+                self.creatures.append(None)
+            if self.creatures[i] is None:
+                self.creatures[i] = vivarium.spawnCreature(species, Point(record["positions"][i]))
+
+            creature = self.creatures[i]
+            creature.setCurrentPosition(Point(record["positions"][i].astype(float)))
+            quat = record["quats"][i]
+            if np.any(quat):
+                creature.setQuaternion(Quaternion(*(float(q) for q in quat)))
+            else:
+                creature.clearQuaternion()
+            for comp, angles in zip(creature.components, record["joint_angles"][i]):
+                comp.uAngle, comp.vAngle, comp.wAngle = (float(a) for a in angles)
+
+        numFood = int(record["num_food"])
+        for particle in self.food[numFood:]:
+            vivarium.removeFood(particle)
+        del self.food[numFood:]
+        while len(self.food) < numFood:
+            self.food.append(vivarium.addFood(Point(record["food_positions"][len(self.food)])))
+        for particle, position in zip(self.food, record["food_positions"]):
+            particle.setCurrentPosition(Point(position.astype(float)))
+
+    def close(self):
+        self.records = None
@@ -5,7 +5,7 @@ Modified by Daniel Scrivener 09/2023
 """
 
 from collada import *
-from DisplayableMesh import DisplayableMesh
+from DisplayableMesh import DisplayableMesh, DisplayableLOD
 from Component import Component
 import GLUtility
 import ColorType
@@ -44,7 +44,12 @@ class Shape(Component):
     indexData = None
     mesh = None
 
-    def __init__(self, position, shaderProg, size, vertexData, indexData, color=ColorType.YELLOW):
+    # whether shapes with a low poly asset hold both meshes and switch between them with distance, unless told
+    # otherwise. See DisplayableLOD
+    AUTO_LOD = True
+
+    def __init__(self, position, shaderProg, size, vertexData, indexData, color=ColorType.YELLOW,
+                 vertexDataLP=None, indexDataLP=None):
         """
         :param position: location of the object
         :type position: Point
@@ -59,8 +64,14 @@ class Shape(Component):
         :param limb: sets the rotation behavior of the object. if true, rotations happen "at the joint" \
             rather than the object's center
         :type limb: boolean
+        :param vertexDataLP: vertices of a low poly version of the mesh, to draw instead when the shape is small on \
+            screen
+        :param indexDataLP: triangle indices of the low poly version
         """
-        self.mesh = DisplayableMesh(shaderProg, size, vertexData, indexData, color)
+        if vertexDataLP is None:
+            self.mesh = DisplayableMesh(shaderProg, size, vertexData, indexData, color)
+        else:
+            self.mesh = DisplayableLOD(shaderProg, size, vertexData, indexData, vertexDataLP, indexDataLP, color)
         super(Shape, self).__init__(position, self.mesh)
 
 class Cone(Shape):
@@ -74,7 +85,8 @@ class Cone(Shape):
     indices = data[1]
     indicesLP = dataLP[1]
 
-    def __init__(self, position, shaderProg, size, color=ColorType.YELLOW, limb=True, lowPoly=False):
+    def __init__(self, position, shaderProg, size, color=ColorType.YELLOW, limb=True, lowPoly=False,
+                 lod=None):
         """
         :param position: location of the object
         :type position: Point
@@ -84,9 +96,19 @@ class Cone(Shape):
         :type size: list or tuple
         :param color: vertex color to be applied uniformly
         :type color: ColorType
+        :param lowPoly: use only the low poly mesh
+        :type lowPoly: boolean
+        :param lod: hold both meshes and draw the low poly one when the shape is small on screen. Shape.AUTO_LOD \
+            by default
+        :type lod: boolean
         """
+        if lod is None:
+            lod = self.AUTO_LOD
         if lowPoly:
             super(Cone, self).__init__(position, shaderProg, size, self.verticesLP.copy(), self.indicesLP.copy(), color)
+        elif lod:
+            super(Cone, self).__init__(position, shaderProg, size, self.vertices.copy(), self.indices.copy(), color,
+                                       self.verticesLP.copy(), self.indicesLP.copy())
         else:
             super(Cone, self).__init__(position, shaderProg, size, self.vertices.copy(), self.indices.copy(), color)
 
@@ -144,7 +166,8 @@ class Cylinder(Shape):
     indices = data[1]
     indicesLP = dataLP[1]
 
-    def __init__(self, position, shaderProg, size, color=ColorType.GREEN, limb=True, lowPoly=False):
+    def __init__(self, position, shaderProg, size, color=ColorType.GREEN, limb=True, lowPoly=False,
+                 lod=None):
         """
         :param position: location of the object
         :type position: Point
@@ -154,9 +177,19 @@ class Cylinder(Shape):
         :type size: list or tuple
         :param color: vertex color to be applied uniformly
         :type color: ColorType
+        :param lowPoly: use only the low poly mesh
+        :type lowPoly: boolean
+        :param lod: hold both meshes and draw the low poly one when the shape is small on screen. Shape.AUTO_LOD \
+            by default
+        :type lod: boolean
         """
+        if lod is None:
+            lod = self.AUTO_LOD
         if lowPoly:
             super(Cylinder, self).__init__(position, shaderProg, size, self.verticesLP.copy(), self.indicesLP.copy(), color)
+        elif lod:
+            super(Cylinder, self).__init__(position, shaderProg, size, self.vertices.copy(), self.indices.copy(), color,
+                                           self.verticesLP.copy(), self.indicesLP.copy())
         else:
             super(Cylinder, self).__init__(position, shaderProg, size, self.vertices.copy(), self.indices.copy(), color)
         # translate object by -z extent of the new component so that rotations occur @ the joint
@@ -182,7 +215,8 @@ class Sphere(Shape):
     indices = data[1]
     indicesLP = dataLP[1]
 
-    def __init__(self, position, shaderProg, size, color=ColorType.BLUE, limb=True, lowPoly=False):
+    def __init__(self, position, shaderProg, size, color=ColorType.BLUE, limb=True, lowPoly=False,
+                 lod=None):
         """
         :param position: location of the object
         :type position: Point
@@ -196,9 +230,19 @@ class Sphere(Shape):
             rather than the object's center.
             Set this to False for eyes or other ball joints.
         :type limb: boolean
+        :param lowPoly: use only the low poly mesh
+        :type lowPoly: boolean
+        :param lod: hold both meshes and draw the low poly one when the shape is small on screen. Shape.AUTO_LOD \
+            by default
+        :type lod: boolean
         """
+        if lod is None:
+            lod = self.AUTO_LOD
         if lowPoly:
             super(Sphere, self).__init__(position, shaderProg, size, self.verticesLP.copy(), self.indicesLP.copy(), color)
+        elif lod:
+            super(Sphere, self).__init__(position, shaderProg, size, self.vertices.copy(), self.indices.copy(), color,
+                                         self.verticesLP.copy(), self.indicesLP.copy())
         else:
             super(Sphere, self).__init__(position, shaderProg, size, self.vertices.copy(), self.indices.copy(), color)
         # translate object by -z extent of the new component so that rotations occur @ the joint
@@ -0,0 +1,201 @@
+"""
+Run the vivarium simulation on its own thread so that rendering never waits for it.
+
+The simulation thread steps the vivarium at a fixed rate and, after every step, records a RenderFrame: the drawable
+components in draw order with a copy of their model matrices. Frames go through a TripleBuffer, so the simulation
+always has a free frame to fill while the render thread draws the most recently published one, and neither side ever
+waits for the other to finish.
+
+All GL calls stay on the render thread. Anything else that changes the vivarium (spawning food, loading snapshots)
+must hold SimulationThread.lock so it never runs in the middle of a step.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from Displayable import Displayable
+from Frustum import cullMeshes
+
+
+class RenderFrame:
+    """
+    Everything needed to draw one simulation step
+    """
+    step = -1
+    nodes = None  # list<Component>: components with something to draw, in draw order
+    modelMats = None  # np.ndarray(N, 4, 4): model matrix of every node, as uploaded to the shader
+    colors = None  # list: current color of every node
+    meshCenters = None  # np.ndarray(N, 3): model space bounding sphere center of every node, for frustum culling
+    meshRadii = None  # np.ndarray(N): model space bounding sphere radius of every node
+
+    def __init__(self):
+        self.nodes = []
+        self.colors = []
+        self.modelMats = np.zeros((0, 4, 4))
+        self.meshCenters = np.zeros((0, 3))
+        self.meshRadii = np.zeros(0)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def capture(self, root, step):
+        """
+        Record the subtree of root as it is now. root must have been updated.
+        The matrix array is reused as long as the number of drawn nodes does not change.
+        """
+        self.nodes.clear()
+        self.colors.clear()
+        compiled = getattr(root, "compiled_scene", None)
+        if compiled is not None:
+            # the matrices are already in flat arrays
+            self.nodes.extend(compiled.nodes[i] for i in compiled.draw_order)
+            self.colors.extend(node.current_color for node in self.nodes)
+            self.modelMats = compiled.modelMatrices()
+            self.meshCenters = compiled.mesh_centers
+            self.meshRadii = compiled.mesh_radii
+            self.step = step
+            return
+
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node.displayObj, Displayable):
+                self.nodes.append(node)
+                self.colors.append(node.current_color)
+            # reversed so that children are popped in the same order Component.draw visits them
+            stack.extend(node.children[::-1])
+
+        if len(self.modelMats) != len(self.nodes):
+            self.modelMats = np.empty((len(self.nodes), 4, 4))
+            self.meshCenters = np.empty((len(self.nodes), 3))
+            self.meshRadii = np.empty(len(self.nodes))
+        for i, node in enumerate(self.nodes):
+            self.modelMats[i] = node.transformationMat.T
+            self.meshCenters[i], self.meshRadii[i] = node.displayObj.boundingSphere()
+        self.step = step
+
+    def draw(self, shaderProg, frustum=None):
+        """
+        :param frustum: skip the nodes whose bounding sphere is outside of it, and pick levels of detail
+        :type frustum: Frustum
+        """
+        if frustum is None:
+            for node, modelMat, color in zip(self.nodes, self.modelMats, self.colors):
+                node.drawNode(shaderProg, modelMat, color)
+            return
+
+        visible = cullMeshes(frustum, self.modelMats.transpose(0, 2, 1), self.meshCenters, self.meshRadii,
+                             [node.displayObj for node in self.nodes])
+        for i in np.flatnonzero(visible):
+            self.nodes[i].drawNode(shaderProg, self.modelMats[i], self.colors[i])
+
+
+class TripleBuffer:
+    """
+    Three preallocated slots: one being written, one being read, and the latest published one in between.
+    Publishing and reading only swap slot indices under a lock.
+    """
+    slots = None
+    back = 0  # slot the writer fills
+    middle = 1  # latest published slot, not yet picked up by the reader
+    front = 2  # slot the reader is using
+    fresh = False  # whether middle holds a newer slot than front
+
+    def __init__(self, factory):
+        """
+        :param factory: called three times to build the slots
+        """
+        self.slots = [factory() for _ in range(3)]
+        self.lock = threading.Lock()
+
+    def writeSlot(self):
+        return self.slots[self.back]
+
+    def publish(self):
+        """
+        Make the slot just written the latest one and hand the writer a free slot
+        """
+        with self.lock:
+            self.back, self.middle = self.middle, self.back
+            self.fresh = True
+
+    def latest(self):
+        """
+        The most recently published slot. It stays valid until the next call to latest().
+        """
+        with self.lock:
+            if self.fresh:
+                self.front, self.middle = self.middle, self.front
+                self.fresh = False
+            return self.slots[self.front]
+
+
+class SimulationThread:
+    """
+    Steps a vivarium on a background thread and publishes a RenderFrame after every step.
+
+    A thread rather than a process: the scene graph holds GL buffer handles and cannot be shared with another process.
+    Most of a step is spent in numpy, which releases the GIL. For populations too large for one core, see
+    SlabSimulation.
+    """
+    vivarium = None
+    stepsPerSecond = 60.0
+    frames = None  # TripleBuffer<RenderFrame>
+    thread = None
+
+    def __init__(self, vivarium, stepsPerSecond=60.0):
+        """
+        :param vivarium: an initialized Vivarium
+        :param stepsPerSecond: simulation rate, None or 0 to step as fast as possible
+        """
+        self.vivarium = vivarium
+        self.stepsPerSecond = stepsPerSecond
+        self.frames = TripleBuffer(RenderFrame)
+        # held for the duration of every step. Hold it to change the vivarium from another thread
+        self.lock = threading.RLock()
+        self.stopEvent = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def publish(self):
+        frame = self.frames.writeSlot()
+        frame.capture(self.vivarium, self.vivarium.step_count)
+        self.frames.publish()
+
+    def latest(self):
+        """
+        Frame of the last finished step
+        """
+        return self.frames.latest()
+
+    def start(self):
+        if self.running:
+            return
+        with self.lock:
+            self.vivarium.update()
+            self.publish()
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self.run, name="VivariumSimulation", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+
+    def run(self):
+        interval = 1.0 / self.stepsPerSecond if self.stepsPerSecond else 0.0
+        while not self.stopEvent.is_set():
+            start = time.perf_counter()
+            with self.lock:
+                self.vivarium.animationUpdate()
+                self.publish()
+            remaining = interval - (time.perf_counter() - start)
+            if remaining > 0:
+                self.stopEvent.wait(remaining)
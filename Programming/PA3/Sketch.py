@@ -12,6 +12,7 @@ Modified by Ruichen (Richard) Liu 10/2024
 
 import os
 import math
+import contextlib
 import random
 import time
 
@@ -23,6 +24,8 @@ import ColorType
 from GLProgram import GLProgram
 from GLBuffer import VAO, VBO, EBO, Texture
 from Vivarium import Vivarium
+from SimulationThread import SimulationThread
+from Frustum import Frustum
 from Quaternion import Quaternion
 import GLUtility
 
@@ -119,6 +122,21 @@ class Sketch(CanvasBase):
     MOUSE_ROTATE_SPEED = 1
     MOUSE_SCROLL_SPEED = 2.5
 
+    # step the vivarium on a background SimulationThread. If False it is stepped inside OnDraw after every frame
+    USE_SIMULATION_THREAD = True
+    SIMULATION_STEPS_PER_SECOND = 60.0
+    simulation = None  # SimulationThread
+    # skip drawing whatever lies outside the view frustum
+    FRUSTUM_CULLING = True
+
+    # where the 's' / 'l' keys save and load vivarium snapshots
+    SNAPSHOT_PATH = "vivarium_snapshot.npz"
+    # where 'c' records the run and 'p' replays it. ',' and '.' scrub the replay by REPLAY_SCRUB_STEPS
+    RECORDING_PATH = "vivarium_recording.bin"
+    REPLAY_SCRUB_STEPS = 60
+    # 'i' toggles the vivarium profiler, which prints a summary of its phase timings every PROFILE_REPORT_STEPS steps
+    PROFILE_REPORT_STEPS = 120
+
     # models
     basisAxes = None
     scene = None
@@ -157,6 +175,9 @@ class Sketch(CanvasBase):
         self.shaderProg = GLProgram()
         self.shaderProg.compile()
 
+        # OnResize runs this again: the old simulation must not be stepping the vivarium cleared below
+        self.stopSimulation()
+
         # instantiate models, this can only be done with a compiled GL program
         self.vivarium = Vivarium(self, self.shaderProg) 
         
@@ -165,6 +186,7 @@ class Sketch(CanvasBase):
         self.topLevelComponent.initialize()
 
         self.components = self.vivarium.components
+        self.startSimulation()
 
         gl.glClearColor(0.2, 0.3, 0.3, 1.0)
         gl.glClearDepth(1.0)
@@ -221,15 +243,42 @@ class Sketch(CanvasBase):
         # These are per-frame updates to the shader! Update the viewing matrix and the joint transforms
         self.viewMat = self.glutility.view(self.getCameraPos(), self.lookAtPt, self.upVector)
         self.shaderProg.setMat4("viewMat", self.viewMat)
+        frustum = Frustum(self.viewMat, self.perspMat) if self.FRUSTUM_CULLING else None
 
-        self.topLevelComponent.update(np.identity(4))
-        self.topLevelComponent.draw(self.shaderProg)
+        if self.simulation is not None:
+            # only draw the last step the simulation thread finished
+            self.simulation.latest().draw(self.shaderProg, frustum)
+        else:
+            self.topLevelComponent.update(np.identity(4))
+            self.topLevelComponent.draw(self.shaderProg, frustum)
 
-        # perform the next step of the animation
-        self.vivarium.animationUpdate()
+            # perform the next step of the animation
+            self.vivarium.animationUpdate()
 
         self.SwapBuffers()
 
+    def startSimulation(self):
+        """
+        (Re)start the simulation thread on the current vivarium
+        """
+        self.stopSimulation()
+        if self.USE_SIMULATION_THREAD:
+            self.simulation = SimulationThread(self.vivarium, self.SIMULATION_STEPS_PER_SECOND)
+            self.simulation.start()
+
+    def stopSimulation(self):
+        if self.simulation is not None:
+            self.simulation.stop()
+            self.simulation = None
+
+    def vivariumLock(self):
+        """
+        Context manager to hold while changing the vivarium, so the simulation thread is not stepping it meanwhile
+        """
+        if self.simulation is None:
+            return contextlib.nullcontext()
+        return self.simulation.lock
+
     def OnDestroy(self, event):
         """
         Window destroy event binding
@@ -237,6 +286,7 @@ class Sketch(CanvasBase):
         :param event: Window destroy event
         :return: None
         """
+        self.stopSimulation()
         if self.shaderProg is not None:
             del self.shaderProg
         super(Sketch, self).OnDestroy(event)
@@ -251,8 +301,8 @@ class Sketch(CanvasBase):
         if wheelRotation == 0:
             return
         wheelChange = wheelRotation / abs(wheelRotation)
+        # only the camera moves, and OnDraw picks it up: no need to touch the scene graph the simulation is stepping
         self.cameraDis = max(self.cameraDis - wheelChange * 0.1, 0.01)
-        self.update()
 
     def unprojectCanvas(self, x, y, u=0.5):
         """
@@ -363,7 +413,8 @@ class Sketch(CanvasBase):
         Update current canvas
         :return: None
         """
-        self.topLevelComponent.update(np.identity(4))
+        with self.vivariumLock():
+            self.topLevelComponent.update(np.identity(4))
 
     def Interrupt_Keyboard(self, keycode):
         """
@@ -375,29 +426,80 @@ class Sketch(CanvasBase):
         # Default Scene
         if chr(keycode) in "rR":
             self.viewing_quaternion = Quaternion()
+            self.stopSimulation()
             self.topLevelComponent.clear()                         # Remove everything (old vivarium, old objects)
             self.vivarium = Vivarium(self, self.shaderProg, sceneType='default')
             self.topLevelComponent.addChild(self.vivarium)         # Attach the new Vivarium to the scene graph
             self.topLevelComponent.initialize()                    # Re-initialize transformations etc.
             self.components = self.vivarium.components             # Update reference for rendering/selection
             self.update()
+            self.startSimulation()
 
         # A test scene with only one (1) predator and one (1) prey
         if chr(keycode) in "tT":
             self.viewing_quaternion = Quaternion()
+            self.stopSimulation()
             self.topLevelComponent.clear()
             self.vivarium = Vivarium(self, self.shaderProg, sceneType='test')
             self.topLevelComponent.addChild(self.vivarium)
             self.topLevelComponent.initialize()
             self.components = self.vivarium.components
             self.update()
+            self.startSimulation()
 
         # Dropping food after pressing 'f' key
         if chr(keycode) in "fF":
-            self.vivarium.spawnFood()
+            # on this thread, since a new particle has to create its GL buffers
+            with self.vivariumLock():
+                self.vivarium.spawnFood()
             print("Food spawned in tank!")
             print(f"Total food objects: {len(self.vivarium.food_obj)}")
 
+        # Save / load a snapshot of the whole simulation
+        if chr(keycode) in "sS":
+            with self.vivariumLock():
+                self.vivarium.saveSnapshot(self.SNAPSHOT_PATH)
+            print(f"Snapshot of step {self.vivarium.step_count} saved to {self.SNAPSHOT_PATH}")
+        if chr(keycode) in "lL":
+            if os.path.isfile(self.SNAPSHOT_PATH):
+                with self.vivariumLock():
+                    self.vivarium.loadSnapshot(self.SNAPSHOT_PATH)
+                print(f"Snapshot of step {self.vivarium.step_count} restored")
+
+        # Record the run / replay the recording
+        if chr(keycode) in "cC":
+            with self.vivariumLock():
+                if self.vivarium.recorder is None:
+                    self.vivarium.startRecording(self.RECORDING_PATH)
+                    print(f"Recording to {self.RECORDING_PATH}")
+                else:
+                    self.vivarium.stopRecording()
+                    print("Recording stopped")
+        if chr(keycode) in "pP":
+            with self.vivariumLock():
+                if self.vivarium.replay is None:
+                    if os.path.isfile(self.RECORDING_PATH):
+                        self.vivarium.startReplay(self.RECORDING_PATH)
+                        print(f"Replaying {len(self.vivarium.replay)} recorded steps")
+                else:
+                    self.vivarium.stopReplay()
+                    print("Replay stopped")
+        if chr(keycode) in ",." and self.vivarium.replay is not None:
+            offset = self.REPLAY_SCRUB_STEPS if chr(keycode) == "." else -self.REPLAY_SCRUB_STEPS
+            with self.vivariumLock():
+                self.vivarium.seekReplay(self.vivarium.replay_frame + offset)
+        if chr(keycode) in "iI":
+            with self.vivariumLock():
+                profiler = self.vivarium.profiler
+                if profiler.enabled:
+                    profiler.enable(False)
+                    print(profiler.formatSummary())
+                else:
+                    profiler.reset()
+                    profiler.report_every = self.PROFILE_REPORT_STEPS
+                    profiler.enable()
+                    print("Profiling vivarium steps")
+
 
 if __name__ == "__main__":
     print("This is the main entry! ")
@@ -0,0 +1,308 @@
+"""
+Multi-process, domain decomposed creature simulation for very large tanks.
+
+The tank is cut along x into one slab per worker process. All creature state lives in shared memory, indexed by
+creature, and is triple buffered: during a step every worker reads buffer step % 3 and writes buffer (step + 1) % 3,
+so the render process can keep reading the last published buffer while the next two steps are computed.
+
+Every step a worker
+    * owns the creatures whose x position falls inside its slab. Ownership is recomputed from the positions each
+      step, so a creature crossing a slab boundary migrates to the neighbouring worker on the next step,
+    * sees as ghosts the living creatures of the neighbouring slabs that lie within `halo` of its boundaries, which
+      is all a neighbour query needs since forces are cut off at `halo`. By default each force is cut off at
+      HALO_RANGE_SCALES times its range, where its gaussian factor is down to exp(-9), and the halo is the longest of
+      these cutoffs, so the cutoff is not noticeable. A smaller halo truncates the forces: creatures just past it
+      feel nothing although the force right inside it is not zero, unlike Predator.steer and Prey.steer, which never
+      cut off,
+    * advances its own creatures with the vectorized steering rules in BatchDynamics and writes them back.
+
+Only creatures are simulated; food stays with the Vivarium. Unlike Predator.stepForward, a predator may eat more
+than one prey per step.
+"""
+
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from BatchDynamics import BatchDynamics
+
+PREDATOR = 1
+PREY = 2
+
+# Same constants as Prey and Predator in ModelLinkage
+DEFAULT_PARAMS = {
+    "step_size": 0.02,
+    "radius": {PREDATOR: 0.35 * 1.1, PREY: 0.3 * 1.1},
+    "upright_blend": {PREDATOR: 0.05, PREY: 0.1},
+    "hunt_strength": 0.08, "hunt_range": 3.0,  # predators attracted to prey
+    "flee_strength": 0.06, "flee_range": 2.0,  # prey repelled by predators
+    "eat_factor": 0.8,
+}
+
+# the default halo, in units of the longest force range. Same as NEIGHBOR_RANGE_SCALES in ModelLinkage
+HALO_RANGE_SCALES = 3.0
+
+# name -> (shape suffix, dtype). Every field is triple buffered except species and radius, which never change
+FIELDS = {
+    "positions": ((3,), np.float64),
+    "directions": ((3,), np.float64),
+    "quats": ((4,), np.float64),
+    "alive": ((), np.bool_),
+}
+
+
+class SharedState:
+    """
+    Numpy views on the shared memory blocks holding the state of every creature
+    """
+    size = 0
+    blocks = None  # dict<str, SharedMemory>
+    arrays = None  # dict<str, np.ndarray>
+
+    def __init__(self, size, names=None):
+        """
+        :param size: number of creatures
+        :param names: block names to attach to, as returned by spec(). None to allocate new blocks
+        """
+        self.size = size
+        self.blocks = {}
+        self.arrays = {}
+        layout = {name: ((3, size) + shape, dtype) for name, (shape, dtype) in FIELDS.items()}
+        layout["species"] = ((size,), np.int8)
+        layout["radius"] = ((size,), np.float64)
+        for name, (shape, dtype) in layout.items():
+            nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=nbytes)
+            else:
+                block = shared_memory.SharedMemory(name=names[name])
+            self.blocks[name] = block
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def spec(self):
+        return self.size, {name: block.name for name, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        self.arrays.clear()
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks.clear()
+
+
+def advanceSlab(state, step, lo, hi, halo, tank_dimensions, params):
+    """
+    Advance the creatures owned by the slab lo <= x < hi from buffer step % 3 into buffer (step + 1) % 3
+    """
+    read, write = step % 3, (step + 1) % 3
+    positions = state["positions"][read]
+    directions = state["directions"][read]
+    alive = state["alive"][read]
+    species = state["species"]
+    radius = state["radius"]
+
+    x = positions[:, 0]
+    owned = np.flatnonzero((x >= lo) & (x < hi))
+    if len(owned) == 0:
+        return
+    near = alive & (x >= lo - halo) & (x < hi + halo)  # own creatures plus ghosts
+    nearPredators = np.flatnonzero(near & (species == PREDATOR))
+    nearPrey = np.flatnonzero(near & (species == PREY))
+
+    pos = positions[owned]
+    dirs = directions[owned].copy()
+    living = alive[owned].copy()
+    isPrey = species[owned] == PREY
+    isPredator = ~isPrey
+
+    hunters = isPredator & living
+    if np.any(hunters):
+        dirs[hunters] += BatchDynamics.potentialForces(pos[hunters], positions[nearPrey], params["hunt_strength"],
+                                                       params["hunt_range"], "attract",
+                                                       cutoff=min(halo, HALO_RANGE_SCALES * params["hunt_range"]))
+    fleeing = isPrey & living
+    if np.any(fleeing):
+        dirs[fleeing] += BatchDynamics.potentialForces(pos[fleeing], positions[nearPredators],
+                                                       params["flee_strength"], params["flee_range"], "repel",
+                                                       cutoff=min(halo, HALO_RANGE_SCALES * params["flee_range"]))
+        # eaten: a predator closer than eat_factor * (sum of bounding radii)
+        preyIndex = owned[fleeing]
+        maxReach = (radius[preyIndex].max() + radius.max()) * params["eat_factor"]
+        i, j, _, dist = BatchDynamics.neighborPairs(positions[preyIndex], positions[nearPredators], maxReach)
+        reach = (radius[preyIndex][i] + radius[nearPredators][j]) * params["eat_factor"]
+        eaten = np.bincount(i[dist < reach], minlength=len(preyIndex)) > 0
+        living[np.flatnonzero(fleeing)[eaten]] = False
+
+    blend = np.where(isPrey, params["upright_blend"][PREY], params["upright_blend"][PREDATOR])
+    moving = np.flatnonzero(living)
+    d = BatchDynamics.normalize(dirs[moving])
+    BatchDynamics.uprightCorrection(d, blend[moving])
+    nextPos = pos[moving] + d * params["step_size"]
+    bounced = BatchDynamics.wallReflect(nextPos, d, radius[owned][moving], tank_dimensions)
+    facing = d.copy()
+    if np.any(bounced):
+        d[bounced] = BatchDynamics.uprightCorrection(d[bounced], blend[moving][bounced])
+
+    # dead creatures are carried over unchanged
+    state["positions"][write][owned] = pos
+    state["directions"][write][owned] = directions[owned]
+    state["quats"][write][owned] = state["quats"][read][owned]
+    state["alive"][write][owned] = living
+    movingIndex = owned[moving]
+    state["positions"][write][movingIndex] = nextPos
+    state["directions"][write][movingIndex] = d
+    state["quats"][write][movingIndex] = BatchDynamics.facingQuaternions(facing)
+
+
+def slabWorker(index, spec, bounds, halo, tank_dimensions, params, barrier, stop, published, interval):
+    """
+    Entry point of a worker process: advance slab `index` until stop is set
+    """
+    state = SharedState(*spec)
+    lo, hi = bounds[index], bounds[index + 1]
+    step = published.value
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            advanceSlab(state, step, lo, hi, halo, tank_dimensions, params)
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                break
+            step += 1
+            if index == 0:
+                published.value = step
+            remaining = interval - (time.perf_counter() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+    finally:
+        state.close()
+
+
+class SlabSimulation:
+    """
+    Predators and prey simulated by a pool of worker processes, one slab of the tank each
+    """
+    size = 0
+    tank_dimensions = None
+    halo = 0.0
+    bounds = None  # list<float>(workers + 1): slab boundaries along x
+    params = None
+    state = None  # SharedState
+    workers = None  # list<Process>
+
+    def __init__(self, numPredators, numPrey, tank_dimensions, numWorkers=None, seed=None, halo=None, params=None):
+        """
+        :param tank_dimensions: size of the tank, centered at the origin
+        :param numWorkers: number of slabs / worker processes, defaults to the number of cores
+        :param halo: interaction cutoff, and how far past its boundaries a slab looks for ghosts. Defaults to
+            HALO_RANGE_SCALES times the longer of hunt_range and flee_range
+        :param params: overrides for DEFAULT_PARAMS
+        """
+        self.size = numPredators + numPrey
+        self.tank_dimensions = list(tank_dimensions)
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        if halo is None:
+            halo = HALO_RANGE_SCALES * max(self.params["hunt_range"], self.params["flee_range"])
+        self.halo = halo
+        numWorkers = numWorkers or mp.cpu_count()
+
+        half = tank_dimensions[0] / 2
+        self.bounds = list(np.linspace(-half, half, numWorkers + 1))
+        # the outer slabs also own anything sitting exactly on (or numerically past) the walls
+        self.bounds[0], self.bounds[-1] = -np.inf, np.inf
+        self.workers = []
+
+        rng = np.random.default_rng(seed)
+        self.state = SharedState(self.size)
+        species = self.state["species"]
+        species[:numPredators] = PREDATOR
+        species[numPredators:] = PREY
+        self.state["radius"][:] = np.where(species == PREY, self.params["radius"][PREY],
+                                           self.params["radius"][PREDATOR])
+
+        extent = np.asarray(tank_dimensions, dtype=float) * 0.45
+        directions = rng.random((self.size, 3))
+        self.state["positions"][0] = rng.uniform(-extent, extent, (self.size, 3))
+        self.state["directions"][0] = BatchDynamics.normalize(directions)
+        self.state["quats"][0] = BatchDynamics.facingQuaternions(self.state["directions"][0])
+        self.state["alive"][0] = True
+
+        self.published = mp.Value("q", 0, lock=False)
+        self.stopEvent = mp.Event()
+
+    @property
+    def species(self):
+        return self.state["species"]
+
+    @property
+    def numWorkers(self):
+        return len(self.bounds) - 1
+
+    def step(self, n=1):
+        """
+        Advance n steps in this process, slab by slab. Only valid while the workers are not running.
+        """
+        if self.workers:
+            raise RuntimeError("SlabSimulation is running in worker processes")
+        for _ in range(n):
+            step = self.published.value
+            for i in range(self.numWorkers):
+                advanceSlab(self.state, step, self.bounds[i], self.bounds[i + 1], self.halo,
+                            self.tank_dimensions, self.params)
+            self.published.value = step + 1
+
+    def start(self, stepsPerSecond=None):
+        """
+        Start one worker process per slab. They keep stepping until stop() is called.
+
+        :param stepsPerSecond: cap on the simulation rate, None to run as fast as possible
+        """
+        if self.workers:
+            return
+        self.stopEvent.clear()
+        barrier = mp.Barrier(self.numWorkers)
+        interval = 1.0 / stepsPerSecond if stepsPerSecond else 0.0
+        for i in range(self.numWorkers):
+            worker = mp.Process(target=slabWorker, daemon=True,
+                                args=(i, self.state.spec(), self.bounds, self.halo, self.tank_dimensions,
+                                      self.params, barrier, self.stopEvent, self.published, interval))
+            worker.start()
+            self.workers.append(worker)
+        self.barrier = barrier
+
+    def stop(self):
+        """
+        Stop the worker processes. The published state stays readable.
+        """
+        if not self.workers:
+            return
+        self.stopEvent.set()
+        self.barrier.abort()
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def latest(self):
+        """
+        Copy of the merged state of the last published step
+
+        :return: step, positions (N, 3), quaternions (N, 4) as (s, x, y, z), alive mask (N,)
+        """
+        step = self.published.value
+        front = step % 3
+        return (step, self.state["positions"][front].copy(), self.state["quats"][front].copy(),
+                self.state["alive"][front].copy())
+
+    def close(self):
+        self.stop()
+        if self.state is not None:
+            self.state.close(unlink=True)
+            self.state = None
@@ -0,0 +1,277 @@
+"""
+Cubic spline paths for scripted creature motion.
+
+Every curve kind is described by its basis matrix M: a segment with control points P0..P3 (rows of P) is
+
+    p(t) = [1, t, t^2, t^3] @ M @ P,  t in [0, 1]
+
+so each segment is precomputed once as a (4, 3) coefficient matrix C = M @ P, and evaluating any number of points is
+a single batched product with the monomial vectors. Arc-length tables map the distance travelled along a path to
+(segment, t), so creatures move at constant speed whatever the spacing of the control points.
+
+PathFollowers moves many creatures along many paths: all paths are packed into one coefficient array and one
+arc-length table, so advancing every follower is one vectorized evaluation per step.
+"""
+
+import numpy as np
+
+from Point import Point
+from Quaternion import QuaternionArray
+
+BASIS = {
+    "bezier": np.array([[1, 0, 0, 0],
+                        [-3, 3, 0, 0],
+                        [3, -6, 3, 0],
+                        [-1, 3, -3, 1]], dtype=float),
+    "catmull-rom": 0.5 * np.array([[0, 2, 0, 0],
+                                   [-1, 0, 1, 0],
+                                   [2, -5, 4, -1],
+                                   [-1, 3, -3, 1]], dtype=float),
+    "bspline": np.array([[1, 4, 1, 0],
+                         [-3, 0, 3, 0],
+                         [3, -6, 3, 0],
+                         [-1, 3, -3, 1]], dtype=float) / 6,
+}
+
+
+def segmentControlPoints(points, kind, closed):
+    """
+    Split control points into the (S, 4, 3) control points of every segment
+
+    * bezier: 3k + 1 points (3k when closed), consecutive segments share an end point
+    * catmull-rom: passes through every point. Open paths repeat their end points so that the curve reaches them
+    * bspline: approximates the points, one segment per window of 4 consecutive points
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    if kind == "bezier":
+        if closed:
+            points = np.vstack([points, points[:1]])
+        if len(points) < 4 or (len(points) - 1) % 3:
+            raise ValueError("A bezier path needs 3k + 1 control points (3k when closed)")
+        starts = np.arange(0, len(points) - 1, 3)
+        return np.stack([points[starts + i] for i in range(4)], axis=1)
+
+    if kind not in BASIS:
+        raise ValueError(f"Unknown spline kind {kind}")
+    if closed:
+        count = len(points)
+        windows = (np.arange(count)[:, None] + np.arange(-1, 3)[None, :]) % count
+        return points[windows]
+    if kind == "catmull-rom":
+        points = np.vstack([points[:1], points, points[-1:]])
+    if len(points) < 4:
+        raise ValueError(f"A {kind} path needs at least 4 control points")
+    windows = np.arange(len(points) - 3)[:, None] + np.arange(4)[None, :]
+    return points[windows]
+
+
+def monomials(t):
+    """
+    [1, t, t^2, t^3] and its derivative [0, 1, 2t, 3t^2] for every t, both (N, 4)
+    """
+    t = np.asarray(t, dtype=float)
+    ones = np.ones_like(t)
+    zeros = np.zeros_like(t)
+    value = np.stack([ones, t, t * t, t * t * t], axis=-1)
+    derivative = np.stack([zeros, ones, 2 * t, 3 * t * t], axis=-1)
+    return value, derivative
+
+
+class SplinePath:
+    """
+    A path made of cubic segments of one kind, with an arc-length table for constant speed evaluation
+    """
+    kind = None
+    closed = False
+    coefficients = None  # np.ndarray(S, 4, 3): M @ P of every segment
+    arc = None  # np.ndarray(K): distance along the path of every table sample
+    param = None  # np.ndarray(K): segment index + t of every table sample
+    length = 0.0
+
+    def __init__(self, points, kind="catmull-rom", closed=False, samples=32):
+        """
+        :param points: control points, (N, 3)
+        :param kind: "bezier", "catmull-rom" or "bspline"
+        :param closed: whether the path loops back to its start
+        :param samples: arc-length table samples per segment
+        """
+        self.kind = kind
+        self.closed = closed
+        controls = segmentControlPoints(points, kind, closed)
+        self.coefficients = np.einsum("ij,sjk->sik", BASIS[kind], controls)
+
+        t = np.linspace(0, 1, samples + 1)
+        value, _ = monomials(t)
+        # (S, samples + 1, 3) positions along every segment
+        positions = np.einsum("ti,sik->stk", value, self.coefficients)
+        chords = np.linalg.norm(np.diff(positions, axis=1), axis=2)
+        self.arc = np.concatenate([[0.0], np.cumsum(chords.ravel())])
+        segments = np.arange(len(self.coefficients))[:, None]
+        self.param = np.concatenate([[0.0], (segments + t[None, 1:]).ravel()])
+        self.length = float(self.arc[-1])
+
+    def __len__(self):
+        return len(self.coefficients)
+
+    def evaluate(self, distances):
+        """
+        Positions and unit tangents at the given distances along the path. Distances wrap around closed paths and
+        are clamped to the ends of open ones.
+
+        :return: positions (N, 3), tangents (N, 3)
+        """
+        distances = np.asarray(distances, dtype=float)
+        distances = np.mod(distances, self.length) if self.closed else np.clip(distances, 0, self.length)
+        u = np.interp(distances, self.arc, self.param)
+        segment = np.minimum(u.astype(int), len(self.coefficients) - 1)
+        return evaluateSegments(self.coefficients, segment, u - segment)
+
+
+def evaluateSegments(coefficients, segment, t):
+    """
+    Points and unit tangents at parameter t of the given segments
+
+    :param coefficients: (S, 4, 3) segment coefficients
+    :param segment: (N,) segment index of every point
+    :param t: (N,) parameter of every point in its segment
+    :return: positions (N, 3), tangents (N, 3)
+    """
+    value, derivative = monomials(t)
+    selected = coefficients[segment]
+    positions = np.einsum("ni,nik->nk", value, selected)
+    tangents = np.einsum("ni,nik->nk", derivative, selected)
+    norm = np.linalg.norm(tangents, axis=1)
+    tangents[norm > 1e-12] /= norm[norm > 1e-12, None]
+    return positions, tangents
+
+
+class PathFollowers:
+    """
+    Creatures moving along spline paths at constant speed, all advanced with one evaluation per step.
+    Followers are not steered by the vivarium; they face along their path's tangent. They loop around closed paths
+    and stop at the end of open ones.
+    """
+    paths = None  # list<SplinePath>
+    creatures = None  # list of followers
+    slots = None  # dict<int, int>: id(creature) -> index in creatures
+
+    def __init__(self):
+        self.paths = []
+        self.creatures = []
+        self.slots = {}
+        self.path_index = np.zeros(0, dtype=int)
+        self.distance = np.zeros(0)
+        self.speed = np.zeros(0)
+        self.packed = None
+
+    def __len__(self):
+        return len(self.creatures)
+
+    def __contains__(self, creature):
+        return id(creature) in self.slots
+
+    def addPath(self, path):
+        """
+        :type path: SplinePath
+        :return: index of the path, to pass to add()
+        """
+        self.paths.append(path)
+        self.packed = None
+        return len(self.paths) - 1
+
+    def add(self, creature, pathIndex, speed=0.02, distance=0.0):
+        """
+        Make creature follow a path
+
+        :param speed: distance travelled per step
+        :param distance: starting distance along the path
+        """
+        if creature in self:
+            self.remove(creature)
+        self.slots[id(creature)] = len(self.creatures)
+        self.creatures.append(creature)
+        self.path_index = np.append(self.path_index, pathIndex)
+        self.distance = np.append(self.distance, distance)
+        self.speed = np.append(self.speed, speed)
+
+    def remove(self, creature):
+        slot = self.slots.pop(id(creature), None)
+        if slot is None:
+            return
+        last = len(self.creatures) - 1
+        if slot != last:
+            # swap-remove, as in IndexedList
+            moved = self.creatures[last]
+            self.creatures[slot] = moved
+            self.slots[id(moved)] = slot
+            for array in (self.path_index, self.distance, self.speed):
+                array[slot] = array[last]
+        self.creatures.pop()
+        self.path_index = self.path_index[:last]
+        self.distance = self.distance[:last]
+        self.speed = self.speed[:last]
+
+    def pack(self):
+        """
+        Concatenate the coefficients and arc-length tables of all paths. Each path's table is shifted past the
+        previous one (with a gap) so that a single interpolation serves every follower.
+        """
+        coefficients, arc, param = [], [], []
+        self.segment_offset = np.zeros(len(self.paths), dtype=int)
+        self.arc_offset = np.zeros(len(self.paths))
+        self.lengths = np.array([p.length for p in self.paths])
+        self.segment_count = np.array([len(p) for p in self.paths], dtype=int)
+        self.closed = np.array([p.closed for p in self.paths], dtype=bool)
+        segments = 0
+        offset = 0.0
+        for i, path in enumerate(self.paths):
+            self.segment_offset[i] = segments
+            self.arc_offset[i] = offset
+            coefficients.append(path.coefficients)
+            arc.append(path.arc + offset)
+            param.append(path.param + segments)
+            segments += len(path)
+            offset += path.length + 1.0
+        self.packed = (np.concatenate(coefficients), np.concatenate(arc), np.concatenate(param))
+
+    def evaluate(self):
+        """
+        Positions and unit tangents of every follower at its current distance
+
+        :return: positions (N, 3), tangents (N, 3)
+        """
+        if self.packed is None:
+            self.pack()
+        coefficients, arc, param = self.packed
+        lengths = self.lengths[self.path_index]
+        closed = self.closed[self.path_index]
+        distance = np.where(closed, np.mod(self.distance, lengths), np.clip(self.distance, 0, lengths))
+        u = np.interp(self.arc_offset[self.path_index] + distance, arc, param)
+        last = self.segment_offset[self.path_index] + self.segment_count[self.path_index] - 1
+        segment = np.minimum(u.astype(int), last)
+        return evaluateSegments(coefficients, segment, u - segment)
+
+    def advance(self):
+        """
+        Move every follower by its speed and place, orient and point it along its path
+        """
+        if not self.creatures:
+            return
+        if self.packed is None:
+            self.pack()
+        self.distance += self.speed
+        lengths = self.lengths[self.path_index]
+        self.distance = np.where(self.closed[self.path_index], np.mod(self.distance, lengths), self.distance)
+        positions, tangents = self.evaluate()
+        # degenerate tangents (repeated control points) keep the default forward facing
+        stalled = ~np.any(tangents, axis=1)
+        quats, facing = QuaternionArray.fromTwoVectors(np.where(stalled[:, None], (0.0, 0.0, 1.0), tangents))
+        matrices = quats.toMatrix().transpose(0, 2, 1)
+        for i, creature in enumerate(self.creatures):
+            creature.setCurrentPosition(Point(positions[i]))
+            if not stalled[i]:
+                creature.direction = tangents[i].copy()
+            if facing[i]:
+                creature.clearQuaternion()
+            else:
+                creature.setQuaternion(quats[i], matrices[i])
@@ -8,14 +8,29 @@ Created on 20181028
 modified by Daniel Scrivener
 """
 
+import contextlib
+import io
+import json
+import time
 import numpy as np
-import random
 from Point import Point
+from Quaternion import Quaternion
 from Component import Component
 from ModelTank import Tank
-from EnvironmentObject import EnvironmentObject
+from EnvironmentObject import EnvironmentObject, OrientationBatch
 from ModelLinkage import Prey, Predator
 from Shapes import Sphere
+from ObjectPool import IndexedList, ObjectPool
+from AttractionField import AttractionField
+from KDTree import KDTree
+from BatchDynamics import BatchDynamics
+from Recording import TrajectoryRecorder, TrajectoryReplay
+from Splines import PathFollowers
+from Profiler import Profiler
+from JointAnimation import JointAnimation
+from AnimationBaker import AnimationBaker
+from CompiledHierarchy import CompiledHierarchy
+from SlabSimulation import PREDATOR
 import ColorType as Ct
 
 
@@ -47,6 +62,14 @@ class Food(Component, EnvironmentObject):
 
         self.setCurrentPosition(Point(nextPos))
 
+    def recycle(self, position):
+        """
+        Reuse this food particle at a new position, keeping its sphere and GL buffers
+        """
+        self.velocity = np.array([0.0, -0.002, 0.0])
+        self.eaten = False
+        self.setCurrentPosition(position)
+
 
 class Vivarium(Component):
     """
@@ -65,9 +88,43 @@ class Vivarium(Component):
     #     the vivarium and remain there within the tank until eaten.
     #     * The food should disappear once it has been eaten. Food is eaten by the first creature that touches it.
 
-    def __init__(self, parent, shaderProg, sceneType='default'):
+    # species in the order of their snapshot ids
+    species = (Predator, Prey)
+
+    slab_sim = None  # SlabSimulation followed by animationUpdate, see attachSlabSimulation
+    slab_view = None  # list<(int, creature)>: simulated creature index -> creature displaying it
+
+    recorder = None  # TrajectoryRecorder appended to after every step
+    replay = None  # TrajectoryReplay driving the vivarium instead of the simulation
+    replay_frame = 0
+
+    def __init__(self, parent, shaderProg, sceneType='default', useAttractionField=False, seed=None,
+                 batchOrientation=True, turnRate=1.0, useSpatialIndex=False, batchBoundary=True,
+                 batchAnimation=True, bakeAnimation=True, compileScene=False):
+        """
+        :param sceneType: 'default' for 1 predator and 2 prey, 'test' for 1 predator and 1 prey
+        :param useAttractionField: if True, creatures steer toward food by sampling cached AttractionFields
+            instead of visiting every food particle
+        :param seed: seed for the vivarium's random generator. Runs with the same seed are reproducible
+        :type seed: int
+        :param batchOrientation: if True, creatures turn to face their new directions all at once after every step
+            instead of one quaternion at a time
+        :param turnRate: with batchOrientation, fraction of the turn made per step (slerp). 1 turns instantly
+        :param useSpatialIndex: if True, creatures find their prey and threats through per-species KDTrees rebuilt
+            every step instead of scanning every creature
+        :param batchBoundary: if True, wall collisions of the creatures are resolved in batches with BatchDynamics.
+            The result is identical to resolving them one creature at a time
+        :param batchAnimation: if True, the joints of all creatures are animated in one vectorized JointAnimation
+            step instead of each creature's animationUpdate. The result is identical
+        :param bakeAnimation: if True, the rotations of animated joints are looked up in tables baked once per
+            creature class by an AnimationBaker instead of being rebuilt every update. The result is identical
+        :param compileScene: if True, update() and draw() go through a CompiledHierarchy of the whole vivarium,
+            computing world matrices a tree level at a time instead of recursing through every component
+        """
         self.parent = parent
         self.shaderProg = shaderProg
+        self.rng = np.random.default_rng(seed)
+        self.step_count = 0
 
         self.tank_dimensions = [4, 4, 4]
         tank = Tank(Point((0, 0, 0)), shaderProg, self.tank_dimensions)
@@ -78,61 +135,312 @@ class Vivarium(Component):
         self.tank = tank
 
         # Store all components in one list, for us to access them later
-        self.components = [tank]
-        self.creatures = []  # Separate list for prey and predator
-        self.food_obj = []  # List for food objects
+        # IndexedList gives O(1) add/remove so that spawning and eating don't churn these lists
+        tank.children = IndexedList(tank.children)
+        self.components = IndexedList([tank])
+        self.creatures = IndexedList()  # Separate list for prey and predator
+        self.food_obj = IndexedList()  # List for food objects
+
+        # Eaten food and creatures are parked here and recycled, along with their GL buffers
+        self.food_pool = ObjectPool(lambda pos: Food(self.parent, pos, self.shaderProg))
+        self.creature_pools = {
+            Predator: ObjectPool(lambda pos: Predator(self.parent, pos, self.shaderProg, self.rng)),
+            Prey: ObjectPool(lambda pos: Prey(self.parent, pos, self.shaderProg, self.rng)),
+        }
+        self.initialized = False
+        self.orientation_batch = OrientationBatch(turnRate) if batchOrientation else None
+        # species_id -> (KDTree, creatures in tree order), rebuilt every step. None when disabled
+        self.spatial_index = {} if useSpatialIndex else None
+        self.batch_boundary = batchBoundary
+        # creatures moving along scripted spline paths instead of steering themselves
+        self.path_followers = PathFollowers()
+        # joint oscillators of every creature, advanced together. None when disabled
+        self.joint_animation = JointAnimation() if batchAnimation else None
+        # baked joint rotations shared by all creatures of a class. None when disabled
+        self.animation_baker = AnimationBaker() if bakeAnimation else None
+        # flat form of the scene graph, compiled on first update. None when disabled
+        self.compile_scene = compileScene
+        self.compiled_scene = None
+        # per-step timings of the simulation phases, off until profiler.enable() is called
+        self.profiler = Profiler()
+
+        # (range_scale, cutoff) -> AttractionField over all food, created on first use. None when disabled
+        self.food_fields = {} if useAttractionField else None
 
-        tank_dims = self.tank_dimensions
-        
         if sceneType == 'test':
             # Test scene: 1 predator, 1 prey
-            predator_pos = Point([random.uniform(-tank_dims[i] * 0.45, tank_dims[i] * 0.45) for i in range(3)])
-            predator = Predator(parent, predator_pos, shaderProg)
-            self.addNewObjInTank(predator)
-            self.creatures.append(predator)
-
-            prey_pos = Point([random.uniform(-tank_dims[i] * 0.45, tank_dims[i] * 0.45) for i in range(3)])
-            prey = Prey(parent, prey_pos, shaderProg)
-            self.addNewObjInTank(prey)
-            self.creatures.append(prey)
+            self.populate(1, 1)
         else:
             # Default scene: 1 predator, 2 prey
-            predator_start = Point([random.uniform(-tank_dims[i] * 0.45, tank_dims[i] * 0.45) for i in range(3)])
-            predator = Predator(parent, predator_start, shaderProg)
-            self.addNewObjInTank(predator)
-            self.creatures.append(predator)
+            self.populate(1, 2)
+
+    def initialize(self):
+        super(Vivarium, self).initialize()
+        # objects created from now on have to set up their own GL buffers
+        self.initialized = True
+
+    def updateTree(self, parentTransformationMat):
+        if not self.compile_scene:
+            super(Vivarium, self).updateTree(parentTransformationMat)
+            return
+        if self.compiled_scene is None:
+            self.compiled_scene = CompiledHierarchy(self)
+        self.compiled_scene.update(parentTransformationMat)
+
+    def draw(self, shaderProg, frustum=None):
+        if self.compiled_scene is None:
+            super(Vivarium, self).draw(shaderProg, frustum)
+        else:
+            self.compiled_scene.draw(shaderProg, frustum)
 
-            for _ in range(2):
-                prey_pos = Point([random.uniform(-tank_dims[i] * 0.45, tank_dims[i] * 0.45) for i in range(3)])
-                prey = Prey(parent, prey_pos, shaderProg)
-                self.addNewObjInTank(prey)
-                self.creatures.append(prey)
+    def randomTankPosition(self, margin=0.45):
+        """
+        Random position inside the tank, at most margin * dimension away from the center along each axis
+        """
+        return Point([self.rng.uniform(-self.tank_dimensions[i] * margin, self.tank_dimensions[i] * margin)
+                      for i in range(3)])
+
+    def populate(self, numPredators, numPrey):
+        """
+        Add creatures at random positions in the tank
+        """
+        for _ in range(numPredators):
+            self.spawnCreature(Predator, self.randomTankPosition())
+        for _ in range(numPrey):
+            self.spawnCreature(Prey, self.randomTankPosition())
 
     def animationUpdate(self):
         """
         Update all creatures in vivarium
         """
+        profiler = self.profiler
+        profiler.beginStep()
+        if self.replay is not None:
+            profiler.call("replay", self.seekReplay, self.replay_frame + 1)
+            profiler.endStep()
+            return
+
+        if self.slab_sim is not None:
+            profiler.call("step", self.followSlabSimulation)
+        else:
+            profiler.call("step", self.stepCreatures)
+        profiler.call("animate", self.animateCreatures)
+        profiler.call("food", self.stepFood)
+
+        self.step_count += 1
+        profiler.call("update", self.update)
+        if self.recorder is not None:
+            profiler.call("record", self.recorder.append, self)
+        profiler.endStep()
 
+    def stepCreatures(self):
+        """
+        Move every creature one step (steering, eating prey, wall collisions)
+        """
+        if self.spatial_index is not None:
+            self.buildSpatialIndex()
+        with self.orientation_batch or contextlib.nullcontext():
+            if self.batch_boundary:
+                self.stepCreaturesInRuns()
+            else:
+                profiling = self.profiler.enabled
+                for creature in self.creatures[::-1]:
+                    if creature.eaten or creature in self.path_followers:
+                        continue
+                    if profiling:
+                        start = time.perf_counter()
+                    creature.stepForward(self.creatures, self.tank_dimensions, self)
+                    if profiling:
+                        self.profiler.add("step." + type(creature).__name__, time.perf_counter() - start)
+            self.profiler.call("step.paths", self.path_followers.advance)
+
+    def stepCreaturesInRuns(self):
+        """
+        stepCreatures with the upright corrections and wall collisions resolved in batches.
+        Creatures only look at the positions of the other species, so a run of consecutive creatures of the same
+        species can all steer first and then move together, with the same result as moving them one by one.
+        """
+        profiling = self.profiler.enabled
+        run = []
         for creature in self.creatures[::-1]:
-            creature.stepForward(self.creatures, self.tank_dimensions, self)
-            creature.animationUpdate()  # Pass self.creatures
+            if creature.eaten or creature in self.path_followers:
+                continue
+            if run and type(creature) is not type(run[0]):
+                self.profiler.call("step.walls", self.resolveWalls, run)
+                run = []
+            if profiling:
+                start = time.perf_counter()
+            creature.steerDirection(self)
+            if profiling:
+                self.profiler.add("step." + type(creature).__name__, time.perf_counter() - start)
+            run.append(creature)
+        if run:
+            self.profiler.call("step.walls", self.resolveWalls, run)
+
+    def followPath(self, creature, path, speed=None, distance=0.0):
+        """
+        Move a creature along a scripted path from now on, instead of steering it
+
+        :type path: SplinePath
+        :param speed: distance per step, the creature's step_size by default
+        :param distance: starting distance along the path
+        """
+        if path in self.path_followers.paths:
+            pathIndex = self.path_followers.paths.index(path)
+        else:
+            pathIndex = self.path_followers.addPath(path)
+        self.path_followers.add(creature, pathIndex, creature.step_size if speed is None else speed, distance)
+
+    def stopFollowingPath(self, creature):
+        """
+        Hand a path follower back to its own steering
+        """
+        self.path_followers.remove(creature)
+
+    def resolveWalls(self, creatures):
+        """
+        The end of Prey/Predator.steer and their bounceOffWalls for many creatures at once: correct the
+        directions left by steerDirection upright and face them, then move every creature one step along its
+        direction, clamped inside the tank, and reflect the directions of those that hit a wall
+        """
+        directions = np.array([c.direction for c in creatures], dtype=float)
+        keep = np.array([c.upright_keep for c in creatures], dtype=float)
+        blend = np.array([c.upright_blend for c in creatures], dtype=float)
+        BatchDynamics.normalize(BatchDynamics.uprightCorrection(directions, blend, keep))
+        for creature, direction in zip(creatures, directions):
+            creature.direction = direction.copy()
+            creature.rotateDirection(Point(direction))
+        steps = np.array([c.step_size for c in creatures], dtype=float)
+        positions = np.array([c.currentPos.coords for c in creatures], dtype=float) + directions * steps[:, None]
+        radius = np.array([c.bound_radius for c in creatures], dtype=float)
+        bounced, facing = BatchDynamics.boundaryStage(positions, directions, radius, self.tank_dimensions,
+                                                      keep, blend)
+        for creature, position in zip(creatures, positions):
+            creature.setCurrentPosition(Point(position))
+        for i, face in zip(np.flatnonzero(bounced), facing):
+            creature = creatures[i]
+            creature.rotateDirection(Point(face))
+            creature.direction = directions[i]
+
+    def buildSpatialIndex(self):
+        """
+        Rebuild the KDTree of every species from the current creature positions
+        """
+        self.spatial_index.clear()
+        for species in self.species:
+            members = [c for c in self.creatures if isinstance(c, species) and not c.eaten]
+            positions = np.array([c.currentPos.coords for c in members], dtype=float).reshape(-1, 3)
+            self.spatial_index[species.species_id] = (KDTree(positions), members)
+
+    def creaturesWithin(self, species_id, position, radius):
+        """
+        Creatures of a species that were within radius of position when the spatial index was last built,
+        nearest first. Creatures eaten since then are skipped.
+
+        :param species_id: 1 for predators, 2 for prey
+        :rtype: list
+        """
+        tree, members = self.spatial_index[species_id]
+        indices, _ = tree.queryRadius(position, radius)
+        return [members[i] for i in indices if not members[i].eaten]
+
+    def nearestCreatures(self, species_id, position, k=1, maxDistance=np.inf):
+        """
+        Up to k creatures of a species nearest to position when the spatial index was last built, nearest first.
+        Creatures eaten since then are skipped, so fewer than k may be returned.
+
+        :rtype: list
+        """
+        tree, members = self.spatial_index[species_id]
+        indices, _ = tree.query(position, k, maxDistance)
+        return [members[i] for i in indices if not members[i].eaten]
+
+    def attachSlabSimulation(self, simulation, maxDisplayed=200):
+        """
+        Display a SlabSimulation in this tank. The creatures of the vivarium are replaced by display copies of the
+        first maxDisplayed simulated creatures, with the simulated tank scaled down to this one, and
+        animationUpdate follows the simulation from now on instead of stepping the creatures itself.
+
+        :type simulation: SlabSimulation
+        """
+        for creature in list(self.creatures):
+            self.removeCreature(creature)
+        self.slab_sim = simulation
+        self.slab_view = []
+        _, positions, _, alive = simulation.latest()
+        scale = np.asarray(self.tank_dimensions, dtype=float) / simulation.tank_dimensions
+        for index in range(min(maxDisplayed, simulation.size)):
+            if not alive[index]:
+                continue
+            species = Predator if simulation.species[index] == PREDATOR else Prey
+            creature = self.spawnCreature(species, Point(positions[index] * scale))
+            self.slab_view.append((index, creature))
+        self.followSlabSimulation()
+
+    def detachSlabSimulation(self):
+        """
+        Stop following the simulation. The displayed creatures stay and go back to stepping themselves.
+        """
+        self.slab_sim = None
+        self.slab_view = None
+
+    def followSlabSimulation(self):
+        """
+        Move the displayed creatures to the last step published by the simulation and drop the eaten ones
+        """
+        _, positions, quats, alive = self.slab_sim.latest()
+        scale = np.asarray(self.tank_dimensions, dtype=float) / self.slab_sim.tank_dimensions
+        view = []
+        for index, creature in self.slab_view:
+            if not alive[index]:
+                self.removeCreature(creature)
+                continue
+            creature.setCurrentPosition(Point(positions[index] * scale))
+            creature.setQuaternion(Quaternion(*(float(q) for q in quats[index])))
+            view.append((index, creature))
+        self.slab_view = view
 
-        for food in self.food_obj[::-1]:
+    def animateCreatures(self):
+        """
+        Advance the joint animation of every creature
+        """
+        if self.joint_animation is not None:
+            # no per-creature update() here, the whole vivarium is updated later in the step
+            self.joint_animation.advance()
+            return
+        if not self.profiler.enabled:
+            for creature in self.creatures[::-1]:
+                creature.animationUpdate()
+            return
+        for creature in self.creatures[::-1]:
+            start = time.perf_counter()
+            creature.animationUpdate()
+            self.profiler.add("animate." + type(creature).__name__, time.perf_counter() - start)
+
+    def stepFood(self):
+        """
+        Let the food sink and remove any particle touched by a creature
+        """
+        # walk backwards so that swap-removing an eaten particle only moves one we have already visited
+        for i in range(len(self.food_obj) - 1, -1, -1):
+            food = self.food_obj[i]
             food.stepForward(self.tank_dimensions)
+            if self.food_fields:
+                for field in self.food_fields.values():
+                    field.move(food)
             # Check if any creature eats the food
             for creature in self.creatures:
                 dist = np.linalg.norm(np.array(creature.currentPos.coords) - np.array(food.currentPos.coords))
                 if dist < (creature.bound_radius + food.bound_radius):
                     # Food eaten
-                    self.delObjInTank(food)
-                    self.food_obj.remove(food)
+                    self.removeFood(food)
+                    if self.profiler.enabled:
+                        self.profiler.add("eaten.food")
                     break
 
-        self.update()
-
     def delObjInTank(self, obj):
         if isinstance(obj, Component):
-            self.tank.children.remove(obj)
+            self.tank.removeChild(obj)
             self.components.remove(obj)
             del obj
 
@@ -144,17 +452,231 @@ class Vivarium(Component):
             # add environment components list reference to this new object's
             newComponent.env_obj_list = self.components
 
+    def spawnCreature(self, species, position):
+        """
+        Add a creature of the given class (Prey or Predator) to the tank, recycling an eaten one if possible
+
+        :return: the creature
+        """
+        creature, recycled = self.creature_pools[species].acquire(position)
+        creature.orientation_batch = self.orientation_batch
+        self.addNewObjInTank(creature)
+        self.creatures.append(creature)
+        if self.joint_animation is not None:
+            self.joint_animation.add(creature)
+        if self.animation_baker is not None and not recycled:
+            self.animation_baker.attach(creature)
+        if not recycled and self.initialized:
+            creature.initialize()
+        return creature
+
+    def removeCreature(self, creature):
+        """
+        Take a creature out of the tank and keep it for reuse
+        """
+        creature.eaten = True
+        if self.profiler.enabled:
+            self.profiler.add("removed." + type(creature).__name__)
+        self.path_followers.remove(creature)
+        if self.joint_animation is not None:
+            self.joint_animation.remove(creature)
+        self.delObjInTank(creature)
+        self.creatures.remove(creature)
+        self.creature_pools[type(creature)].release(creature)
+
     def spawnFood(self):
         # Spawn a new food object randomly near the top of the tank
 
         # Near top of y but random x/z
-        x = random.uniform(-self.tank_dimensions[0] * 0.4, self.tank_dimensions[0] * 0.4)
+        x = self.rng.uniform(-self.tank_dimensions[0] * 0.4, self.tank_dimensions[0] * 0.4)
         y = self.tank_dimensions[1] * 0.3
-        z = random.uniform(-self.tank_dimensions[2] * 0.4, self.tank_dimensions[2] * 0.4)
-        pos = Point((x, y, z))
+        z = self.rng.uniform(-self.tank_dimensions[2] * 0.4, self.tank_dimensions[2] * 0.4)
+        return self.addFood(Point((x, y, z)))
 
-        food = Food(self.parent, pos, self.shaderProg)
+    def addFood(self, pos):
+        """
+        Drop a food particle at pos, recycling an eaten one if possible
+
+        :return: the food object
+        """
+        food, recycled = self.food_pool.acquire(pos)
 
         self.addNewObjInTank(food)
         self.food_obj.append(food)
-        food.initialize()
\ No newline at end of file
+        if self.food_fields:
+            for field in self.food_fields.values():
+                field.add(food)
+        if not recycled:
+            food.initialize()
+        return food
+
+    def removeFood(self, food):
+        """
+        Take an eaten food particle out of the tank and keep it for reuse
+        """
+        food.eaten = True
+        self.delObjInTank(food)
+        self.food_obj.remove(food)
+        self.food_pool.release(food)
+        if self.food_fields:
+            for field in self.food_fields.values():
+                field.remove(food)
+
+    def foodForce(self, position, strength, range_scale, cutoff):
+        """
+        Summed attraction of all food on an object at position, sampled from the cached AttractionField for
+        (range_scale, cutoff). Only available when the vivarium was built with useAttractionField=True.
+
+        :return: force vector, np.ndarray(3)
+        """
+        key = (range_scale, cutoff)
+        field = self.food_fields.get(key)
+        if field is None:
+            field = AttractionField(self.tank_dimensions, range_scale, cutoff)
+            for food in self.food_obj:
+                field.add(food)
+            self.food_fields[key] = field
+        return field.force(position, strength)
+
+    def startRecording(self, path, **kwargs):
+        """
+        Record every following step to a file that startReplay can play back.
+        Extra keyword arguments (capacities) go to TrajectoryRecorder.
+        """
+        self.stopRecording()
+        self.recorder = TrajectoryRecorder(path, self.tank_dimensions, **kwargs)
+        self.recorder.append(self)
+
+    def stopRecording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def startReplay(self, path):
+        """
+        Play back a recording: from now on animationUpdate shows the next recorded step instead of simulating.
+        The current creatures and food are replaced by those of the recording, and the pools are filled up to the
+        most creatures and food of any recorded step, so that replaying never builds objects (and their GL buffers)
+        on the simulation thread.
+        """
+        self.stopRecording()
+        self.stopReplay()
+        for creature in list(self.creatures):
+            self.removeCreature(creature)
+        for food in list(self.food_obj):
+            self.removeFood(food)
+        replay = TrajectoryReplay(path)
+        creatureCounts, numFood = replay.peakCounts(len(self.species))
+        for species, count in zip(self.species, creatureCounts):
+            self.fillPool(self.creature_pools[species], count, lambda: self.spawnCreature(species, Point((0, 0, 0))),
+                          self.removeCreature)
+        self.fillPool(self.food_pool, numFood, lambda: self.addFood(Point((0, 0, 0))), self.removeFood)
+        self.replay = replay
+        self.seekReplay(0)
+
+    @staticmethod
+    def fillPool(pool, count, add, remove):
+        """
+        Make a pool hold at least count objects, built and initialized through the usual add and remove methods
+
+        :param add: callable() -> object, taking an object from the pool or building one
+        :param remove: callable(object) giving it back
+        """
+        if len(pool) >= count:
+            return
+        objects = [add() for _ in range(count)]
+        for obj in objects:
+            remove(obj)
+
+    def stopReplay(self):
+        """
+        Leave replay mode. The creatures and food of the current frame stay and resume simulating from there.
+        """
+        if self.replay is not None:
+            self.replay.close()
+            self.replay = None
+
+    def seekReplay(self, frame):
+        """
+        Show recorded step number frame, clamped to the recording
+        """
+        if len(self.replay) == 0:
+            return
+        self.replay_frame = max(0, min(frame, len(self.replay) - 1))
+        self.replay.apply(self, self.replay_frame)
+        self.step_count = int(self.replay[self.replay_frame]["step"])
+        self.update()
+
+    def snapshot(self):
+        """
+        Capture the whole simulation state (creatures, joints, food, random generator) as compact binary data.
+
+        :rtype: bytes
+        """
+        creatures = list(self.creatures)
+        angles = [[comp.uAngle, comp.vAngle, comp.wAngle] for c in creatures for comp in c.components]
+        speeds = np.zeros((len(creatures), 3))
+        quats = np.zeros((len(creatures), 4))
+        for i, c in enumerate(creatures):
+            speeds[i, :len(c.animation_speeds)] = [getattr(c, name) for name in c.animation_speeds]
+            if c.quat is not None:
+                quats[i] = [c.quat.s, *c.quat.v]
+
+        buffer = io.BytesIO()
+        np.savez(buffer,
+                 step_count=np.array(self.step_count),
+                 species=np.array([self.species.index(type(c)) for c in creatures], dtype=np.int8),
+                 positions=np.array([c.currentPos.coords for c in creatures], dtype=float).reshape(-1, 3),
+                 directions=np.array([c.direction for c in creatures], dtype=float).reshape(-1, 3),
+                 quats=quats,
+                 speeds=speeds,
+                 joint_angles=np.array(angles, dtype=float).reshape(-1, 3),
+                 food_positions=np.array([f.currentPos.coords for f in self.food_obj], dtype=float).reshape(-1, 3),
+                 food_velocities=np.array([f.velocity for f in self.food_obj], dtype=float).reshape(-1, 3),
+                 rng_state=np.frombuffer(json.dumps(self.rng.bit_generator.state).encode(), dtype=np.uint8))
+        return buffer.getvalue()
+
+    def restore(self, data):
+        """
+        Bring the vivarium back to a state captured by snapshot(). Creatures and food are recycled from the pools.
+
+        :param data: the bytes returned by snapshot()
+        :type data: bytes
+        """
+        state = np.load(io.BytesIO(data))
+
+        for creature in list(self.creatures):
+            self.removeCreature(creature)
+        for food in list(self.food_obj):
+            self.removeFood(food)
+
+        joint = 0
+        angles = state["joint_angles"]
+        for i, speciesIndex in enumerate(state["species"]):
+            creature = self.spawnCreature(self.species[speciesIndex], Point(state["positions"][i]))
+            creature.direction = state["directions"][i].copy()
+            for k, name in enumerate(creature.animation_speeds):
+                setattr(creature, name, float(state["speeds"][i, k]))
+            for comp in creature.components:
+                comp.uAngle, comp.vAngle, comp.wAngle = (float(a) for a in angles[joint])
+                joint += 1
+            if np.any(state["quats"][i]):
+                creature.setQuaternion(Quaternion(*(float(q) for q in state["quats"][i])))
+            else:
+                creature.clearQuaternion()
+
+        for position, velocity in zip(state["food_positions"], state["food_velocities"]):
+            food = self.addFood(Point(position))
+            food.velocity = velocity.copy()
+
+        self.rng.bit_generator.state = json.loads(state["rng_state"].tobytes().decode())
+        self.step_count = int(state["step_count"])
+        self.update()
+
+    def saveSnapshot(self, path):
+        with open(path, "wb") as f:
+            f.write(self.snapshot())
+
+    def loadSnapshot(self, path):
+        with open(path, "rb") as f:
+            self.restore(f.read())